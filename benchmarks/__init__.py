@@ -0,0 +1,15 @@
+"""Benchmarks of integrade's hot paths, with baselines tracked in git.
+
+Each ``bench_*.py`` module registers benchmarks with
+:func:`benchmarks.harness.benchmark`. They run offline: the cloudigrade API is
+the local stand-in of :mod:`integrade.standin` and s3 is a client dropping
+what it is given.
+
+Examples::
+
+    $ python -m benchmarks                   # run everything
+    $ python -m benchmarks -k config         # only names containing config
+    $ python -m benchmarks --save            # update benchmarks/baseline.json
+    $ python -m benchmarks --compare         # fail on >20% regressions
+
+"""
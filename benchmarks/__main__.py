@@ -0,0 +1,67 @@
+"""Run the benchmarks, see :mod:`benchmarks`."""
+import argparse
+import sys
+
+from benchmarks import harness
+
+
+def main(args):
+    """Run the selected benchmarks, report them and save or compare them."""
+    baseline = harness.load(args.baseline)
+    results = {}
+    print(f'{"benchmark":<50} {"best":>12} {"median":>12} {"change":>8}')
+    for bench in harness.discover():
+        if args.keyword and args.keyword not in bench.name:
+            continue
+        try:
+            result = bench.run()
+        except harness.Skip as skip:
+            print(f'{bench.name:<50} skipped: {skip}')
+            continue
+        results[bench.name] = result
+        line = (
+            f'{bench.name:<50} {harness.format_seconds(result["min"]):>12}'
+            f' {harness.format_seconds(result["median"]):>12}'
+        )
+        previous = baseline['results'].get(bench.name)
+        if previous is not None:
+            line += f' {result["min"] / previous["min"] - 1:+8.1%}'
+        print(line, flush=True)
+
+    if args.save:
+        harness.save(results, args.baseline)
+        print(f'Saved {len(results)} results to {args.baseline}')
+    if args.compare:
+        regressions = harness.compare(results, baseline, args.threshold)
+        for name, change in regressions.items():
+            print(f'Regression: {name} is {change:.1%} slower')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark integrade and track baselines.')
+    parser.add_argument(
+        '-k',
+        dest='keyword',
+        help='Only run benchmarks whose name contains this.')
+    parser.add_argument(
+        '--baseline',
+        default=harness.BASELINE,
+        help='JSON file of the baseline results.')
+    parser.add_argument(
+        '--save',
+        action='store_true',
+        help='Save the results to the baseline.')
+    parser.add_argument(
+        '--compare',
+        action='store_true',
+        help='Exit with 1 if a benchmark regressed from the baseline.')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='Relative slowdown counted as a regression, 0.2 by default.')
+    sys.exit(main(parser.parse_args()))
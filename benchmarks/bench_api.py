@@ -0,0 +1,85 @@
+"""Measure the clients' overhead against the local cloudigrade stand-in.
+
+The stand-in answers in-process, so the timings are mostly integrade's,
+requests' and urllib3's own work: building clients, sending requests on the
+pooled session and walking pages.
+"""
+from contextlib import contextmanager
+from unittest import mock
+
+from benchmarks.harness import benchmark
+
+from integrade import api, config
+from integrade.standin import CloudigradeState, serve
+from integrade.tests import urls
+
+ARN = 'arn:aws:iam::439727791560:role/customer'
+
+CONFIG = {
+    'scheme': 'http',
+    'ssl-verify': False,
+    'api_version': 'v1',
+    'credentials': ('user@example.com', 'password'),
+}
+
+
+@contextmanager
+def standin(instances=0, page_size=100):
+    """Serve a stand-in with instances discovered by an account."""
+    state = CloudigradeState(inspection_delays=0, page_size=page_size)
+    for i in range(instances):
+        state.add_aws_instance(ARN, ec2_ami_id=f'ami-{i % 10}')
+    with serve(state) as server:
+        cfg = dict(CONFIG, base_url=server.base_url, api_v2_url=server.v2_url,
+                   superuser_token=state.superuser_token)
+        with mock.patch.object(config, '_CONFIG', cfg):
+            api.ClientV2(branch='master').request(
+                'post', 'accounts/', data={'account_arn': ARN})
+            yield server
+
+
+@benchmark(number=2000)
+def client_construction():
+    """Create a v1 client, as most tests do."""
+    with standin():
+        yield api.Client
+
+
+@benchmark(number=2000)
+def client_v2_construction():
+    """Create a v2 client."""
+    with standin():
+        yield lambda: api.ClientV2(branch='master')
+
+
+@benchmark(number=200)
+def client_request():
+    """Get a small v1 resource on a kept-alive connection."""
+    with standin():
+        client = api.Client()
+        yield lambda: client.get(urls.SYSCONFIG)
+
+
+@benchmark(number=200)
+def client_v2_request():
+    """Get a small v2 resource on a kept-alive connection."""
+    with standin():
+        client = api.ClientV2(branch='master')
+        yield lambda: client.request('get', 'sysconfig/')
+
+
+@benchmark(number=10, params=(1000,))
+def iter_objects(instances):
+    """List all instances, 100 per page."""
+    with standin(instances):
+        client = api.ClientV2(branch='master')
+        yield lambda: sum(1 for _ in client.iter_objects('instances/'))
+
+
+@benchmark(number=10, params=(1000,))
+def iter_objects_sequential(instances):
+    """List all instances, 100 per page, without prefetching pages."""
+    with standin(instances):
+        client = api.ClientV2(branch='master')
+        yield lambda: sum(
+            1 for _ in client.iter_objects('instances/', prefetch=False))
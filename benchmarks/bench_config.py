@@ -0,0 +1,81 @@
+"""Measure the cost of a get_config() and get_aws_image_config() call.
+
+Compares the read-only views handed out by default with the mutable deep
+copies, which is what every call used to cost. The configuration is built
+from aws_image_config_template.yaml and a few fake customer profiles, so no
+environment is needed.
+"""
+import os
+from unittest import mock
+
+import yaml
+
+from benchmarks.harness import benchmark
+
+from integrade import config
+
+TEMPLATE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'aws_image_config_template.yaml',
+)
+
+PROFILES = 4
+"""Number of customer profiles in the benchmarked config."""
+
+
+def sample_configs(profiles):
+    """Build an integrade and an AWS image config to benchmark with."""
+    with open(TEMPLATE) as f:
+        aws_image_config = yaml.load(f, Loader=yaml.FullLoader)
+    template_profiles = list(aws_image_config['profiles'].values())
+    cfg = {
+        'api_version': 'v2',
+        'base_url': 'example.com',
+        'scheme': 'https',
+        'ssl-verify': False,
+        'credentials': ('user@example.com', 'password'),
+        'aws_profiles': [],
+    }
+    for i in range(profiles):
+        account_number = f'{i:012}'
+        cfg['aws_profiles'].append({
+            'name': f'CUSTOMER{i}',
+            'arn': f'arn:aws:iam::{account_number}:role/customer',
+            'account_number': account_number,
+            'cloudtrail_name': f'review-bench-{account_number}',
+            'access_key_id': f'KEY{i}',
+            'images': template_profiles[i % len(template_profiles)]['images'],
+        })
+    return cfg, aws_image_config
+
+
+def patched(func):
+    """Yield ``func`` with the sample configs in place of the real ones."""
+    cfg, aws_image_config = sample_configs(PROFILES)
+    with mock.patch.object(config, '_CONFIG', cfg), \
+            mock.patch.object(config, '_AWS_CONFIG', aws_image_config):
+        yield func
+
+
+@benchmark(number=200)
+def get_config_mutable():
+    """Deep copy the config."""
+    yield from patched(lambda: config.get_config(mutable=True))
+
+
+@benchmark(number=20000)
+def get_config():
+    """Get the read-only view of the config."""
+    yield from patched(config.get_config)
+
+
+@benchmark(number=200)
+def get_aws_image_config_mutable():
+    """Deep copy the AWS image config."""
+    yield from patched(lambda: config.get_aws_image_config(mutable=True))
+
+
+@benchmark(number=20000)
+def get_aws_image_config():
+    """Get the read-only view of the AWS image config."""
+    yield from patched(config.get_aws_image_config)
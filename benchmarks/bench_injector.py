@@ -0,0 +1,38 @@
+"""Measure how fast the event injector packs and gzips records.
+
+Uploads go to a client dropping the objects, so only integrade's work is
+timed.
+"""
+from benchmarks.harness import benchmark
+
+from integrade.injector import EventInjector
+from integrade.usage import UsageModel
+
+PROFILE = {'account_number': '123456789012'}
+
+
+class NullS3(object):
+    """An s3 client forgetting everything it is given."""
+
+    def put_object(self, **kwargs):
+        """Accept the object and drop it."""
+
+
+def inject(events, usage=None):
+    """Inject RunInstances events for as many instances."""
+    with EventInjector(bucket_name='bench', client=NullS3(),
+                       usage=usage) as injector:
+        for i in range(events):
+            injector.add_event(f'i-{i:017x}', PROFILE, 'RunInstances')
+
+
+@benchmark(number=1, params=(10000,))
+def add_event(events):
+    """Add events and flush them, 500 records per object."""
+    yield lambda: inject(events)
+
+
+@benchmark(number=1, params=(10000,))
+def add_event_with_usage(events):
+    """Add events while keeping a model of the usage to expect."""
+    yield lambda: inject(events, UsageModel())
@@ -0,0 +1,97 @@
+"""Compare the JSON codecs of :mod:`integrade.codec` on API payloads.
+
+The payloads are the ``*.json`` files of ``benchmarks/payloads``: the bodies
+of the v1 and v2 image and instance lists of a stand-in with 200 instances of
+10 inspected images, saved by :func:`record`. Keeping them in the repository
+makes every run decode the same bytes. To compare the codecs on other bodies,
+like ones recorded from a real deployment, save them as ``*.json`` files in a
+directory named by $BENCH_JSON_PAYLOADS.
+"""
+import glob
+import os
+
+import requests
+
+from benchmarks.bench_api import standin
+from benchmarks.harness import Skip, benchmark
+
+from integrade import api, codec
+from integrade.exceptions import MissingConfigurationError
+from integrade.tests import urls
+
+CODECS = ('json', 'orjson')
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads')
+"""Directory of the payloads decoded unless $BENCH_JSON_PAYLOADS is set."""
+
+# `payloads` caches the read bodies here.
+_PAYLOADS = []
+
+
+def record(directory=PAYLOADS, instances=200):
+    """Save the list bodies of a stand-in as the payloads to decode.
+
+    Run ``python -c 'from benchmarks import bench_json; bench_json.record()'``
+    to record them again, then save a new baseline.
+    """
+    with standin(instances=instances, page_size=instances):
+        client = api.Client(response_handler=api.echo_handler)
+        client_v2 = api.ClientV2(branch='master')
+        bodies = {
+            'v1_images': client.get(urls.IMAGE).content,
+            'v1_instances': client.get(urls.INSTANCE).content,
+            'v2_images': client_v2.request('get', 'images/').content,
+            'v2_instances': client_v2.request('get', 'instances/').content,
+        }
+    for name, body in bodies.items():
+        with open(os.path.join(directory, f'{name}.json'), 'wb') as f:
+            f.write(body)
+
+
+def payloads():
+    """Return the bodies to decode, reading them on first use."""
+    if _PAYLOADS:
+        return _PAYLOADS
+    directory = os.environ.get('BENCH_JSON_PAYLOADS') or PAYLOADS
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'rb') as f:
+            _PAYLOADS.append(f.read())
+    if not _PAYLOADS:
+        raise Skip(f'no *.json payloads in {directory}')
+    return _PAYLOADS
+
+
+def get_codec(name):
+    """Build a codec, or skip when it is not installed."""
+    try:
+        return codec.get_codec(name)
+    except MissingConfigurationError as error:
+        raise Skip(str(error))
+
+
+@benchmark(number=20, params=CODECS)
+def decode(name):
+    """Decode every payload."""
+    json_codec = get_codec(name)
+    bodies = payloads()
+    yield lambda: [json_codec.loads(body) for body in bodies]
+
+
+@benchmark(number=20, params=CODECS)
+def encode(name):
+    """Encode every payload, as the clients do with request payloads."""
+    json_codec = get_codec(name)
+    documents = [json_codec.loads(body) for body in payloads()]
+    yield lambda: [json_codec.dumps(document) for document in documents]
+
+
+@benchmark(number=20)
+def requests_json():
+    """Decode every payload with ``requests.Response.json``."""
+    responses = []
+    for body in payloads():
+        response = requests.Response()
+        response._content = body
+        response.encoding = 'utf-8'
+        responses.append(response)
+    yield lambda: [response.json() for response in responses]
@@ -0,0 +1,56 @@
+"""Measure find_elements_by_text on a large static page.
+
+This needs selenium and a headless browser, Chrome by default or the one
+named by $UI_BROWSER, like ``make test-ui``. The benchmark is skipped when
+either is missing.
+"""
+import os
+
+from benchmarks.harness import Skip, benchmark
+
+PAGE = """
+var section
+for (var i = 0; i < arguments[0]; i++) {
+    if (i % 100 == 0) {
+        section = document.createElement('section')
+        document.body.appendChild(section)
+    }
+    var row = document.createElement('div')
+    var label = document.createElement('span')
+    label.textContent = 'Image ' + i
+    row.appendChild(label)
+    section.appendChild(row)
+}
+"""
+"""Script adding rows labelled ``Image <i>``, in sections of 100, to the
+page."""
+
+
+def start_browser():
+    """Start a headless browser, or skip when there is none."""
+    try:
+        from selenium import webdriver
+        from selenium.common.exceptions import WebDriverException
+    except ImportError:
+        raise Skip('selenium is not installed')
+    browser = os.environ.get('UI_BROWSER', 'Chrome').strip()
+    try:
+        options = getattr(webdriver, f'{browser}Options')()
+        options.add_argument('--headless')
+        return getattr(webdriver, browser)(options=options)
+    except (AttributeError, WebDriverException) as error:
+        raise Skip(f'cannot start {browser}: {error}')
+
+
+@benchmark(number=5, params=(1000, 10000))
+def find_elements_by_text(elements):
+    """Find the last row of the page by its exact text."""
+    driver = start_browser()
+    try:
+        from integrade.tests.ui.utils import find_elements_by_text
+        driver.get('about:blank')
+        driver.execute_script(PAGE, elements)
+        text = f'Image {elements - 1}'
+        yield lambda: find_elements_by_text(driver, text)
+    finally:
+        driver.quit()
@@ -0,0 +1,50 @@
+"""Measure the runtime hours calculation for many instances.
+
+Histories are random but seeded, a few on/off pairs per instance with some
+instances still running.
+"""
+import random
+
+from benchmarks.harness import benchmark
+
+from integrade.utils import (
+    events_to_arrays,
+    get_expected_hours_in_past_30_days,
+    get_expected_hours_in_past_30_days_batch,
+)
+
+
+def histories(instances, seed=0):
+    """Generate histories of up to 3 on/off pairs, in days in the past."""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(instances):
+        days = sorted(
+            (rng.randint(0, 45) for _ in range(rng.randint(1, 3) * 2)),
+            reverse=True)
+        if rng.random() < 0.3:
+            days[-1] = None
+        result.append(days)
+    return result
+
+
+@benchmark(number=1, params=(10000,))
+def expected_hours(instances):
+    """Compute the hours of each instance, one at a time."""
+    events = histories(instances)
+    yield lambda: [get_expected_hours_in_past_30_days(e) for e in events]
+
+
+@benchmark(number=10, params=(10000,))
+def expected_hours_batch(instances):
+    """Compute the hours of all instances at once, from their histories."""
+    events = histories(instances)
+    yield lambda: get_expected_hours_in_past_30_days_batch(
+        *events_to_arrays(events))
+
+
+@benchmark(number=10, params=(10000,))
+def expected_hours_arrays(instances):
+    """Compute the hours of all instances at once, from arrays."""
+    on, off = events_to_arrays(histories(instances))
+    yield lambda: get_expected_hours_in_past_30_days_batch(on, off)
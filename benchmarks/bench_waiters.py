@@ -0,0 +1,32 @@
+"""Measure a MultiWaiter tick with many pending conditions.
+
+Like the inspection waits of the functional tests, the source lists images
+into an :class:`integrade.index.ObjectIndex` and each condition looks up one
+image, which is never inspected so every condition stays pending.
+"""
+from benchmarks.harness import benchmark
+
+from integrade.index import ObjectIndex
+from integrade.waiters import MultiWaiter
+
+
+def is_inspected(ami_id, images):
+    """Check whether an image is inspected."""
+    image = images.get('ec2_ami_id', ami_id)
+    return image is not None and image['status'] == 'inspected'
+
+
+@benchmark(number=10, params=(10, 100, 1000, 10000))
+def tick(targets):
+    """List the images once and check every pending condition."""
+    images = [
+        {'ec2_ami_id': f'ami-{i:08x}', 'status': 'inspecting'}
+        for i in range(targets)
+    ]
+    waiter = MultiWaiter(timeout=0)
+    waiter.add_source('images', lambda: ObjectIndex(images))
+    for image in images:
+        ami_id = image['ec2_ami_id']
+        waiter.add('images', lambda listing, ami_id=ami_id: is_inspected(
+            ami_id, listing), name=ami_id)
+    yield waiter.tick
@@ -0,0 +1,174 @@
+"""Register, time and compare benchmarks.
+
+A benchmark is a generator function decorated with :func:`benchmark`. It sets
+up what it needs, yields the callable to time, and tears down after the
+yield::
+
+    @benchmark(number=100, params=(10, 1000))
+    def bench_something(size):
+        thing = make_thing(size)
+        yield lambda: thing.do()
+        thing.close()
+
+Setup and teardown are not timed. A benchmark that cannot run here raises
+:class:`Skip` before yielding.
+"""
+import importlib
+import json
+import os
+import pkgutil
+import platform
+import statistics
+import subprocess
+import timeit
+from datetime import datetime, timezone
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+"""Where baselines are saved and compared against by default."""
+
+BENCHMARKS = []
+"""All registered :class:`Benchmark` objects, in definition order."""
+
+
+class Skip(Exception):
+    """Raised by a benchmark which cannot run in this environment."""
+
+
+class Benchmark(object):
+    """A registered benchmark, see :func:`benchmark`."""
+
+    def __init__(self, name, func, number, repeat, param=None):
+        """Keep what is needed to run the benchmark later."""
+        self.name = name
+        self.func = func
+        self.number = number
+        self.repeat = repeat
+        self.param = param
+
+    def run(self):
+        """Set up, time and tear down the benchmark.
+
+        :returns: dict of the ``min`` and ``median`` seconds per call and of
+            the ``number`` and ``repeat`` the timings were made with.
+        :raises: Skip if the benchmark cannot run here.
+        """
+        args = () if self.param is None else (self.param,)
+        steps = self.func(*args)
+        func = next(steps)
+        try:
+            func()  # warm caches and connections outside of the timing
+            timings = timeit.repeat(
+                func, number=self.number, repeat=self.repeat)
+        finally:
+            for _ in steps:
+                pass
+        per_call = [timing / self.number for timing in timings]
+        return {
+            'min': min(per_call),
+            'median': statistics.median(per_call),
+            'number': self.number,
+            'repeat': self.repeat,
+        }
+
+
+def benchmark(number=1, repeat=5, params=None):
+    """Register a generator function as a benchmark.
+
+    :param number: Calls per timing.
+    :param repeat: Number of timings, the best and median are kept.
+    :param params: Values the function is called with, one benchmark named
+        ``func[value]`` is registered for each of them.
+    """
+    def decorator(func):
+        module = func.__module__.rpartition('.')[2]
+        name = f'{module}.{func.__name__}'
+        if params is None:
+            BENCHMARKS.append(Benchmark(name, func, number, repeat))
+        else:
+            for param in params:
+                BENCHMARKS.append(Benchmark(
+                    f'{name}[{param}]', func, number, repeat, param))
+        return func
+    return decorator
+
+
+def discover():
+    """Import every ``bench_*`` module of this package.
+
+    :returns: The list of registered benchmarks.
+    """
+    package = os.path.dirname(os.path.abspath(__file__))
+    for module in pkgutil.iter_modules([package]):
+        if module.name.startswith('bench_'):
+            importlib.import_module(f'{__package__}.{module.name}')
+    return BENCHMARKS
+
+
+def environment():
+    """Describe where results were measured, saved alongside them."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(BASELINE),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor_count': os.cpu_count(),
+    }
+
+
+def load(path=BASELINE):
+    """Load saved results, an empty baseline if there are none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'environment': {}, 'results': {}}
+
+
+def save(results, path=BASELINE):
+    """Save results as the new baseline, keeping benchmarks not rerun."""
+    baseline = load(path)
+    baseline['environment'] = environment()
+    baseline['results'].update(results)
+    baseline['results'] = dict(sorted(baseline['results'].items()))
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+
+
+def compare(results, baseline, threshold=0.2):
+    """Find the benchmarks slower than their baseline.
+
+    Best timings are compared, they are the least sensitive to noise.
+
+    :param threshold: Relative slowdown tolerated, 0.2 for 20%.
+    :returns: dict mapping the names of regressed benchmarks to their
+        relative change.
+    """
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        change = result['min'] / previous['min'] - 1
+        if change > threshold:
+            regressions[name] = change
+    return regressions
+
+
+def format_seconds(seconds):
+    """Format a duration with a unit suiting its magnitude."""
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3f} {unit}'
+    return f'{seconds / 1e-9:.1f} ns'
@@ -5,18 +5,38 @@ server, allowing the user to customize how return codes are handled depending
 on the context.
 
 """
+import asyncio
 import logging
 import os
-from json import JSONDecodeError
-from pprint import pformat
-from urllib.parse import urljoin, urlunparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit, urlunparse
+
+import aiohttp
 
 import requests
+from requests.adapters import (
+    DEFAULT_POOLBLOCK,
+    DEFAULT_POOLSIZE,
+    HTTPAdapter,
+)
 from requests.auth import AuthBase
-from requests.exceptions import HTTPError
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.poolmanager import PoolManager
+
+import yarl
 
-from integrade import config, exceptions
-from integrade.exceptions import MissingConfigurationError
+from integrade import cache, codec, config, exceptions, metrics, tracing
+from integrade.exceptions import (
+    CloudigradeHTTPError,
+    MissingConfigurationError,
+)
+from integrade.retry import default_policy
 from integrade.tests.constants import (
     QA_URL, STAGE_URL
 )
@@ -27,50 +47,25 @@ from integrade.tests.utils import (
 AUTHORIZATION_HEADER = 'Authorization'
 logger = logging.getLogger(__name__)
 
+# `get_session` uses these as a per-process cache. A session must not be
+# shared across a fork, because the child would inherit the parent's sockets.
+_SESSION = None
+_SESSION_PID = None
+_SESSION_LOCK = threading.Lock()
+
 
 def raise_error_for_status(response):
-    """Generate an error message and raise HTTPError for bad return codes.
+    """Raise CloudigradeHTTPError for bad return codes.
 
-    :raises: ``requests.exceptions.HTTPError`` if the response status code is
-        in the 4XX or 5XX range.
+    The report of the error is only rendered if it is printed, see
+    :class:`integrade.exceptions.CloudigradeHTTPError`.
+
+    :raises: ``integrade.exceptions.CloudigradeHTTPError``, a
+        ``requests.exceptions.HTTPError``, if the response status code is in
+        the 4XX or 5XX range.
     """
     if 400 <= response.status_code <= 599:
-        error_msgs = (
-            '\n============================================================\n'
-            '\nThe request you made received a status code that indicates\n'
-            'an error was encountered. Details about the request and the\n'
-            'response are below.\n'
-            '\n============================================================\n'
-        )
-
-        try:
-            response_message = 'json_error_message : {}'.format(
-                pformat(response.json()))
-        except JSONDecodeError:
-            response_message = 'text_error_message : {}'.format(
-                pformat(response.text))
-
-        error_headers = response.request.headers.copy()
-        if error_headers.get(AUTHORIZATION_HEADER) is not None:
-            error_headers[AUTHORIZATION_HEADER] = '*' * 8
-        error_msgs += '\n\n'.join(
-            [
-                'request url : {}'.format(pformat(
-                    response.request.url)),
-                'request path : {}'.format(pformat(
-                    response.request.path_url)),
-                'request body : {}'.format(pformat(
-                    response.request.body)),
-                'request headers : {}'.format(pformat(
-                    error_headers)),
-                'response code : {}'.format(response.status_code),
-                '{error_message}'.format(error_message=response_message)
-            ]
-        )
-        error_msgs += (
-            '\n============================================================\n'
-        )
-        raise HTTPError(error_msgs)
+        raise CloudigradeHTTPError(response)
 
 
 def echo_handler(response):
@@ -98,6 +93,16 @@ def json_handler(response):
     return response.json()
 
 
+def shared_json_handler(response):
+    """Like ``json_handler``, but return the read-only shared body.
+
+    See :meth:`integrade.api.APIResponse.shared_json`. Polling callers which
+    only read the listings use it, so unchanged bodies are decoded once.
+    """
+    raise_error_for_status(response)
+    return response.shared_json()
+
+
 class TokenAuth(AuthBase):
     """A class that enables token authentication with the Requests library.
 
@@ -120,6 +125,376 @@ class TokenAuth(AuthBase):
         return request
 
 
+class ConnectionStats(object):
+    """Thread-safe counters of how a session used its connections.
+
+    Every request sent by the session either reuses a kept-alive connection
+    or has to open a new one, so ``reused`` is ``requests - opened``.
+    """
+
+    def __init__(self):
+        """Start all counters at zero."""
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+
+    def connection_opened(self):
+        """Count a newly opened connection."""
+        with self._lock:
+            self.opened += 1
+
+    def request_sent(self):
+        """Count a request sent over any connection."""
+        with self._lock:
+            self.requests += 1
+
+    def as_dict(self):
+        """Return the counters as a dict."""
+        with self._lock:
+            return {
+                'opened': self.opened,
+                'reused': max(0, self.requests - self.opened),
+                'requests': self.requests,
+            }
+
+
+class _CountingConnectionMixin(object):
+    """Report each new socket to the ``stats`` handed over by the pool.
+
+    The time taken to connect is reported to the trace of the request too,
+    see :mod:`integrade.tracing`.
+    """
+
+    stats = None
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        self._connect_time = time.perf_counter() - start
+        if self.stats is not None:
+            self.stats.connection_opened()
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        self._connect_time = None
+        super().connect()
+        trace = tracing.current()
+        if trace is not None and self._connect_time is not None:
+            tls = None
+            if isinstance(self, HTTPSConnection):
+                tls = time.perf_counter() - start - self._connect_time
+            trace.connected(self._connect_time, tls)
+
+
+class _CountingHTTPConnection(_CountingConnectionMixin, HTTPConnection):
+    pass
+
+
+class _CountingHTTPSConnection(_CountingConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TrackingPoolMixin(object):
+    """Hand the pool's ``stats`` over to every connection it creates."""
+
+    stats = None
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        conn.stats = self.stats
+        return conn
+
+
+class _TrackingHTTPConnectionPool(_TrackingPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _TrackingHTTPSConnectionPool(_TrackingPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _TrackingPoolManager(PoolManager):
+    """A ``PoolManager`` whose pools report to a :class:`ConnectionStats`."""
+
+    def __init__(self, *args, stats=None, **kwargs):
+        """Initialize the manager to use the connection tracking pools."""
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+        self.pool_classes_by_scheme = {
+            'http': _TrackingHTTPConnectionPool,
+            'https': _TrackingHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, *args, **kwargs):
+        pool = super()._new_pool(*args, **kwargs)
+        pool.stats = self.stats
+        return pool
+
+
+class APIResponse(requests.Response):
+    """A ``requests.Response`` which decodes its body with a fast codec.
+
+    The body is decoded by the codec of :mod:`integrade.codec`. Each call to
+    :meth:`json` decodes a value of its own, as the same response may be
+    handed to many callers by :class:`integrade.cache.ResponseCache`.
+    :meth:`shared_json` decodes once and returns a read-only value instead.
+
+    ``from_cache`` tells whether the server answered 304 and the body is the
+    cached one. ``cache_entry`` is the :class:`integrade.cache.Entry` the
+    response shares a read-only decoded body with, if any, see
+    :meth:`shared_json` and :mod:`integrade.cache`.
+    """
+
+    from_cache = False
+    cache_entry = None
+    _shared = None
+
+    def json(self, **kwargs):
+        """Return the decoded body, which the caller may change.
+
+        Passing arguments to ``json.loads`` decodes a body of its own, with
+        the standard library, instead.
+
+        :raises: ``requests.exceptions.JSONDecodeError`` if the body is not
+            JSON.
+        """
+        if kwargs:
+            return super().json(**kwargs)
+        return self._decode(lambda: codec.decode(self.content, self.encoding))
+
+    def shared_json(self):
+        """Return the decoded body, read-only and shared when cached.
+
+        Responses with the same body as the cached one share a value decoded
+        only once, see :mod:`integrade.cache`. Trying to change it raises
+        ``TypeError``, use ``copy.deepcopy`` to get a copy which can be.
+
+        :raises: ``requests.exceptions.JSONDecodeError`` if the body is not
+            JSON.
+        """
+        if self.cache_entry is not None:
+            return self._decode(self.cache_entry.json)
+        if self._shared is None:
+            self._shared = (config.freeze(self.json()),)
+        return self._shared[0]
+
+    @staticmethod
+    def _decode(decode):
+        """Call ``decode``, raising decoding errors like `Requests`_ does."""
+        try:
+            return decode()
+        except ValueError as error:
+            raise requests.exceptions.JSONDecodeError(
+                getattr(error, 'msg', str(error)),
+                getattr(error, 'doc', ''),
+                getattr(error, 'pos', 0),
+            )
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """An ``HTTPAdapter`` that keeps count of how its connections are used.
+
+    Requests sent through the adapter either open a new connection or reuse a
+    kept-alive one from the pool of the target host. Use
+    :meth:`connection_stats` to find out how many of each happened.
+
+    GET responses are cached in ``cache``, a
+    :class:`integrade.cache.ValidatorCache`, unless it is None.
+    """
+
+    def __init__(self, *args, cache=None, **kwargs):
+        """Initialize the adapter and its connection counters."""
+        self.stats = ConnectionStats()
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK,
+                         **pool_kwargs):
+        """Initialize a pool manager that counts opened connections."""
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _TrackingPoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            stats=self.stats,
+            **pool_kwargs
+        )
+
+    def build_response(self, req, resp):
+        """Build an :class:`APIResponse` out of an urllib3 response."""
+        response = super().build_response(req, resp)
+        response.__class__ = APIResponse
+        return response
+
+    def send(self, request, **kwargs):
+        """Send the request, counting it towards the connection stats.
+
+        Unless streamed, the response body is read too, and GET responses go
+        through the cache. The time it all takes is recorded as an
+        ``api.request`` span, see :mod:`integrade.metrics`, and the request
+        is traced, see :mod:`integrade.tracing`.
+        """
+        self.stats.request_sent()
+        stream = kwargs.get('stream')
+        entry = None
+        if self.cache is not None and not stream:
+            entry = self.cache.prepare(request)
+        endpoint = metrics.endpoint(urlsplit(request.url).path)
+        with metrics.span('api.request', method=request.method,
+                          endpoint=endpoint), \
+                tracing.trace(request.method, endpoint) as trace:
+            response = super().send(request, **kwargs)
+            trace.headers_received(response)
+            if stream:
+                length = response.headers.get('Content-Length')
+                trace.bytes = int(length) if length else None
+                return response
+            # Read the body now, rather than right after in Session.send, for
+            # the trace to include it.
+            trace.bytes = len(response.content)
+        if self.cache is not None:
+            self.cache.update(request, response, entry)
+        return response
+
+    def connection_stats(self):
+        """Return a dict with the opened, reused and requests counters."""
+        return self.stats.as_dict()
+
+
+def new_session(cfg=None):
+    """Build a ``requests.Session`` backed by a :class:`PooledHTTPAdapter`.
+
+    The pool size, the per host connection limit, keep-alive behavior and
+    the response cache are read from the integrade configuration (see
+    integrade/config.py).
+    """
+    if cfg is None:
+        cfg = config.get_config()
+    validators = None
+    if cfg.get('http_cache', True):
+        validators = cache.ValidatorCache(
+            cfg.get('http_cache_size', cache.DEFAULT_SIZE))
+    adapter = PooledHTTPAdapter(
+        pool_connections=cfg.get('http_pool_connections', DEFAULT_POOLSIZE),
+        pool_maxsize=cfg.get('http_pool_maxsize', DEFAULT_POOLSIZE),
+        pool_block=cfg.get('http_pool_block', DEFAULT_POOLBLOCK),
+        cache=validators,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not cfg.get('http_keep_alive', True):
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def get_session(cfg=None):
+    """Return the ``requests.Session`` shared by all clients of this process.
+
+    The session is created on first use and recreated in a forked child, so
+    that processes never share connections.
+    """
+    global _SESSION, _SESSION_PID  # pylint:disable=global-statement
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION_PID != os.getpid():
+            _SESSION = new_session(cfg)
+            _SESSION_PID = os.getpid()
+        return _SESSION
+
+
+def connection_stats(session=None):
+    """Return how many connections were opened and reused by ``session``.
+
+    If no session is given, report on the shared session returned by
+    :func:`get_session`.
+
+    :returns: dict with the ``opened``, ``reused`` and ``requests`` counters.
+    """
+    if session is None:
+        session = get_session()
+    stats = {'opened': 0, 'reused': 0, 'requests': 0}
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        if isinstance(adapter, PooledHTTPAdapter):
+            for key, value in adapter.connection_stats().items():
+                stats[key] += value
+    return stats
+
+
+def cache_stats(session=None):
+    """Return how the response cache of ``session`` was used.
+
+    If no session is given, report on the shared session returned by
+    :func:`get_session`. See :meth:`integrade.cache.ValidatorCache.stats`.
+
+    :returns: dict with the ``hits``, ``unchanged``, ``misses`` and
+        ``entries`` counters.
+    """
+    if session is None:
+        session = get_session()
+    stats = {'hits': 0, 'unchanged': 0, 'misses': 0, 'entries': 0}
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        if getattr(adapter, 'cache', None) is not None:
+            for key, value in adapter.cache.stats().items():
+                stats[key] += value
+    return stats
+
+
+def _api_url(cfg):
+    """Build the base URL of the API from the configuration.
+
+    :raises: ``integrade.exceptions.BaseUrlNotFound`` if no base url is
+        configured.
+    """
+    hostname = cfg.get('base_url')
+
+    if not hostname:
+        raise exceptions.BaseUrlNotFound(
+            'Make sure you have $CLOUDIGRADE_BASE_URL set in in'
+            ' your environment.'
+        )
+
+    return urlunparse(
+        (
+            cfg.get('scheme'),
+            hostname,
+            'api/{}/'.format(cfg.get('api_version')),
+            '', '', ''
+        ))
+
+
+def _superuser_token(cfg):
+    """Return the superuser token from the configuration.
+
+    :raises: ``integrade.exceptions.TokenNotFound`` if no token is
+        configured.
+    """
+    token = cfg.get('superuser_token')
+    if not token:
+        raise exceptions.TokenNotFound(
+            'No token was found to authenticate with the server. Make '
+            'sure you have $CLOUDIGRADE_TOKEN set in in your '
+            'environment.'
+        )
+    return token
+
+
+def _encode_json(kwargs, headers):
+    """Encode the ``json`` argument of a request with the fast codec.
+
+    The payload is moved to ``data`` and the ``Content-Type`` set, as
+    `Requests`_ would do with the standard library.
+    """
+    payload = kwargs.pop('json', None)
+    if payload is not None and kwargs.get('data') is None:
+        kwargs['data'] = codec.encode(payload)
+        headers.setdefault('Content-Type', 'application/json')
+
+
 class Client(object):
     """A client for interacting with the cloudigrade API.
 
@@ -140,6 +515,10 @@ class Client(object):
     You can override this base url by assigning a new value to the url
     field.
 
+    Requests are sent through a pooled, kept-alive ``requests.Session``. By
+    default all clients share the session returned by
+    :func:`integrade.api.get_session`.
+
     Example::
         >>> from integrade import api
         >>> client = api.Client()
@@ -157,7 +536,7 @@ class Client(object):
     """
 
     def __init__(self, response_handler=None, url=None, authenticate=True,
-                 token=None):
+                 token=None, session=None, retry=None, cache=None):
         """Initialize this object, collecting base URL from config file.
 
         If no response handler is specified, use the `code_handler` which will
@@ -166,44 +545,37 @@ class Client(object):
         If no URL is specified, then the url will be built from the
         environment variables $CLOUDIGRADE_BASE_URL and $USE_HTTPS values (see
         integrade/config.py).
+
+        If no session is specified, use the session shared by all clients.
+
+        If no retry policy is specified, use the one of the configuration,
+        see :mod:`integrade.retry`.
+
+        If a :class:`integrade.cache.ResponseCache` is specified, GET requests
+        are answered from it when they can be.
         """
         self.token = token
         self.url = url
         cfg = config.get_config()
         self.verify = cfg.get('ssl-verify', False)
+        self.session = session if session is not None else get_session(cfg)
+        self.retry = retry if retry is not None else default_policy(cfg)
+        self.cache = cache
 
         if not self.url:
-            hostname = cfg.get('base_url')
-
-            if not hostname:
-                raise exceptions.BaseUrlNotFound(
-                    'Make sure you have $CLOUDIGRADE_BASE_URL set in in'
-                    ' your environment.'
-                )
-
-            scheme = cfg.get('scheme')
-            self.url = urlunparse(
-                (
-                    scheme,
-                    hostname,
-                    'api/{}/'.format(cfg.get('api_version')),
-                    '', '', ''
-                ))
+            self.url = _api_url(cfg)
 
         if response_handler is None:
             self.response_handler = code_handler
         else:
             self.response_handler = response_handler
 
-        if authenticate:
-            if not self.token:
-                self.token = cfg.get('superuser_token')
-            if not self.token:
-                raise exceptions.TokenNotFound(
-                    'No token was found to authenticate with the server. Make '
-                    'sure you have $CLOUDIGRADE_TOKEN set in in your '
-                    'environment.'
-                )
+        if authenticate and not self.token:
+            self.token = _superuser_token(cfg)
+
+    def connection_stats(self):
+        """Return how many connections this client's session opened/reused."""
+        return connection_stats(self.session)
 
     def default_headers(self):
         """Build the headers for our request to the server."""
@@ -254,7 +626,7 @@ class Client(object):
         """
         # The `self.request_kwargs` dict should *always* have a "url" argument.
         # This is enforced by `self.__init__`. This allows us to call the
-        # `requests.request` function and satisfy its signature:
+        # `requests.Session.request` method and satisfy its signature:
         #
         #     request(method, url, **kwargs)
         #
@@ -262,24 +634,43 @@ class Client(object):
         headers.update(kwargs.get('headers', {}))
         kwargs['headers'] = headers
         kwargs.setdefault('verify', self.verify)
-        return self.response_handler(requests.request(method, url, **kwargs))
+        _encode_json(kwargs, headers)
+
+        def send_once():
+            return self.retry.send(method, url, lambda: self.session.request(
+                method, url, **kwargs))
+
+        if self.cache is None:
+            return self.response_handler(send_once())
+        return self.response_handler(self.cache.send(
+            method, url, send_once, kwargs.get('params'),
+            cache.identity(headers, kwargs.get('auth'))))
 
 
 class ClientV2(object):
     """A lightweight client for interacting with the cloudigrade API V2.
 
     This class is a wrapper around the ``requests.api`` module provided by
-    `Requests`_.
+    `Requests`_. Like :class:`Client`, requests are sent through a pooled,
+    kept-alive ``requests.Session``.
 
     .. _Requests: http://docs.python-requests.org/en/master/
     """
 
     def __init__(self, url=None, response_handler=None, auth=None,
-                 env=None, branch=None):
-        """Initialize this object, collecting base URL."""
-        self.url = url
+                 env=None, branch=None, session=None, retry=None, cache=None):
+        """Initialize this object, collecting base URL.
+
+        If no URL is specified, use $CLOUDIGRADE_API_V2_URL if set, or guess
+        the URL of the environment from the branch name. Requests are retried,
+        and answered from ``cache`` if given, like those of :class:`Client`.
+        """
         cfg = config.get_config()
+        self.url = url or cfg.get('api_v2_url')
         self.verify = cfg.get('ssl-verify', False)
+        self.session = session if session is not None else get_session(cfg)
+        self.retry = retry if retry is not None else default_policy(cfg)
+        self.cache = cache
         self.auth = auth if auth is not None else get_credentials()
         self.env = env
         if branch is None:
@@ -312,16 +703,390 @@ class ClientV2(object):
             'X-4Scale-Branch': self.branch,
         }
 
+    def connection_stats(self):
+        """Return how many connections this client's session opened/reused."""
+        return connection_stats(self.session)
+
+    def _send(self, method, endpoint, **kwargs):
+        """Send an HTTP request and return the response as is."""
+        url = urljoin(self.url, endpoint)
+        logger.debug(f'{method} {url} {self.headers} {self.auth} {kwargs}')
+        headers = dict(self.headers)
+        _encode_json(kwargs, headers)
+
+        def send_once():
+            return self.retry.send(method, url, lambda: self.session.request(
+                method=method,
+                url=url,
+                headers=headers,
+                auth=self.auth,
+                verify=self.verify,
+                **kwargs
+            ))
+
+        if self.cache is None:
+            return send_once()
+        return self.cache.send(
+            method, url, send_once, kwargs.get('params'),
+            cache.identity(self.headers, self.auth))
+
     def request(self, method, endpoint, **kwargs):
         """Send an HTTP request."""
+        return self.response_handler(self._send(method, endpoint, **kwargs))
+
+    def _get_page(self, endpoint, shared=False, **kwargs):
+        """Fetch and decode one page of a list endpoint."""
+        handler = shared_json_handler if shared else json_handler
+        return handler(self._send('get', endpoint, **kwargs))
+
+    def iter_pages(self, endpoint, prefetch=True, shared=False, **kwargs):
+        """Yield the decoded pages of a paginated list endpoint.
+
+        Pages are fetched by following ``links.next`` until there is no next
+        page. Any ``kwargs`` (for example ``params``) are only used for the
+        first request, the next links already carry the query.
+
+        When ``prefetch`` is true, the next page is requested in a background
+        thread while the caller works on the current one. Once the caller
+        stops iterating, no more pages are requested.
+
+        When ``shared`` is true, the pages are the read-only values of
+        :meth:`APIResponse.shared_json`, which pollers only reading them
+        should ask for.
+
+        :raises: ``requests.exceptions.HTTPError`` if any page is answered
+            with a 4XX or 5XX status code.
+        """
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        next_page = None
+        try:
+            page = self._get_page(endpoint, shared, **kwargs)
+            while True:
+                next_url = (page.get('links') or {}).get('next')
+                if next_url and executor is not None:
+                    next_page = executor.submit(
+                        self._get_page, next_url, shared)
+                yield page
+                if not next_url:
+                    return
+                if next_page is not None:
+                    page = next_page.result()
+                    next_page = None
+                else:
+                    page = self._get_page(next_url, shared)
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def iter_objects(self, endpoint, prefetch=True, shared=False, **kwargs):
+        """Yield the objects of a paginated list endpoint one at a time.
+
+        This is a lazy version of collecting the ``data`` of every page, see
+        :meth:`iter_pages`. Looking for a specific object is cheap, as no
+        more pages are fetched once it is found::
+
+            >>> client = api.ClientV2()
+            >>> image = next((
+            ...     image for image in client.iter_objects('images/')
+            ...     if image['content_object']['ec2_ami_id'] == ec2_ami_id
+            ... ), None)
+        """
+        for page in self.iter_pages(
+                endpoint, prefetch=prefetch, shared=shared, **kwargs):
+            yield from page.get('data', [])
+
+
+def _build_response(prepared, status, reason, headers, content):
+    """Build an :class:`APIResponse` out of an already read HTTP response.
+
+    This lets the response handlers in this module, which expect `Requests`_
+    responses, be used with responses received by :class:`AsyncClient`.
+    """
+    response = APIResponse()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = prepared.url
+    response.request = prepared
+    response._content = content
+    return response
+
+
+async def _close_on_shutdown(session):
+    """Wait, as an async generator, to close a session with its event loop.
+
+    :class:`AsyncClient` starts one for each of its sessions. Event loops
+    close the async generators started in them when shutting down.
+    """
+    try:
+        yield
+    finally:
+        await session.close()
+
+
+class AsyncClient(object):
+    """An asyncio client for interacting with the cloudigrade API.
+
+    It exposes the same methods as :class:`Client`, but they are coroutines
+    and the requests are sent by `aiohttp`_. The requests are prepared by
+    `Requests`_, so ``auth`` (like :class:`TokenAuth`), ``params``, ``data``
+    and ``json`` work as they do with the other clients. The responses are
+    also handed to the ``response_handler`` as ``requests.Response`` objects.
+
+    No more than ``max_concurrency`` requests are in flight at the same time,
+    the rest wait for their turn. If not specified, the limit is read from
+    $INTEGRADE_ASYNC_MAX_CONCURRENCY (see integrade/config.py).
+
+    Use :meth:`from_client` to build an async client with the URL,
+    authentication and headers of a :class:`Client` or :class:`ClientV2`.
+
+    Example::
+        >>> import asyncio
+        >>> from integrade import api
+        >>> async def fetch_images(image_ids):
+        ...     async with api.AsyncClient(
+        ...             response_handler=api.json_handler) as client:
+        ...         return await asyncio.gather(*(
+        ...             client.get(f'image/{image_id}/')
+        ...             for image_id in image_ids
+        ...         ))
+        >>> images = asyncio.get_event_loop().run_until_complete(
+        ...     fetch_images(range(1, 200)))
+
+    The underlying ``aiohttp.ClientSession`` belongs to the event loop in
+    which the first request was made. Close the client with :meth:`close`, or
+    use it as an async context manager, when done. Otherwise the session is
+    closed when its event loop shuts down, as ``asyncio.run`` does it. A
+    request made in another event loop gets a new session, and the previous
+    one is closed if its event loop still runs, or detached otherwise.
+
+    .. _aiohttp: https://docs.aiohttp.org/
+    .. _Requests: http://docs.python-requests.org/en/master/
+    """
+
+    def __init__(self, response_handler=None, url=None, authenticate=True,
+                 token=None, auth=None, headers=None, max_concurrency=None,
+                 retry=None, cache=None):
+        """Initialize this object, collecting base URL from config file.
+
+        The ``response_handler``, ``url``, ``authenticate``, ``token``,
+        ``retry`` and ``cache`` arguments behave like they do for
+        :class:`Client`.
+        Additionally ``auth`` is used for every request that does not provide
+        its own and ``headers`` are sent with every request.
+        """
+        cfg = config.get_config()
+        self.url = url if url else _api_url(cfg)
+        self.token = token
+        if authenticate and not self.token and auth is None:
+            self.token = _superuser_token(cfg)
+        self.auth = auth
+        self.headers = dict(headers or {})
+        self.verify = cfg.get('ssl-verify', False)
+        self.retry = retry if retry is not None else default_policy(cfg)
+        self.cache = cache
+        if response_handler is None:
+            self.response_handler = code_handler
+        else:
+            self.response_handler = response_handler
+        if max_concurrency is None:
+            max_concurrency = cfg.get('async_max_concurrency', 50)
+        self.max_concurrency = max_concurrency
+        self._limit_per_host = cfg.get('http_pool_maxsize', 10)
+        self._keep_alive = cfg.get('http_keep_alive', True)
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        self._closer = None
+
+    @classmethod
+    def from_client(cls, client, **kwargs):
+        """Build an async client that talks to the server like ``client``.
+
+        :param client: A :class:`Client` or :class:`ClientV2` instance. Its
+            URL, response handler, token or auth, headers, retry policy and
+            cache are used unless overridden by ``kwargs``.
+        """
+        kwargs.setdefault('url', client.url)
+        kwargs.setdefault('response_handler', client.response_handler)
+        kwargs.setdefault('token', getattr(client, 'token', None))
+        kwargs.setdefault('auth', getattr(client, 'auth', None))
+        kwargs.setdefault('headers', getattr(client, 'headers', None))
+        kwargs.setdefault('retry', getattr(client, 'retry', None))
+        kwargs.setdefault('cache', getattr(client, 'cache', None))
+        kwargs.setdefault('authenticate', False)
+        return cls(**kwargs)
+
+    def default_headers(self):
+        """Build the headers for our request to the server."""
+        headers = dict(self.headers)
+        if self.token:
+            headers[AUTHORIZATION_HEADER] = 'Token {}'.format(self.token)
+        return headers
+
+    async def _ensure_session(self):
+        """Return the session and semaphore bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._loop is not loop:
+            self._release_session()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency,
+                    limit_per_host=self._limit_per_host,
+                    force_close=not self._keep_alive,
+                ))
+            # Event loops close their async generators when shutting down,
+            # this one closes the session then.
+            self._closer = _close_on_shutdown(self._session)
+            await self._closer.asend(None)
+        return self._session, self._semaphore
+
+    def _release_session(self):
+        """Let go of the session of a previous event loop.
+
+        The session is closed in its event loop if that loop still runs, in
+        another thread. Otherwise it can not be closed anymore and is only
+        detached, so that it is not reported as unclosed.
+        """
+        session, loop = self._session, self._loop
+        self._session = self._closer = None
+        if session is None or session.closed:
+            return
+        if loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            session.detach()
+
+    async def close(self):
+        """Close the underlying ``aiohttp.ClientSession``."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = self._closer = None
+
+    async def __aenter__(self):
+        """Use the client as an async context manager."""
+        return self
+
+    async def __aexit__(self, *args):
+        """Close the client when leaving the context."""
+        await self.close()
+
+    async def delete(self, endpoint, **kwargs):
+        """Send an HTTP DELETE request."""
         url = urljoin(self.url, endpoint)
-        logger.debug(f'{method} {url} {self.headers} {self.auth} {kwargs}')
-        response = requests.request(
-            method=method,
-            url=url,
-            headers=self.headers,
-            auth=self.auth,
-            verify=self.verify,
+        return await self.request('DELETE', url, **kwargs)
+
+    async def get(self, endpoint='', **kwargs):
+        """Send an HTTP GET request."""
+        url = urljoin(self.url, endpoint)
+        return await self.request('GET', url, **kwargs)
+
+    async def options(self, endpoint, **kwargs):
+        """Send an HTTP OPTIONS request."""
+        url = urljoin(self.url, endpoint)
+        return await self.request('OPTIONS', url, **kwargs)
+
+    async def head(self, endpoint, **kwargs):
+        """Send an HTTP HEAD request."""
+        url = urljoin(self.url, endpoint)
+        return await self.request('HEAD', url, **kwargs)
+
+    async def patch(self, endpoint, payload, **kwargs):
+        """Send an HTTP PATCH request."""
+        url = urljoin(self.url, endpoint)
+        return await self.request('PATCH', url, json=payload, **kwargs)
+
+    async def post(self, endpoint, payload, **kwargs):
+        """Send an HTTP POST request."""
+        url = urljoin(self.url, endpoint)
+        return await self.request('POST', url, json=payload, **kwargs)
+
+    async def put(self, endpoint, payload, **kwargs):
+        """Send an HTTP PUT request."""
+        url = urljoin(self.url, endpoint)
+        return await self.request('PUT', url, json=payload, **kwargs)
+
+    async def request(self, method, url, **kwargs):
+        """Send an HTTP request.
+
+        ``url`` may be relative to the base URL of the client. Besides the
+        arguments accepted by ``requests.Request`` (``params``, ``data``,
+        ``json``, ``auth``, ...), ``verify`` and ``timeout`` (in seconds) are
+        also accepted.
+        """
+        headers = self.default_headers()
+        headers.update(kwargs.pop('headers', None) or {})
+        verify = kwargs.pop('verify', self.verify)
+        timeout = kwargs.pop('timeout', None)
+        kwargs.setdefault('auth', self.auth)
+        _encode_json(kwargs, headers)
+        prepared = requests.Request(
+            method.upper(),
+            urljoin(self.url, url),
+            headers=headers,
             **kwargs
-        )
-        return self.response_handler(response)
+        ).prepare()
+        session, semaphore = await self._ensure_session()
+        endpoint = metrics.endpoint(urlsplit(prepared.url).path)
+
+        async def send_once(attempt):
+            async with semaphore:
+                started = time.time()
+                start = time.perf_counter()
+                status = content = error = None
+                try:
+                    async with session.request(
+                            prepared.method,
+                            yarl.URL(prepared.url, encoded=True),
+                            headers=dict(prepared.headers),
+                            data=prepared.body,
+                            ssl=None if verify else False,
+                            timeout=aiohttp.ClientTimeout(total=timeout),
+                    ) as response:
+                        status = response.status
+                        content = await response.read()
+                except BaseException as exc:
+                    error = type(exc).__name__
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - start
+                    metrics.observe(
+                        'api.request', elapsed, method=prepared.method,
+                        endpoint=endpoint)
+                    tracing.buffer().add(tracing.RequestRecord(
+                        started=started,
+                        method=prepared.method,
+                        endpoint=endpoint,
+                        status=status,
+                        bytes=None if content is None else len(content),
+                        elapsed=elapsed,
+                        connect=None,
+                        tls=None,
+                        server=None,
+                        retries=attempt,
+                        test=metrics.current_test(),
+                        error=error,
+                    ))
+            return _build_response(
+                prepared,
+                response.status,
+                response.reason,
+                response.headers,
+                content,
+            )
+
+        if self.cache is None:
+            return self.response_handler(await self.retry.send_async(
+                prepared.method, prepared.url, send_once))
+        return self.response_handler(await self.cache.send_async(
+            prepared.method,
+            prepared.url,
+            lambda: self.retry.send_async(
+                prepared.method, prepared.url, send_once),
+            cache.identity(prepared.headers),
+        ))
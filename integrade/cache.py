@@ -0,0 +1,445 @@
+"""Cache the bodies of GET responses, and revalidate them with the server.
+
+Waiters poll the same listings again and again, while the data changes
+seldom. :class:`ValidatorCache` keeps the last response to each GET request,
+per URL and authentication, and :class:`integrade.api.PooledHTTPAdapter`
+uses it to:
+
+* Send a conditional request, with ``If-None-Match`` or ``If-Modified-Since``,
+  when the cached response had an ``ETag`` or a ``Last-Modified`` header. A
+  304 answer is turned back into the cached 200 response, and its body is
+  not sent again.
+* Decode the JSON body of a response only once, for callers opting in with
+  :meth:`integrade.api.APIResponse.shared_json`, like the waiters polling
+  listings through :func:`integrade.api.shared_json_handler` or
+  ``iter_objects(..., shared=True)``. Responses whose body has the same
+  digest as the cached one, a 304 included, share its decoded value.
+
+Shared values are read-only, see :func:`integrade.config.freeze`. ``json()``
+still decodes a value of its own, which the caller may change: copying the
+shared value takes longer than decoding the body again.
+
+The cache is enabled by default and holds $INTEGRADE_HTTP_CACHE_SIZE
+responses, 256 by default. Set $INTEGRADE_HTTP_CACHE to false to disable it.
+Responses with ``Cache-Control: no-store`` are never cached, and requests
+which already have conditional headers are sent as they are.
+
+Example::
+
+    >>> from integrade import api
+    >>> client.get(urls.IMAGE).from_cache
+    False
+    >>> client.get(urls.IMAGE).from_cache
+    True
+    >>> api.cache_stats()
+    {'hits': 1, 'unchanged': 0, 'misses': 1, 'entries': 1}
+
+Some endpoints, like the system configuration or the current user, answer
+the same for the whole run. :class:`ResponseCache` spares even the
+revalidation of those: clients given one with their ``cache`` argument
+answer GET requests to the endpoints it has a :class:`Rule` for from memory
+for a while, until the client changes something at a related path::
+
+    >>> cache = ResponseCache({
+    ...     urls.SYSCONFIG: 3600,
+    ...     urls.AUTH_ME: 300,
+    ...     '/api/v1/image/<id>/': Rule(ttl=60, size=500),
+    ... })
+    >>> client = api.Client(cache=cache)
+    >>> client.get(urls.SYSCONFIG) is client.get(urls.SYSCONFIG)
+    True
+    >>> cache.stats()
+    {'hits': 1, 'misses': 1, 'invalidated': 0, 'entries': 1}
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlsplit
+
+from requests.models import PreparedRequest
+
+from integrade import codec, config, metrics
+
+DEFAULT_SIZE = 256
+"""Number of responses kept when the size is not configured."""
+
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+"""Headers of conditional requests."""
+
+
+def key(request):
+    """Return the cache key of a prepared request.
+
+    The URL includes the query string. The credentials are hashed, not to
+    keep them around.
+    """
+    authorization = request.headers.get('Authorization') or ''
+    return (
+        request.url,
+        hashlib.sha256(authorization.encode('utf-8')).hexdigest(),
+    )
+
+
+def digest(content):
+    """Return the digest of a response body."""
+    return hashlib.sha256(content).digest()
+
+
+class Entry(object):
+    """A cached response.
+
+    :param response: The ``requests.Response`` to a GET request, whose body
+        was read.
+    """
+
+    def __init__(self, response):
+        """Keep the validators, headers and body of the response."""
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.headers = response.headers.copy()
+        self.content = response.content
+        self.encoding = response.encoding
+        self.digest = digest(self.content)
+        self._decoded = None
+        self._lock = threading.Lock()
+
+    def conditional_headers(self):
+        """Return the headers revalidating the entry, if it can be."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def json(self):
+        """Return the decoded body, decoding it on the first call only.
+
+        :raises: ``ValueError`` if the body is not JSON.
+        """
+        with self._lock:
+            if self._decoded is None:
+                self._decoded = (config.freeze(
+                    codec.decode(self.content, self.encoding)),)
+            return self._decoded[0]
+
+
+class ValidatorCache(object):
+    """The latest responses to GET requests, least recently used dropped.
+
+    :param size: Number of responses kept.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        """Start empty."""
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.unchanged = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Return the number of cached responses."""
+        return len(self._entries)
+
+    def get(self, request):
+        """Return the entry of a request, None if it has none."""
+        with self._lock:
+            entry = self._entries.get(key(request))
+            if entry is not None:
+                self._entries.move_to_end(key(request))
+            return entry
+
+    def prepare(self, request):
+        """Make a GET request conditional, if its response is cached.
+
+        :returns: The entry of the request, None if it is not cached or the
+            request is not to be cached.
+        """
+        if request.method != 'GET' or any(
+                header in request.headers for header in CONDITIONAL_HEADERS):
+            return None
+        entry = self.get(request)
+        if entry is not None:
+            request.headers.update(entry.conditional_headers())
+        return entry
+
+    def update(self, request, response, entry=None):
+        """Update the cache with the response to a request.
+
+        A 304 response gets the status, headers and body of the cached one,
+        and its ``from_cache`` attribute is set. The ``cache_entry`` attribute
+        of the response is set to the entry it shares a decoded body with, if
+        any.
+
+        :param entry: The entry returned by :meth:`prepare` for the request.
+        """
+        response.from_cache = False
+        response.cache_entry = None
+        if request.method != 'GET':
+            return
+        if response.status_code == 304 and entry is not None:
+            headers = entry.headers.copy()
+            headers.update(response.headers)
+            response.status_code = 200
+            response.reason = 'OK'
+            response.headers = headers
+            response._content = entry.content
+            response.encoding = entry.encoding
+            response.from_cache = True
+            response.cache_entry = entry
+            with self._lock:
+                self.hits += 1
+            return
+        if response.status_code != 200:
+            return
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            with self._lock:
+                self._entries.pop(key(request), None)
+            return
+        if entry is not None and entry.digest == digest(response.content):
+            # The body did not change, but the validators may have.
+            entry.etag = response.headers.get('ETag')
+            entry.last_modified = response.headers.get('Last-Modified')
+            response.cache_entry = entry
+            with self._lock:
+                self.unchanged += 1
+            return
+        entry = Entry(response)
+        response.cache_entry = entry
+        with self._lock:
+            self.misses += 1
+            self._entries[key(request)] = entry
+            self._entries.move_to_end(key(request))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget all responses and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.unchanged = self.misses = 0
+
+    def stats(self):
+        """Return a dict with the hits, unchanged, misses and entries counts.
+
+        ``hits`` are 304 responses, ``unchanged`` 200 responses with the same
+        body as the cached one, and ``misses`` responses cached anew.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'unchanged': self.unchanged,
+                'misses': self.misses,
+                'entries': len(self._entries),
+            }
+
+
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+"""Methods which do not change anything on the server."""
+
+Rule = namedtuple('Rule', ['ttl', 'size'])
+Rule.__new__.__defaults__ = (DEFAULT_SIZE,)
+Rule.__doc__ = """How long, and how many, responses of an endpoint are cached.
+
+``ttl`` is in seconds, ``size`` the number of responses kept, the least
+recently used ones are dropped first.
+"""
+
+
+def identity(headers=None, auth=None):
+    """Return a digest of the credentials a request is sent with.
+
+    :param headers: The headers of the request, whose ``Authorization`` is
+        used.
+    :param auth: The ``auth`` argument of the request, a tuple or a
+        ``requests.auth.AuthBase``.
+    """
+    parts = [(headers or {}).get('Authorization') or '']
+    if auth is not None:
+        parts.append(repr(auth if isinstance(auth, tuple) else vars(auth)))
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class _Endpoint(object):
+    """The cached responses of the paths matching a rule."""
+
+    def __init__(self, rule):
+        """Start empty."""
+        self.rule = rule
+        self.responses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+
+class ResponseCache(object):
+    """Answer GET requests from memory, for a while.
+
+    Only GET requests to paths matching a rule are cached, and only their
+    200 responses. A rule matches the paths which end like its pattern, ids
+    replaced by ``<id>`` (see :func:`integrade.metrics.endpoint`), so
+    ``'images/<id>/'`` matches the v2 image details whatever the base URL
+    is. Responses are cached per URL, query and credentials.
+
+    Other requests are sent as they are. Those which may change something,
+    like POST, PATCH, PUT and DELETE, drop the cached responses of the
+    related paths: the path itself, the paths it is a prefix of and the ones
+    which are a prefix of it. Changing an image drops the cached image and
+    the cached image list, for example.
+
+    Cached responses are shared: the same response object is returned for
+    every hit.
+
+    :param rules: A dict of the :class:`Rule` of each endpoint pattern, or
+        only its TTL in seconds.
+    :param clock: Callable returning the current time in seconds.
+    """
+
+    def __init__(self, rules, clock=time.monotonic):
+        """Start empty."""
+        self.clock = clock
+        self._endpoints = {
+            pattern: _Endpoint(
+                rule if isinstance(rule, Rule) else Rule(rule))
+            for pattern, rule in rules.items()
+        }
+        self._lock = threading.Lock()
+
+    def _match(self, path):
+        """Return the cached responses of a path, None if it has no rule."""
+        endpoint = metrics.endpoint(path)
+        for pattern, cached in self._endpoints.items():
+            if endpoint.endswith(pattern):
+                return cached
+        return None
+
+    def get(self, key):
+        """Return the cached response to a GET request, None if expired.
+
+        :param key: The key of the request, see :meth:`key`.
+        """
+        cached = self._match(urlsplit(key[0]).path)
+        if cached is None:
+            return None
+        with self._lock:
+            response, expires = cached.responses.get(key, (None, 0))
+            if response is None or expires <= self.clock():
+                cached.responses.pop(key, None)
+                cached.misses += 1
+                return None
+            cached.responses.move_to_end(key)
+            cached.hits += 1
+            return response
+
+    def put(self, key, response):
+        """Cache the response to a GET request, if it has a rule."""
+        cached = self._match(urlsplit(key[0]).path)
+        if cached is None or response.status_code != 200:
+            return
+        with self._lock:
+            cached.responses[key] = (
+                response, self.clock() + cached.rule.ttl)
+            cached.responses.move_to_end(key)
+            while len(cached.responses) > cached.rule.size:
+                cached.responses.popitem(last=False)
+
+    def invalidate(self, url):
+        """Drop the cached responses of the paths related to a URL."""
+        path = urlsplit(url).path
+        with self._lock:
+            for cached in self._endpoints.values():
+                for key in list(cached.responses):
+                    cached_path = urlsplit(key[0]).path
+                    if (cached_path.startswith(path)
+                            or path.startswith(cached_path)):
+                        del cached.responses[key]
+                        cached.invalidated += 1
+
+    @staticmethod
+    def key(url, params=None, auth_identity=''):
+        """Return the key of a request.
+
+        :param url: The URL of the request.
+        :param params: The query parameters added to the URL, if any.
+        :param auth_identity: The digest of the credentials of the request,
+            see :func:`identity`.
+        """
+        if params:
+            prepared = PreparedRequest()
+            prepared.prepare_url(url, params)
+            url = prepared.url
+        return (url, auth_identity)
+
+    def send(self, method, url, send_once, params=None, auth_identity=''):
+        """Answer a request from the cache, or send it.
+
+        :param send_once: Callable sending the request and returning the
+            ``requests.Response``.
+        :param params: The query parameters of the request, if any.
+        :param auth_identity: The digest of the credentials of the request,
+            see :func:`identity`.
+        :returns: The cached response, or the response to the request.
+        """
+        if method.upper() == 'GET':
+            key = self.key(url, params, auth_identity)
+            response = self.get(key)
+            if response is None:
+                response = send_once()
+                self.put(key, response)
+            return response
+        if method.upper() in SAFE_METHODS:
+            return send_once()
+        try:
+            return send_once()
+        finally:
+            self.invalidate(url)
+
+    async def send_async(self, method, url, send_once, auth_identity=''):
+        """Answer a request from the cache, or send it from a coroutine.
+
+        Like :meth:`send`, but ``send_once`` returns a coroutine and ``url``
+        already has the query parameters.
+        """
+        if method.upper() == 'GET':
+            key = self.key(url, auth_identity=auth_identity)
+            response = self.get(key)
+            if response is None:
+                response = await send_once()
+                self.put(key, response)
+            return response
+        if method.upper() in SAFE_METHODS:
+            return await send_once()
+        try:
+            return await send_once()
+        finally:
+            self.invalidate(url)
+
+    def clear(self):
+        """Forget all responses and reset the counters."""
+        with self._lock:
+            for cached in self._endpoints.values():
+                cached.responses.clear()
+                cached.hits = cached.misses = cached.invalidated = 0
+
+    def stats(self, pattern=None):
+        """Return a dict with the hits, misses, invalidated and entries counts.
+
+        ``invalidated`` counts the responses dropped by requests changing a
+        related path.
+
+        :param pattern: The pattern of the rule to report on, all rules when
+            None.
+        """
+        stats = {'hits': 0, 'misses': 0, 'invalidated': 0, 'entries': 0}
+        with self._lock:
+            for key, cached in self._endpoints.items():
+                if pattern is not None and key != pattern:
+                    continue
+                stats['hits'] += cached.hits
+                stats['misses'] += cached.misses
+                stats['invalidated'] += cached.invalidated
+                stats['entries'] += len(cached.responses)
+        return stats
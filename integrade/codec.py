@@ -0,0 +1,140 @@
+"""Encode and decode the JSON exchanged with cloudigrade.
+
+Polling large image and instance lists, with their ``inspection_json``, makes
+decoding JSON a noticeable part of a long run. The clients of
+:mod:`integrade.api` encode payloads and decode responses with the codec
+returned by :func:`default_codec`, chosen by $INTEGRADE_JSON_CODEC:
+
+* ``auto``, the default: orjson if it is installed, the standard library
+  otherwise. Install orjson with ``pip install integrade[fast-json]``.
+* ``orjson`` or ``json`` to pick one.
+
+Both codecs decode to the same values. orjson encodes without spaces, and
+also encodes ``datetime`` objects and dicts with non-string keys.
+
+Example::
+
+    >>> from integrade import codec
+    >>> codec.default_codec().name
+    'orjson'
+    >>> codec.get_codec('json').loads(b'{"count": 1}')
+    {'count': 1}
+"""
+import json
+import threading
+
+from integrade import config
+from integrade.exceptions import MissingConfigurationError
+
+UTF8 = frozenset({'utf-8', 'utf8'})
+"""Encodings of the bodies handed to the codecs as bytes, others are decoded
+to str first."""
+
+# `default_codec` uses these as a cache of the configured codec.
+_DEFAULT = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+class StdlibCodec(object):
+    """Encode and decode JSON with the ``json`` module."""
+
+    name = 'json'
+
+    def loads(self, content):
+        """Decode a JSON document, UTF-8 bytes or str.
+
+        :raises: ``json.JSONDecodeError`` if it is not valid.
+        """
+        if isinstance(content, bytes):
+            # json.loads decodes bytes with the slow surrogatepass handler.
+            content = content.decode('utf-8')
+        return json.loads(content)
+
+    def dumps(self, obj):
+        """Encode an object as JSON, returning UTF-8 bytes."""
+        return json.dumps(obj).encode('utf-8')
+
+
+class OrjsonCodec(object):
+    """Encode and decode JSON with orjson.
+
+    :raises: MissingConfigurationError if orjson is not installed.
+    """
+
+    name = 'orjson'
+
+    def __init__(self):
+        """Import orjson."""
+        try:
+            import orjson
+        except ImportError:
+            raise MissingConfigurationError(
+                'The orjson codec needs orjson, install it with'
+                ' `pip install integrade[fast-json]`.')
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def loads(self, content):
+        """Decode a JSON document, UTF-8 bytes or str.
+
+        :raises: ``json.JSONDecodeError`` if it is not valid.
+        """
+        return self._orjson.loads(content)
+
+    def dumps(self, obj):
+        """Encode an object as JSON, returning UTF-8 bytes."""
+        return self._orjson.dumps(obj, option=self._options)
+
+
+CODECS = {
+    StdlibCodec.name: StdlibCodec,
+    OrjsonCodec.name: OrjsonCodec,
+}
+"""The codec classes, by name."""
+
+
+def get_codec(name='auto'):
+    """Build a codec by name.
+
+    :param name: ``json``, ``orjson``, or ``auto`` for orjson if it is
+        installed and the standard library otherwise.
+    :raises: MissingConfigurationError if the name is unknown, or if the
+        codec needs a package which is not installed.
+    """
+    if name == 'auto':
+        try:
+            return OrjsonCodec()
+        except MissingConfigurationError:
+            return StdlibCodec()
+    if name not in CODECS:
+        raise MissingConfigurationError(
+            f'Unknown JSON codec "{name}", INTEGRADE_JSON_CODEC must be one'
+            f' of auto, {", ".join(sorted(CODECS))}.')
+    return CODECS[name]()
+
+
+def default_codec():
+    """Return the codec of the configuration, built on first use."""
+    global _DEFAULT  # pylint:disable=global-statement
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = get_codec(config.get_config(need_base_url=False).get(
+                'json_codec', 'auto'))
+        return _DEFAULT
+
+
+def decode(content, encoding=None):
+    """Decode a response body with the default codec.
+
+    :param content: The body, as bytes.
+    :param encoding: The encoding of the body, UTF-8 if None.
+    :raises: ``json.JSONDecodeError`` if the body is not valid JSON.
+    """
+    if encoding and encoding.lower() not in UTF8:
+        content = content.decode(encoding)
+    return default_codec().loads(content)
+
+
+def encode(obj):
+    """Encode a payload with the default codec, returning UTF-8 bytes."""
+    return default_codec().dumps(obj)
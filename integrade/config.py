@@ -20,15 +20,113 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 _CONFIG = None
 _AWS_CONFIG = None
 
+# Read-only views of the caches above, keyed by cache name. Each entry keeps
+# the cached object the view was built from, so the view is rebuilt whenever
+# the cache is flushed or replaced (``mock.patch.object(config, '_CONFIG')``).
+_FROZEN_VIEWS = {}
 
-def get_config(need_base_url=True):
-    """Return a copy of the global config dictionary.
+
+def _read_only(self, *args, **kwargs):
+    """Refuse to change a frozen configuration object."""
+    raise TypeError(
+        f'{type(self).__name__} objects are read-only. Use'
+        ' get_config(mutable=True) or get_aws_image_config(mutable=True) to'
+        ' get a copy that can be changed.'
+    )
+
+
+class FrozenDict(dict):
+    """A dictionary that can not be changed once created.
+
+    It is still a ``dict``, so it compares equal to the same data in a plain
+    dictionary and can be serialized as usual. ``copy.deepcopy`` returns a
+    plain, mutable copy.
+    """
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        """Return a shallow, mutable copy."""
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        """Return a deep, mutable copy."""
+        return thaw(self)
+
+    def __reduce__(self):
+        """Pickle without going through the read-only ``__setitem__``."""
+        return (type(self), (dict(self),))
+
+
+class FrozenList(list):
+    """A list that can not be changed once created.
+
+    See :class:`FrozenDict`.
+    """
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = _read_only
+    reverse = sort = _read_only
+
+    def __copy__(self):
+        """Return a shallow, mutable copy."""
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        """Return a deep, mutable copy."""
+        return thaw(self)
+
+    def __reduce__(self):
+        """Pickle without going through the read-only methods."""
+        return (type(self), (list(self),))
+
+
+def freeze(obj):
+    """Return a read-only deep copy of configuration data."""
+    if isinstance(obj, dict):
+        return FrozenDict((key, freeze(value)) for key, value in obj.items())
+    if isinstance(obj, list):
+        return FrozenList(freeze(item) for item in obj)
+    if isinstance(obj, tuple):
+        return tuple(freeze(item) for item in obj)
+    return obj
+
+
+def thaw(obj):
+    """Return a mutable deep copy of configuration data."""
+    if isinstance(obj, dict):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [thaw(item) for item in obj]
+    if isinstance(obj, tuple):
+        return tuple(thaw(item) for item in obj)
+    return deepcopy(obj)
+
+
+def _frozen_view(name, cached):
+    """Return the read-only view of a cached configuration object."""
+    source, view = _FROZEN_VIEWS.get(name, (None, None))
+    if source is not cached or view is None:
+        view = freeze(cached)
+        _FROZEN_VIEWS[name] = (cached, view)
+    return view
+
+
+def get_config(need_base_url=True, mutable=False):
+    """Return the global config dictionary.
 
     This method makes use of a cache. If the cache is empty, the configuration
-    file is parsed and the cache is populated. Otherwise, a copy of the cached
-    configuration object is returned.
+    is read from the environment and the cache is populated.
+
+    The configuration is returned as a read-only view, see
+    :class:`FrozenDict`, which is shared by all callers and costs nothing to
+    hand out. Trying to change it raises ``TypeError``; pass ``mutable=True``
+    to get a copy that can be changed instead.
 
-    :returns: A copy of the global integrade configuration object.
+    :param need_base_url: Whether a missing base URL is an error.
+    :param mutable: Return a mutable copy instead of the read-only view.
+    :returns: The global integrade configuration object.
     """
     global _CONFIG  # pylint:disable=global-statement
     if _CONFIG is None:
@@ -50,6 +148,12 @@ def get_config(need_base_url=True):
             f'review-{ref_slug}.5a9f.insights-dev.openshiftapps.com',
         )
 
+        # The v2 API is found from the branch name, see `api.ClientV2`, unless
+        # its location is configured with `CLOUDIGRADE_API_V2_URL`, for
+        # example to point at a local `integrade.standin` server.
+        _CONFIG['api_v2_url'] = os.getenv('CLOUDIGRADE_API_V2_URL')
+        _CONFIG['superuser_token'] = os.getenv('CLOUDIGRADE_TOKEN')
+
         _CONFIG['openshift_prefix'] = os.getenv(
             'OPENSHIFT_PREFIX',
             f'c-review-{ref_slug[:29]}-',
@@ -72,6 +176,21 @@ def get_config(need_base_url=True):
         def profile_name(string): return string.replace(
             'CLOUDIGRADE_ROLE_', '')
 
+        # AWS calls go to AWS, or with `INTEGRADE_AWS_BACKEND=local` to an
+        # in-process emulator, see `integrade.local_aws`. The emulator can
+        # keep instances in a state for a while, for example with
+        # `INTEGRADE_LOCAL_AWS_DELAYS=pending=30,stopping=10`.
+        _CONFIG['aws_backend'] = os.getenv(
+            'INTEGRADE_AWS_BACKEND', 'aws').lower()
+        _CONFIG['local_aws_delays'] = {
+            state.strip(): float(seconds)
+            for state, _, seconds in (
+                item.partition('=') for item in os.getenv(
+                    'INTEGRADE_LOCAL_AWS_DELAYS', '').split(',')
+            )
+            if state.strip()
+        }
+
         profiles = [{'arn': os.environ.get(role),
                      'name': profile_name(role)}
                     for role in filter(is_role, os.environ.keys())
@@ -99,7 +218,7 @@ def get_config(need_base_url=True):
             profile['images'] = aws_image_config.get('profiles', {}).get(
                 profile_name, {}).get('images', [])
 
-            if i == 0:
+            if i == 0 and _CONFIG['aws_backend'] == 'aws':
                 if not profile['access_key_id']:
                     missing_config_errors.append(
                         f'Could not find AWS access key id for {profile_name}')
@@ -118,21 +237,63 @@ def get_config(need_base_url=True):
         else:
             _CONFIG['ssl-verify'] = False
 
+        # Connection pooling used by the HTTP clients in integrade.api.
+        # ``http_pool_connections`` is the number of hosts to keep pools for
+        # and ``http_pool_maxsize`` the number of connections kept per host.
+        _CONFIG['http_pool_connections'] = int(
+            os.getenv('INTEGRADE_HTTP_POOL_CONNECTIONS', 10))
+        _CONFIG['http_pool_maxsize'] = int(
+            os.getenv('INTEGRADE_HTTP_POOL_MAXSIZE', 10))
+        _CONFIG['http_pool_block'] = os.environ.get(
+            'INTEGRADE_HTTP_POOL_BLOCK', 'false').lower() == 'true'
+        _CONFIG['http_keep_alive'] = os.environ.get(
+            'INTEGRADE_HTTP_KEEP_ALIVE', 'true').lower() == 'true'
+        _CONFIG['async_max_concurrency'] = int(
+            os.getenv('INTEGRADE_ASYNC_MAX_CONCURRENCY', 50))
+        # Retries of transient API failures, see integrade.retry.
+        _CONFIG['http_retries'] = int(
+            os.getenv('INTEGRADE_HTTP_RETRIES', 3))
+        _CONFIG['http_retry_backoff'] = float(
+            os.getenv('INTEGRADE_HTTP_RETRY_BACKOFF', 0.5))
+        _CONFIG['http_circuit_threshold'] = int(
+            os.getenv('INTEGRADE_HTTP_CIRCUIT_THRESHOLD', 5))
+        _CONFIG['http_circuit_reset'] = float(
+            os.getenv('INTEGRADE_HTTP_CIRCUIT_RESET', 30))
+        # Conditional GET response cache, see integrade.cache.
+        _CONFIG['http_cache'] = os.environ.get(
+            'INTEGRADE_HTTP_CACHE', 'true').lower() == 'true'
+        _CONFIG['http_cache_size'] = int(
+            os.getenv('INTEGRADE_HTTP_CACHE_SIZE', 256))
+        # JSON codec of the API clients, see integrade.codec.
+        _CONFIG['json_codec'] = os.environ.get(
+            'INTEGRADE_JSON_CODEC', 'auto').lower()
+        # Threads used by aws_utils to wait on AWS resources to change state.
+        _CONFIG['aws_max_concurrency'] = int(
+            os.getenv('INTEGRADE_AWS_MAX_CONCURRENCY', 16))
+        # Latest requests kept by integrade.tracing.
+        _CONFIG['trace_buffer_size'] = int(
+            os.getenv('INTEGRADE_TRACE_BUFFER_SIZE', 10000))
+
         if missing_config_errors:
             raise exceptions.MissingConfigurationError(
                 '\n'.join(missing_config_errors)
             )
-    return deepcopy(_CONFIG)
+    if mutable:
+        return deepcopy(_CONFIG)
+    return _frozen_view('config', _CONFIG)
 
 
-def get_aws_image_config():
-    """Return a copy of the global config dictionary.
+def get_aws_image_config(mutable=False):
+    """Return the global AWS image config dictionary.
 
     This method makes use of a cache. If the cache is empty, the configuration
-    file is parsed and the cache is populated. Otherwise, a copy of the cached
-    configuration object is returned.
+    file is parsed and the cache is populated.
+
+    Like :func:`get_config`, a shared read-only view is returned unless
+    ``mutable=True`` is passed.
 
-    :returns: A copy of the global AWS configuration object.
+    :param mutable: Return a mutable copy instead of the read-only view.
+    :returns: The global AWS configuration object.
     """
     global _AWS_CONFIG  # pylint:disable=global-statement
     if _AWS_CONFIG is None:
@@ -140,4 +301,6 @@ def get_aws_image_config():
                             'aws_image_config.yaml')
         with open(path) as f:
             _AWS_CONFIG = yaml.load(f, Loader=yaml.FullLoader)
-    return deepcopy(_AWS_CONFIG)
+    if mutable:
+        return deepcopy(_AWS_CONFIG)
+    return _frozen_view('aws_image_config', _AWS_CONFIG)
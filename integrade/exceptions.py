@@ -1,4 +1,10 @@
 """Custom exceptions defined by Integrade."""
+from json import JSONDecodeError
+from pprint import pformat
+from urllib.parse import urlsplit
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import HTTPError
 
 
 class AWSCredentialsNotFoundError(Exception):
@@ -41,6 +47,42 @@ class MissingConfigurationError(Exception):
     """
 
 
+class LifecycleError(Exception):
+    """Some AWS lifecycle jobs failed.
+
+    Every job is run to completion before this is raised. The failed ones are
+    listed in ``failures`` and all of them in ``results``, both as
+    ``aws_utils.JobResult`` tuples of (item, result, error).
+    """
+
+    def __init__(self, failures, results):
+        """Describe the failed jobs in the message."""
+        self.failures = failures
+        self.results = results
+        details = '; '.join(
+            f'{failure.item}: {failure.error!r}' for failure in failures)
+        super().__init__(
+            f'{len(failures)} of {len(results)} jobs failed: {details}')
+
+
+class InstanceStateError(Exception):
+    """EC2 instances did not reach the state they were waited for.
+
+    ``states`` maps each failed (aws_profile, instance_id) tuple to the last
+    state seen for it, None if the instance was never found.
+    """
+
+    def __init__(self, state, states):
+        """Describe the failed instances in the message."""
+        self.state = state
+        self.states = states
+        details = ', '.join(
+            f'{instance_id} ({aws_profile}) is {current}'
+            for (aws_profile, instance_id), current in states.items())
+        super().__init__(
+            f'{len(states)} instances did not reach {state}: {details}')
+
+
 class EventTimeoutError(Exception):
     """Integrade timed out while waiting for an event to occur.
 
@@ -48,3 +90,114 @@ class EventTimeoutError(Exception):
     Raise this error if the timeout is exceeded while waiting for an event to
     occur.
     """
+
+
+class CircuitOpenError(RequestsConnectionError):
+    """Requests to a host are not sent, it failed too often lately.
+
+    See :class:`integrade.retry.CircuitBreaker`. ``retry_in`` is the number
+    of seconds before a request is let through again.
+    """
+
+    def __init__(self, host, retry_in):
+        """Describe the host and when it is tried again in the message."""
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(
+            f'Circuit of {host} is open after repeated failures, retrying'
+            f' in {retry_in:.1f}s.')
+
+
+class CloudigradeHTTPError(HTTPError):
+    """Cloudigrade answered a request with a 4XX or 5XX status code.
+
+    The error keeps the ``request`` and ``response``, and ``status``,
+    ``endpoint`` (the path of the URL) and ``json`` (the decoded body, None
+    if it is not JSON) tell what went wrong without parsing the message.
+
+    The message only has the status and the endpoint. The full report, with
+    the request and the response body, is rendered by ``str()``, the first
+    time it is needed. Bodies longer than ``max_body`` characters are cut.
+    """
+
+    max_body = 4096
+
+    def __init__(self, response):
+        """Keep the response and its request, and summarize them."""
+        super().__init__(
+            f'{response.status_code} for {response.request.method}'
+            f' {response.request.path_url}',
+            response=response,
+        )
+        self._report = None
+
+    @property
+    def status(self):
+        """Return the status code of the response."""
+        return self.response.status_code
+
+    @property
+    def endpoint(self):
+        """Return the path of the URL the request was sent to."""
+        return urlsplit(self.request.path_url).path
+
+    @property
+    def json(self):
+        """Return the decoded response body, None if it is not JSON."""
+        try:
+            return self.response.json()
+        except ValueError:
+            return None
+
+    def _truncate(self, text):
+        """Cut a text longer than ``max_body``, telling by how much."""
+        if text is None or len(text) <= self.max_body:
+            return text
+        return text[:self.max_body] + (
+            f'... ({len(text) - self.max_body} more characters)')
+
+    def _body_message(self):
+        """Render the response body, pretty-printed if it is short JSON."""
+        try:
+            size = len(self.response.content)
+        except TypeError:
+            size = 0
+        if size <= self.max_body:
+            try:
+                return 'json_error_message : {}'.format(
+                    pformat(self.response.json()))
+            except JSONDecodeError:
+                pass
+        return 'text_error_message : {}'.format(
+            pformat(self._truncate(self.response.text)))
+
+    def report(self):
+        """Render the request and the response, hiding the credentials."""
+        headers = self.request.headers.copy()
+        if headers.get('Authorization') is not None:
+            headers['Authorization'] = '*' * 8
+        body = self.request.body
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        return ''.join((
+            '\n============================================================\n'
+            '\nThe request you made received a status code that indicates\n'
+            'an error was encountered. Details about the request and the\n'
+            'response are below.\n'
+            '\n============================================================\n',
+            '\n\n'.join([
+                'request url : {}'.format(pformat(self.request.url)),
+                'request path : {}'.format(pformat(self.request.path_url)),
+                'request body : {}'.format(pformat(self._truncate(body))),
+                'request headers : {}'.format(pformat(headers)),
+                'response code : {}'.format(self.status),
+                self._body_message(),
+            ]),
+            '\n============================================================\n',
+        ))
+
+    def __str__(self):
+        """Return the full report, rendered on the first call."""
+        if self._report is None:
+            self._report = self.report()
+        return self._report
@@ -0,0 +1,138 @@
+"""Index cloudigrade API objects by their AWS identifiers.
+
+Helpers looking for an image by ``ec2_ami_id``, an instance by
+``ec2_instance_id`` or an account by ``account_arn`` used to scan the whole
+list of objects on every lookup. :class:`ObjectIndex` is built once for a
+fetched list and answers those lookups with a dictionary access.
+
+Both API versions are supported: v1 objects have the identifiers at their top
+level, v2 objects have them in their ``content_object``.
+
+Example::
+
+    >>> from integrade import api
+    >>> from integrade.index import ObjectIndex
+    >>> client = api.ClientV2()
+    >>> images = ObjectIndex(client.iter_objects('images/'))
+    >>> image = images.get('ec2_ami_id', 'ami-0f75a482c0696dc99')
+
+"""
+
+INDEXED_FIELDS = ('ec2_ami_id', 'ec2_instance_id', 'account_arn')
+"""Fields objects are indexed by, unless told otherwise."""
+
+
+def object_field(obj, field, default=None):
+    """Get a field of an API object, looking into its content object too."""
+    if field in obj:
+        return obj[field]
+    content_object = obj.get('content_object')
+    if isinstance(content_object, dict) and field in content_object:
+        return content_object[field]
+    return default
+
+
+class ObjectIndex(object):
+    """A list of API objects indexed by some of their fields.
+
+    The objects may come from any iterable, including a lazy one like
+    ``ClientV2.iter_objects``. They are consumed, and indexed, only as far as
+    needed: a lookup stops consuming as soon as a match is found, so the
+    remaining pages are not fetched. More objects can be added with
+    :meth:`add` and :meth:`extend` as new pages arrive.
+
+    :param objects: Iterable of API objects (dicts).
+    :param fields: The fields to index the objects by.
+    """
+
+    def __init__(self, objects=(), fields=INDEXED_FIELDS):
+        """Start indexing ``objects`` by ``fields``."""
+        self.fields = tuple(fields)
+        self._objects = []
+        self._index = {field: {} for field in self.fields}
+        self._pending = iter(objects)
+
+    def add(self, obj):
+        """Add an object to the index."""
+        self._objects.append(obj)
+        for field in self.fields:
+            value = object_field(obj, field)
+            if value is not None:
+                self._index[field].setdefault(value, []).append(obj)
+
+    def extend(self, objects):
+        """Add all ``objects`` to the index, for example a new page."""
+        for obj in objects:
+            self.add(obj)
+
+    def _consume(self):
+        """Index the next pending object and return it.
+
+        :raises: ``StopIteration`` if there are no more pending objects.
+        """
+        obj = next(self._pending)
+        self.add(obj)
+        return obj
+
+    def _consume_all(self):
+        """Index all pending objects."""
+        self.extend(self._pending)
+
+    def get_all(self, field, value):
+        """Return all objects whose ``field`` is ``value``.
+
+        All pending objects are consumed to make sure none is missed.
+        """
+        self._consume_all()
+        return list(self._index[field].get(value, []))
+
+    def get(self, field, value, default=None):
+        """Return the first object whose ``field`` is ``value``.
+
+        Pending objects are consumed only until a match is found.
+        """
+        matches = self._index[field].get(value)
+        if matches:
+            return matches[0]
+        for obj in self._pending:
+            self.add(obj)
+            if object_field(obj, field) == value:
+                return obj
+        return default
+
+    def __contains__(self, field_and_value):
+        """Tell whether an object matches a ``(field, value)`` tuple."""
+        field, value = field_and_value
+        return self.get(field, value) is not None
+
+    def __iter__(self):
+        """Iterate over all objects, consuming pending ones as needed."""
+        position = 0
+        while True:
+            if position < len(self._objects):
+                yield self._objects[position]
+                position += 1
+            else:
+                try:
+                    self._consume()
+                except StopIteration:
+                    return
+
+    def __len__(self):
+        """Return the number of objects, consuming all pending ones."""
+        self._consume_all()
+        return len(self._objects)
+
+    def __bool__(self):
+        """Tell whether there is any object, consuming at most one."""
+        if self._objects:
+            return True
+        try:
+            self._consume()
+        except StopIteration:
+            return False
+        return True
+
+    def __repr__(self):
+        """Describe the index."""
+        return f'<ObjectIndex of {len(self._objects)} objects>'
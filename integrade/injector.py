@@ -0,0 +1,278 @@
+"""Inject mock CloudTrail logs in cloudigrade's s3 bucket.
+
+cloudigrade learns about instances powering on and off from the CloudTrail
+logs delivered to its s3 bucket. Tests mock those logs to trigger events
+without waiting on AWS.
+
+:class:`EventInjector` packs many records into each log object, gzips it in
+memory and uploads the objects concurrently with a single s3 client. Powering
+hundreds of instances on or off is then a few uploads.
+
+Example::
+
+    >>> from integrade.injector import EventInjector
+    >>> with EventInjector() as injector:
+    ...     for instance_id in instance_ids:
+    ...         injector.add_event(instance_id, aws_profile, 'RunInstances')
+    >>> injector.keys
+    ['AWSLogs/mock_events/...json.gz']
+
+"""
+import gzip
+import json
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from integrade import config
+from integrade.exceptions import MissingConfigurationError
+from integrade.local_aws import default_client
+from integrade.utils import uuid4
+
+BadEvent = namedtuple('BadEvent', 'name data gzipped')
+"""Object for describing what type of bad event data to place in s3 bucket."""
+
+power_on_events = [
+    'RunInstances',
+    'StartInstances',
+    'StartInstance'
+]
+"""List of possible power on events for use in mock cloudtrail event data."""
+
+power_off_events = [
+    'TerminateInstances',
+    'StopInstances',
+    'TerminateInstanceInAutoScalingGroup'
+]
+"""List of possible power off events for use in mock cloudtrail event data."""
+
+bad_events = [
+    BadEvent('textfile', b'bad!', False),
+    BadEvent('badjson', b'"{}', True),
+    BadEvent('badinstanceid', None, True),
+    BadEvent('badawsaccount', None, True),
+]
+"""List of types of bad events that in the past have caused bugs."""
+
+MOCK_EVENTS_PREFIX = 'AWSLogs/mock_events'
+"""Where in the bucket the mock logs are uploaded."""
+
+# `s3_client` uses these as a per-process cache, like `api.get_session`.
+_S3_CLIENT = None
+_S3_CLIENT_PID = None
+_S3_CLIENT_LOCK = threading.Lock()
+
+
+def s3_client():
+    """Return the s3 client shared by the injectors of this process.
+
+    It uses the default boto3 credentials, those of the cloudigrade account.
+    """
+    global _S3_CLIENT, _S3_CLIENT_PID  # pylint:disable=global-statement
+    with _S3_CLIENT_LOCK:
+        if _S3_CLIENT is None or _S3_CLIENT_PID != os.getpid():
+            _S3_CLIENT = default_client('s3')
+            _S3_CLIENT_PID = os.getpid()
+        return _S3_CLIENT
+
+
+def get_s3_bucket_name():
+    """Get the cloudigrade bucket name and raise an exception if not found."""
+    bucket_name = config.get_config()['cloudigrade_s3_bucket']
+    if not bucket_name:
+        raise MissingConfigurationError(
+            "Need to know the name of cloudigrade's s3"
+            ' bucket to mock events!'
+        )
+    return bucket_name
+
+
+def cloudtrail_record(instance_id, aws_profile, event_type, time=None,
+                      image_id=None):
+    """Build a CloudTrail record of an event on an instance.
+
+    :param instance_id: (string) The ec2 instance id.
+    :param aws_profile: (dict) The profile owning the instance, as found in
+        ``config.get_config()['aws_profiles']``.
+    :param event_type: (string) The event name, like ``'RunInstances'``.
+    :param time: (string) ISO formatted time of the event, now by default.
+    :param image_id: (string) Optional AMI id of the instance, like
+        CloudTrail reports for ``RunInstances``.
+    """
+    if not time:
+        time = datetime.now(timezone.utc).astimezone().isoformat()
+    instance = {'instanceId': instance_id}
+    if image_id:
+        instance['imageId'] = image_id
+    return {
+        'userIdentity': {
+            'accountId': aws_profile['account_number']},
+        'awsRegion': os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+        'eventSource': 'ec2.amazonaws.com',
+        'eventName': event_type,
+        'eventTime': time,
+        'responseElements': {
+            'instancesSet': {
+                'items': [instance]
+            }
+        }
+    }
+
+
+def cloudtrail_log(records):
+    """Serialize records the way CloudTrail writes its log files."""
+    return bytes(json.dumps({'Records': records}), encoding='utf-8')
+
+
+def _log_object(data, gzipped, name, prefix):
+    """Return the key and the body of the object to upload a log as."""
+    key = f'{prefix}/{name or uuid4()}.json.gz'
+    return key, gzip.compress(data) if gzipped else data
+
+
+class EventInjector(object):
+    """Upload mock CloudTrail logs to cloudigrade's s3 bucket.
+
+    Records added with :meth:`add` or :meth:`add_event` are packed, up to
+    ``records_per_object`` at a time, into log objects. Full objects are
+    uploaded in the background right away; :meth:`flush` uploads the rest
+    and waits for all uploads. Used as a context manager, it flushes on exit.
+
+    :param bucket_name: The bucket to upload to, cloudigrade's by default.
+    :param client: The s3 client to use, :func:`s3_client` by default.
+    :param records_per_object: Number of records packed into each object.
+    :param max_workers: Number of objects uploaded at once.
+    :param prefix: Where in the bucket to upload the objects.
+    :param usage: An :class:`integrade.usage.UsageModel` absorbing the
+        records as they are added, to know the usage to expect.
+    """
+
+    def __init__(self, bucket_name=None, client=None, records_per_object=500,
+                 max_workers=8, prefix=MOCK_EVENTS_PREFIX, usage=None):
+        """Prepare to upload logs, nothing is uploaded yet."""
+        self.bucket_name = bucket_name or get_s3_bucket_name()
+        self.client = client or s3_client()
+        self.records_per_object = records_per_object
+        self.prefix = prefix
+        self.usage = usage
+        self.keys = []
+        self.records = 0
+        self.bytes = 0
+        self._pending = []
+        self._futures = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='event-injector')
+
+    def add(self, record):
+        """Add a CloudTrail record to the next log object."""
+        with self._lock:
+            if self.usage is not None:
+                self.usage.add_record(record)
+            self._pending.append(record)
+            if len(self._pending) < self.records_per_object:
+                return
+            records, self._pending = self._pending, []
+        self.put_records(records)
+
+    def add_event(self, instance_id, aws_profile, event_type, time=None):
+        """Add an event on an instance, see :func:`cloudtrail_record`."""
+        self.add(cloudtrail_record(instance_id, aws_profile, event_type, time))
+
+    def put_records(self, records):
+        """Upload records as one log object, in the background.
+
+        :returns: The future of the upload.
+        """
+        records = list(records)
+        with self._lock:
+            self.records += len(records)
+        return self.put(cloudtrail_log(records))
+
+    def put(self, data, gzipped=True, name=None):
+        """Upload raw data as one log object, in the background.
+
+        This is also how malformed logs, see :data:`bad_events`, are
+        uploaded.
+
+        :param data: (bytes) The content of the log, before compression.
+        :param gzipped: Whether to gzip the data. The object name ends with
+            ``.json.gz`` either way, like cloudigrade expects.
+        :param name: Name of the object, random by default.
+        :returns: The future of the upload.
+        """
+        key, body = _log_object(data, gzipped, name, self.prefix)
+        future = self._executor.submit(
+            self.client.put_object,
+            Bucket=self.bucket_name,
+            Key=key,
+            Body=body,
+        )
+        with self._lock:
+            self.keys.append(key)
+            self.bytes += len(body)
+            self._futures.append(future)
+        return future
+
+    def upload_pending(self):
+        """Upload the pending records now, even if they do not fill an object.
+
+        :returns: The future of the upload, None if nothing was pending.
+        """
+        with self._lock:
+            records, self._pending = self._pending, []
+        if records:
+            return self.put_records(records)
+        return None
+
+    def flush(self):
+        """Upload the pending records and wait for all uploads.
+
+        :raises: The first error met by an upload, once all are done.
+        """
+        self.upload_pending()
+        with self._lock:
+            futures, self._futures = self._futures, []
+        errors = [future.exception() for future in futures]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        """Flush and stop the upload threads."""
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        """Return the injector itself."""
+        return self
+
+    def __exit__(self, *args):
+        """Flush and stop the upload threads."""
+        self.close()
+
+
+def create_event(instance_id, aws_profile, event_type, time=None,
+                 data=None, gzipped=True):
+    """Create an event and place it in the cloudigrade s3 bucket.
+
+    :param data: (bytes) Upload this instead of a log of the event, for
+        example to mock a malformed log.
+    :param gzipped: Whether to gzip the uploaded data.
+    :returns: (bytes) The uploaded log, before compression.
+    """
+    if data is None:
+        data = cloudtrail_log([
+            cloudtrail_record(instance_id, aws_profile, event_type, time)])
+    key, body = _log_object(
+        data,
+        gzipped,
+        f'{aws_profile["name"]}-{event_type}-{instance_id}',
+        MOCK_EVENTS_PREFIX,
+    )
+    s3_client().put_object(Bucket=get_s3_bucket_name(), Key=key, Body=body)
+    return data
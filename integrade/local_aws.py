@@ -0,0 +1,189 @@
+"""Run integrade's AWS calls against an in-process AWS emulator.
+
+With ``INTEGRADE_AWS_BACKEND=local``, the EC2, S3, CloudTrail, SQS and
+autoscaling calls made through :mod:`integrade.tests.aws_utils` and
+:mod:`integrade.injector` are answered by `moto`_ instead of AWS. Nothing is
+paid for and nothing leaves the process, so the lifecycle executor, the
+reaper and the injector can be exercised with thousands of instances.
+
+moto changes instance states at once. To look more like AWS, instances can
+be kept ``pending``, ``stopping`` or ``shutting-down`` for a while after they
+are run, started, stopped or terminated, with for example
+``INTEGRADE_LOCAL_AWS_DELAYS=pending=30,stopping=10,shutting-down=10``.
+Only ``DescribeInstances`` answers are delayed: filtering on
+``instance-state-name`` still sees the state the instance ends up in.
+
+moto is an optional dependency, install it with ``pip install
+integrade[local-aws]``.
+
+.. _moto: https://github.com/getmoto/moto
+"""
+import os
+import threading
+import time
+
+import boto3
+
+from integrade import config
+from integrade.exceptions import MissingConfigurationError
+
+EC2_STATE_CODES = {
+    'pending': 0,
+    'running': 16,
+    'shutting-down': 32,
+    'terminated': 48,
+    'stopping': 64,
+    'stopped': 80,
+}
+"""Codes of the EC2 instance states, as found in ``State['Code']``."""
+
+TRANSITIONS = {
+    'RunInstances': ('pending', 'Instances'),
+    'StartInstances': ('pending', 'StartingInstances'),
+    'StopInstances': ('stopping', 'StoppingInstances'),
+    'TerminateInstances': ('shutting-down', 'TerminatingInstances'),
+}
+"""EC2 operations starting a transition, mapped to the state instances stay
+in and the key of the response listing them."""
+
+LOCAL_CREDENTIALS = ('testing', 'testing')
+"""Credentials used when a profile has none, the emulator accepts any."""
+
+# `local_backend` uses these as a per-process singleton.
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+class LocalAWS(object):
+    """An in-process AWS, with delayed EC2 instance state transitions.
+
+    :param delays: dict mapping ``pending``, ``stopping`` and
+        ``shutting-down`` to the seconds instances stay in that state.
+    :param clock: Callable returning the current time in seconds.
+    :param region: Region of the sessions, $AWS_DEFAULT_REGION by default.
+    """
+
+    def __init__(self, delays=None, clock=time.monotonic, region=None):
+        """Prepare the emulator, it is not started yet."""
+        self.delays = dict(delays or {})
+        self.clock = clock
+        self.region = region or os.environ.get(
+            'AWS_DEFAULT_REGION', 'us-east-1')
+        self._transitions = {}
+        self._lock = threading.Lock()
+        self._mock = None
+
+    def start(self):
+        """Route all boto3 calls of this process to the emulator.
+
+        :raises: MissingConfigurationError if moto is not installed.
+        """
+        try:
+            from moto import mock_aws
+        except ImportError:
+            raise MissingConfigurationError(
+                'The local AWS backend needs moto, install it with'
+                ' `pip install integrade[local-aws]`.')
+        self._mock = mock_aws()
+        self._mock.start()
+
+    def stop(self):
+        """Send boto3 calls to AWS again, forgetting everything created."""
+        if self._mock is not None:
+            self._mock.stop()
+            self._mock = None
+        with self._lock:
+            self._transitions.clear()
+
+    def session(self, access_key_id=None, access_key=None):
+        """Create a boto3 session whose EC2 answers are delayed."""
+        if not (access_key_id and access_key):
+            access_key_id, access_key = LOCAL_CREDENTIALS
+        session = boto3.Session(
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=access_key,
+            region_name=self.region,
+        )
+        for operation in TRANSITIONS:
+            session.events.register(
+                f'after-call.ec2.{operation}', self._start_transition)
+        session.events.register(
+            'after-call.ec2.DescribeInstances', self._delay_states)
+        return session
+
+    def _start_transition(self, parsed, model, **kwargs):
+        """Remember when instances started to change state."""
+        state, key = TRANSITIONS[model.name]
+        if not self.delays.get(state):
+            return
+        now = self.clock()
+        with self._lock:
+            for instance in parsed.get(key, []):
+                self._transitions[instance['InstanceId']] = (state, now)
+
+    def _delay_states(self, parsed, **kwargs):
+        """Show instances in their transition state until its delay is over.
+
+        :meth:`_start_transition` and this method are botocore ``after-call``
+        handlers, ``parsed`` is the response handed to the caller.
+        """
+        if not self._transitions:
+            return
+        now = self.clock()
+        with self._lock:
+            for reservation in parsed.get('Reservations', []):
+                for instance in reservation.get('Instances', []):
+                    transition = self._transitions.get(instance['InstanceId'])
+                    if transition is None:
+                        continue
+                    state, since = transition
+                    if now - since < self.delays[state]:
+                        instance['State'] = {
+                            'Code': EC2_STATE_CODES[state],
+                            'Name': state,
+                        }
+                    else:
+                        del self._transitions[instance['InstanceId']]
+
+
+def local_backend():
+    """Return the local AWS backend if it is configured, starting it once.
+
+    :returns: The :class:`LocalAWS` of this process, or None when the
+        ``aws_backend`` config is ``'aws'``.
+    """
+    global _BACKEND  # pylint:disable=global-statement
+    cfg = config.get_config(need_base_url=False)
+    if cfg.get('aws_backend', 'aws') != 'local':
+        return None
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            backend = LocalAWS(cfg.get('local_aws_delays'))
+            backend.start()
+            _BACKEND = backend
+        return _BACKEND
+
+
+def stop_local_backend():
+    """Stop the local AWS backend of this process, if it was started.
+
+    boto3 objects cached by :mod:`integrade.tests.aws_utils` should be
+    cleared too, with ``aws_utils.clear_aws_cache()``.
+    """
+    global _BACKEND  # pylint:disable=global-statement
+    with _BACKEND_LOCK:
+        if _BACKEND is not None:
+            _BACKEND.stop()
+            _BACKEND = None
+
+
+def default_client(service_name):
+    """Create a boto3 client with the default credentials.
+
+    This is ``boto3.client(service_name)``, on the local backend when it is
+    configured.
+    """
+    backend = local_backend()
+    if backend is None:
+        return boto3.client(service_name)
+    return backend.session().client(service_name)
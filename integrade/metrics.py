@@ -0,0 +1,332 @@
+"""Record how long things take during a test run.
+
+Timed blocks, or spans, are recorded with :func:`span`. Every call is kept as
+a sample, so a run can report the count, sum, max and percentiles of each
+span instead of only a total. Spans of the same name and labels make up one
+:class:`Series`.
+
+Two labels are added on their own:
+
+* ``parent``: name of the span the block runs in, if any. Spans are nested
+  per thread, a block run by a worker thread has no parent.
+* ``test``: node id of the running test, see :func:`attribute`. This is per
+  process, so blocks run by worker threads are attributed too.
+
+Samples are recorded in a per-process registry, rebuilt in a forked child.
+Processes of a run share their samples by dumping them to a directory, see
+:func:`dump` and :func:`load`.
+
+API requests sent through :func:`integrade.api.get_session` and the waits of
+:class:`integrade.waiters.MultiWaiter` are recorded already.
+
+Example::
+
+    >>> from integrade import metrics
+    >>> with metrics.span('create_accounts', count=10):
+    ...     create_accounts(10)
+    >>> print(metrics.registry().report())
+    >>> print(metrics.registry().to_prometheus())
+
+"""
+import functools
+import glob
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+import numpy
+
+QUANTILES = (0.5, 0.95, 0.99)
+"""Quantiles reported for each series."""
+
+# `registry` uses these as a per-process singleton, recreated after a fork so
+# that a child does not report the samples of its parent.
+_REGISTRY = None
+_REGISTRY_PID = None
+_REGISTRY_LOCK = threading.Lock()
+
+# Spans open in the current thread, innermost last.
+_LOCAL = threading.local()
+
+# Node id of the test being run, see `attribute`.
+_TEST = None
+
+_ID_SEGMENT = re.compile(
+    r'/(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})'
+    r'(?=/|$)')
+
+
+def endpoint(path):
+    """Replace the ids in a URL path by ``<id>``, to group requests by it."""
+    return _ID_SEGMENT.sub('/<id>', path)
+
+
+class Series(object):
+    """All samples of a span with some labels.
+
+    :param name: Name of the span.
+    :param labels: dict of the labels of the span.
+    """
+
+    def __init__(self, name, labels):
+        """Start without samples."""
+        self.name = name
+        self.labels = labels
+        self.samples = array('d')
+
+    def stats(self):
+        """Summarize the samples.
+
+        :returns: dict with the ``count``, ``sum``, ``max`` and the quantiles
+            ``p50``, ``p95`` and ``p99`` of the samples, in seconds.
+        """
+        samples = numpy.frombuffer(self.samples, dtype=float)
+        stats = {
+            'count': len(samples),
+            'sum': float(samples.sum()),
+            'max': float(samples.max(initial=0)),
+        }
+        quantiles = (
+            numpy.quantile(samples, QUANTILES) if len(samples)
+            else [0.0] * len(QUANTILES)
+        )
+        for quantile, value in zip(QUANTILES, quantiles):
+            stats[f'p{round(quantile * 100)}'] = float(value)
+        return stats
+
+
+class Registry(object):
+    """Samples of all the spans recorded in a process."""
+
+    def __init__(self):
+        """Start without any series."""
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, labels=None):
+        """Record a sample of a span."""
+        labels = labels or {}
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = Series(name, dict(labels))
+            series.samples.append(seconds)
+
+    def span(self, name, **labels):
+        """Time a block of code, see :func:`span`."""
+        return Span(self, name, labels)
+
+    def clear(self):
+        """Forget all samples."""
+        with self._lock:
+            self.series.clear()
+
+    def merge(self, data):
+        """Add the samples of an export made with ``samples=True``."""
+        for item in data['series']:
+            for seconds in item['samples']:
+                self.observe(item['name'], seconds, item['labels'])
+
+    def _snapshot(self):
+        """Copy the series, so they can be read while samples are added."""
+        with self._lock:
+            return [
+                (series.name, series.labels, array('d', series.samples))
+                for series in self.series.values()
+            ]
+
+    def to_json(self, samples=False):
+        """Export the series as a JSON serializable dict.
+
+        :param samples: Whether to include every sample, which
+            :meth:`merge` needs.
+        """
+        series = []
+        for name, labels, values in self._snapshot():
+            copy = Series(name, labels)
+            copy.samples = values
+            item = {'name': name, 'labels': labels, **copy.stats()}
+            if samples:
+                item['samples'] = values.tolist()
+            series.append(item)
+        return {'pid': os.getpid(), 'series': series}
+
+    def to_prometheus(self, metric='integrade_span_seconds'):
+        """Export the series in the Prometheus text format, as summaries."""
+        lines = [
+            f'# HELP {metric} Time spent in integrade spans.',
+            f'# TYPE {metric} summary',
+        ]
+        maxima = []
+        for item in self.to_json()['series']:
+            labels = dict(item['labels'], name=item['name'])
+            for quantile in QUANTILES:
+                value = item[f'p{round(quantile * 100)}']
+                lines.append(
+                    f'{metric}{_labels(labels, quantile=quantile)} {value!r}')
+            lines.append(f'{metric}_sum{_labels(labels)} {item["sum"]!r}')
+            lines.append(f'{metric}_count{_labels(labels)} {item["count"]}')
+            maxima.append(f'{metric}_max{_labels(labels)} {item["max"]!r}')
+        lines.append(f'# HELP {metric}_max Longest time spent in a span.')
+        lines.append(f'# TYPE {metric}_max gauge')
+        lines.extend(maxima)
+        return '\n'.join(lines) + '\n'
+
+    def report(self, by=('parent', 'test'), top=None):
+        """Format a table of the series, those taking the most time first.
+
+        :param by: Labels merged into a single row, by default the same span
+            is reported once whichever span and test it ran in.
+        :param top: Number of rows to report, all of them by default.
+        """
+        merged = Registry()
+        for name, labels, values in self._snapshot():
+            labels = {k: v for k, v in labels.items() if k not in by}
+            for seconds in values:
+                merged.observe(name, seconds, labels)
+        rows = sorted(
+            merged.to_json()['series'], key=lambda item: -item['sum'])
+        lines = [
+            f'{"span":<50} {"count":>7} {"total":>9} {"p50":>9} {"p95":>9}'
+            f' {"p99":>9} {"max":>9}'
+        ]
+        for item in rows[:top]:
+            labels = ','.join(f'{k}={v}' for k, v in item['labels'].items())
+            title = f'{item["name"]} {labels}'.strip()
+            lines.append(
+                f'{title:<50} {item["count"]:>7} {item["sum"]:>8.2f}s'
+                f' {item["p50"]:>8.3f}s {item["p95"]:>8.3f}s'
+                f' {item["p99"]:>8.3f}s {item["max"]:>8.3f}s'
+            )
+        return '\n'.join(lines)
+
+
+def _labels(labels, **extra):
+    """Format labels the Prometheus way."""
+    labels = dict(labels, **extra)
+    pairs = ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+                '\n', r'\n'))
+        for key, value in sorted(labels.items())
+    )
+    return '{' + pairs + '}'
+
+
+class Span(object):
+    """Context manager recording how long its block took.
+
+    It can decorate a function too, to time each of its calls.
+    """
+
+    def __init__(self, registry, name, labels):
+        """Remember where and under which name to record the time."""
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        """Start the clock and become the parent of spans opened within."""
+        stack = getattr(_LOCAL, 'stack', None)
+        if stack is None:
+            stack = _LOCAL.stack = []
+        labels = dict(self.labels)
+        if stack:
+            labels['parent'] = stack[-1]
+        if _TEST is not None:
+            labels['test'] = _TEST
+        stack.append(self.name)
+        self._labels = labels
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        """Record the elapsed time."""
+        self.elapsed = time.perf_counter() - self._start
+        _LOCAL.stack.pop()
+        self.registry.observe(self.name, self.elapsed, self._labels)
+
+    def __call__(self, func):
+        """Time every call of ``func``."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(self.registry, self.name, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def registry():
+    """Return the registry of this process."""
+    global _REGISTRY, _REGISTRY_PID  # pylint:disable=global-statement
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None or _REGISTRY_PID != os.getpid():
+            _REGISTRY = Registry()
+            _REGISTRY_PID = os.getpid()
+        return _REGISTRY
+
+
+def span(name, **labels):
+    """Time a block of code, or each call of a decorated function.
+
+    :param name: Name of the span, like ``'wait_for_inspection'``.
+    :param labels: Labels telling apart calls of the same span, like the
+        method and endpoint of a request. Keep their values few.
+    """
+    return registry().span(name, **labels)
+
+
+def observe(name, seconds, **labels):
+    """Record a sample measured by other means than :func:`span`.
+
+    The sample has no parent. This is how coroutines, which interleave in a
+    thread, are timed.
+    """
+    if _TEST is not None:
+        labels['test'] = _TEST
+    registry().observe(name, seconds, labels)
+
+
+def current_test():
+    """Return the node id of the test being run, if any."""
+    return _TEST
+
+
+@contextmanager
+def attribute(test):
+    """Attribute the spans recorded in the block to a test."""
+    global _TEST  # pylint:disable=global-statement
+    previous, _TEST = _TEST, test
+    try:
+        yield
+    finally:
+        _TEST = previous
+
+
+def dump(directory):
+    """Save the samples of this process in a directory.
+
+    :returns: The path of the file written, one per process.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    with open(path, 'w') as f:
+        json.dump(registry().to_json(samples=True), f)
+    return path
+
+
+def load(directory):
+    """Merge the samples dumped by all processes in a directory.
+
+    :returns: A new :class:`Registry` holding all of them.
+    """
+    merged = Registry()
+    for path in sorted(glob.glob(os.path.join(directory, 'metrics-*.json'))):
+        with open(path) as f:
+            merged.merge(json.load(f))
+    return merged
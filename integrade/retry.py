@@ -0,0 +1,326 @@
+"""Retry API requests which failed for a transient reason.
+
+3scale and cloudigrade answer 429, 502, 503 or 504 now and then, when a pod
+restarts or a rate limit is reached, and connections may be refused for a
+while. :class:`RetryPolicy` sends such requests again after a backoff:
+
+* The backoff doubles with each attempt, with full jitter: a random delay
+  between 0 and ``backoff * 2 ** attempt`` seconds, at most ``max_backoff``.
+* A ``Retry-After`` header, in seconds or as a date, is followed instead when
+  there is one. Responses asking to wait longer than ``max_backoff`` are not
+  retried.
+* Only idempotent methods are retried, unless others are opted in with
+  ``methods``, like ``methods=RetryPolicy.methods | {'POST'}``.
+
+A :class:`CircuitBreaker` per host stops sending requests for a while after
+many requests in a row failed, raising
+:class:`integrade.exceptions.CircuitOpenError` at once instead of waiting on
+a backend which is down. Only the last attempt of a request counts: a
+request which is retried and then succeeds is no failure.
+
+Every retry is recorded as an ``api.retry`` sample of the backoff time, see
+:mod:`integrade.metrics`. Its count is the number of retries.
+
+The clients of :mod:`integrade.api` retry with the policy built by
+:func:`default_policy` from the configuration, unless given another one with
+their ``retry`` argument. ``RetryPolicy(total=0)`` sends requests only once.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import requests
+
+from integrade import config, metrics, tracing
+from integrade.exceptions import CircuitOpenError
+
+IDEMPOTENT_METHODS = frozenset({'DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT'})
+"""Methods which can be sent twice without changing the outcome."""
+
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError,
+)
+"""Errors of requests which may succeed if sent again."""
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+"""Statuses of the answers to a request worth sending again."""
+
+FAILURE_STATUSES = frozenset({502, 503, 504})
+"""Statuses counted as a failure of the host by the circuit breakers. A 429
+means the host is up, only busy."""
+
+# `breaker` uses these as a per-process cache of the breaker of each host.
+_BREAKERS = {}
+_BREAKERS_PID = None
+_BREAKERS_LOCK = threading.Lock()
+
+
+class CircuitBreaker(object):
+    """Stop sending requests to a host after many failures in a row.
+
+    After ``threshold`` failures in a row, the circuit opens: requests fail
+    at once for ``reset_timeout`` seconds. The next request is then let
+    through, closing the circuit if it succeeds or opening it again if it
+    fails.
+
+    :param host: The host the breaker guards.
+    :param threshold: Failures in a row opening the circuit.
+    :param reset_timeout: Seconds the circuit stays open.
+    :param clock: Callable returning the current time in seconds.
+    """
+
+    def __init__(self, host, threshold=5, reset_timeout=30,
+                 clock=time.monotonic):
+        """Start with the circuit closed."""
+        self.host = host
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Return ``'closed'``, ``'open'`` or ``'half-open'``."""
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def check(self):
+        """Raise CircuitOpenError if requests may not be sent to the host."""
+        with self._lock:
+            state = self.state
+            if state == 'open':
+                raise CircuitOpenError(
+                    self.host,
+                    self.opened_at + self.reset_timeout - self.clock(),
+                )
+            if state == 'half-open':
+                # Let this request through alone, the others wait for it to
+                # close or open the circuit again.
+                self.opened_at = self.clock()
+
+    def success(self):
+        """Close the circuit."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        """Count a failure, opening the circuit after too many."""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = self.clock()
+
+
+def breaker(host, threshold=5, reset_timeout=30):
+    """Return the circuit breaker of a host, shared by the whole process.
+
+    The arguments are used when the breaker is created, see
+    :class:`CircuitBreaker`.
+    """
+    global _BREAKERS_PID  # pylint:disable=global-statement
+    with _BREAKERS_LOCK:
+        if _BREAKERS_PID != os.getpid():
+            _BREAKERS.clear()
+            _BREAKERS_PID = os.getpid()
+        if host not in _BREAKERS:
+            _BREAKERS[host] = CircuitBreaker(host, threshold, reset_timeout)
+        return _BREAKERS[host]
+
+
+def retry_after(response, now=None):
+    """Return the seconds a response asks to wait for, None if it does not.
+
+    :param now: The current ``datetime``, used for a date in the header.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (date - now).total_seconds())
+
+
+class RetryPolicy(object):
+    """Decide which requests to send again, and when.
+
+    :param total: Number of retries of a request, 0 to never retry.
+    :param backoff: Base of the exponential backoff, in seconds.
+    :param max_backoff: Longest time to wait before a retry.
+    :param statuses: Response statuses to retry on.
+    :param methods: Methods which may be retried.
+    :param circuit_threshold: Requests failing in a row, after their
+        retries, opening the circuit of a host, see :class:`CircuitBreaker`.
+        0 disables the breakers.
+    :param circuit_reset: Seconds the circuit of a host stays open.
+    :param sleep: Callable used to wait between synchronous attempts.
+    :param rng: The ``random.Random`` used for the jitter, by default the
+        one shared by the ``random`` module functions.
+    """
+
+    methods = IDEMPOTENT_METHODS
+
+    def __init__(self, total=3, backoff=0.5, max_backoff=30,
+                 statuses=RETRY_STATUSES, methods=None, circuit_threshold=5,
+                 circuit_reset=30, sleep=time.sleep, rng=None):
+        """Keep the settings of the policy."""
+        self.total = total
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        if methods is not None:
+            self.methods = frozenset(method.upper() for method in methods)
+        self.circuit_threshold = circuit_threshold
+        self.circuit_reset = circuit_reset
+        self.sleep = sleep
+        self.rng = rng or random
+
+    def breaker(self, url):
+        """Return the circuit breaker of the host of a URL, if enabled."""
+        if not self.circuit_threshold:
+            return None
+        return breaker(
+            urlsplit(url).netloc, self.circuit_threshold, self.circuit_reset)
+
+    def delay(self, method, attempt, response=None, error=None):
+        """Return how long to wait before sending a request again.
+
+        :param attempt: Number of retries already made.
+        :param response: The response to the last attempt, if any.
+        :param error: The exception raised by the last attempt, if any.
+        :returns: Seconds to wait, or None if the request is not retried.
+        """
+        if attempt >= self.total or method.upper() not in self.methods:
+            return None
+        if response is not None:
+            if response.status_code not in self.statuses:
+                return None
+            wait = retry_after(response)
+            if wait is not None:
+                return wait if wait <= self.max_backoff else None
+        elif not isinstance(error, TRANSIENT_ERRORS):
+            return None
+        return self.rng.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _outcome(self, breaker, method, url, attempt, response, error):
+        """Update the breaker and record the retry, if there is one.
+
+        The breaker only counts the failure of the last attempt, so each
+        request which failed counts once however many times it was retried.
+        """
+        failed = error is not None or response.status_code in FAILURE_STATUSES
+        wait = self.delay(method, attempt, response, error)
+        if breaker is not None:
+            if not failed:
+                breaker.success()
+            elif wait is None:
+                breaker.failure()
+        if wait is not None:
+            reason = (
+                type(error).__name__ if error is not None
+                else str(response.status_code)
+            )
+            metrics.observe(
+                'api.retry', wait, method=method.upper(), reason=reason,
+                endpoint=metrics.endpoint(urlsplit(url).path))
+        return wait
+
+    def send(self, method, url, send_once):
+        """Send a request until it needs not be retried.
+
+        :param send_once: Callable sending the request and returning the
+            ``requests.Response``. It is called within
+            :func:`integrade.tracing.attempt`, for the trace of the request to
+            know how many retries preceded it.
+        :returns: The response to the last attempt.
+        :raises: CircuitOpenError if the circuit of the host is open, or the
+            error of the last attempt.
+        """
+        breaker = self.breaker(url)
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.check()
+            response = error = None
+            try:
+                with tracing.attempt(attempt):
+                    response = send_once()
+            except TRANSIENT_ERRORS as exc:
+                error = exc
+            wait = self._outcome(
+                breaker, method, url, attempt, response, error)
+            if wait is None:
+                if error is not None:
+                    raise error
+                return response
+            self.sleep(wait)
+            attempt += 1
+
+    async def send_async(self, method, url, send_once):
+        """Send a request from a coroutine until it needs not be retried.
+
+        Like :meth:`send`, but ``send_once`` returns a coroutine and the waits
+        between attempts are ``asyncio.sleep`` calls. ``send_once`` is called
+        with the number of the attempt: coroutines share the thread, so it
+        cannot be given through :func:`integrade.tracing.attempt`.
+        """
+        breaker = self.breaker(url)
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.check()
+            response = error = None
+            try:
+                response = await send_once(attempt)
+            except TRANSIENT_ERRORS as exc:
+                error = exc
+            wait = self._outcome(
+                breaker, method, url, attempt, response, error)
+            if wait is None:
+                if error is not None:
+                    raise error
+                return response
+            await asyncio.sleep(wait)
+            attempt += 1
+
+
+def default_policy(cfg=None):
+    """Build the retry policy of the configuration.
+
+    See the ``http_retries``, ``http_retry_backoff``,
+    ``http_circuit_threshold`` and ``http_circuit_reset`` settings in
+    integrade/config.py.
+    """
+    if cfg is None:
+        cfg = config.get_config()
+    return RetryPolicy(
+        total=cfg.get('http_retries', 3),
+        backoff=cfg.get('http_retry_backoff', 0.5),
+        circuit_threshold=cfg.get('http_circuit_threshold', 5),
+        circuit_reset=cfg.get('http_circuit_reset', 30),
+    )
@@ -0,0 +1,1104 @@
+"""A local stand-in for the cloudigrade API.
+
+The stand-in answers the v1 endpoints of :mod:`integrade.tests.urls` and the
+v2 ``accounts/``, ``images/``, ``instances/`` and ``sysconfig/`` endpoints
+from in-memory state, so suites and benchmarks of the harness itself run in
+seconds, without a cloudigrade deployment or AWS.
+
+Instances are registered on the AWS side of the stand-in with
+:meth:`CloudigradeState.add_aws_instance`. Creating a cloud account for the
+instance's role ARN discovers it, along with its image and a ``power_on``
+event. Discovered images go through the ``pending``, ``preparing`` and
+``inspecting`` statuses, each lasting its configured delay, before reaching
+their final status. More power events are recorded with
+:meth:`CloudigradeState.record_event`.
+
+Example::
+
+    >>> from integrade import api
+    >>> from integrade.standin import CloudigradeState, serve
+    >>> state = CloudigradeState(inspection_delays=0.5)
+    >>> state.add_aws_instance(arn, ec2_ami_id='ami-123')
+    >>> with serve(state) as server:
+    ...     client = api.ClientV2(url=server.v2_url, branch='master')
+    ...     client.request('post', 'accounts/', data={'account_arn': arn})
+    ...     list(client.iter_objects('images/'))
+
+"""
+import base64
+import binascii
+import hashlib
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from dateutil.parser import isoparse
+
+from integrade.tests import urls
+from integrade.utils import uuid4
+
+logger = logging.getLogger(__name__)
+
+V2_PREFIX = '/api/cloudigrade/v2/'
+"""Where the v2 endpoints are served, like on the real deployments."""
+
+INSPECTION_STATUSES = ('pending', 'preparing', 'inspecting')
+"""Statuses a discovered image goes through, in order, before its final one."""
+
+DEFAULT_PAGE_SIZE = 10
+"""Number of objects in each page of a list endpoint."""
+
+AWS_POLICIES = {
+    'traditional_inspection': {
+        'Version': '2012-10-17',
+        'Statement': [{
+            'Sid': 'CloudigradePolicy',
+            'Effect': 'Allow',
+            'Action': [
+                'ec2:DescribeImages',
+                'ec2:DescribeInstances',
+                'ec2:ModifySnapshotAttribute',
+                'ec2:DescribeSnapshotAttribute',
+                'ec2:DescribeSnapshots',
+                'ec2:CopyImage',
+                'ec2:CreateTags',
+                'cloudtrail:CreateTrail',
+                'cloudtrail:UpdateTrail',
+                'cloudtrail:PutEventSelectors',
+                'cloudtrail:DescribeTrails',
+                'cloudtrail:StartLogging',
+                'cloudtrail:StopLogging',
+            ],
+            'Resource': '*',
+        }],
+    },
+}
+"""Policies reported by sysconfig, shaped like cloudigrade's."""
+
+
+class StandInError(Exception):
+    """An error answered to the client with a status and a JSON body."""
+
+    def __init__(self, status, body):
+        """Keep the status and the body of the response."""
+        super().__init__(status, body)
+        self.status = status
+        self.body = body
+
+
+def _now():
+    """Return the current time, in UTC."""
+    return datetime.now(timezone.utc)
+
+
+def _account_number(arn):
+    """Return the AWS account number of a role ARN."""
+    return next((part for part in arn.split(':') if part.isdigit()), '')
+
+
+def _overlap(runs, start, end):
+    """Return the seconds of runs spent between ``start`` and ``end``."""
+    seconds = 0
+    for run_start, run_end in runs:
+        run_end = run_end or _now()
+        seconds += max(
+            0, (min(run_end, end) - max(run_start, start)).total_seconds())
+    return seconds
+
+
+class CloudigradeState(object):
+    """In-memory users, accounts, images and instances of the stand-in.
+
+    All methods are safe to call from the server threads and from the test
+    driving the stand-in at the same time.
+
+    :param inspection_delays: Seconds an image spends in each of
+        :data:`INSPECTION_STATUSES`, either one number for all or a dict
+        mapping statuses to seconds.
+    :param page_size: Number of objects in each page of a list endpoint.
+    :param superuser_token: The v1 token of the superuser, random by default.
+    :param clock: Callable returning the current time in seconds, to make
+        images progress.
+    """
+
+    def __init__(self, inspection_delays=1, page_size=DEFAULT_PAGE_SIZE,
+                 superuser_token=None, aws_account_id='123456789012',
+                 version='stand-in', clock=time.monotonic):
+        """Start without any account, and a superuser."""
+        if not isinstance(inspection_delays, dict):
+            inspection_delays = {
+                status: inspection_delays for status in INSPECTION_STATUSES}
+        self.inspection_delays = inspection_delays
+        self.page_size = page_size
+        self.aws_account_id = aws_account_id
+        self.version = version
+        self.clock = clock
+        self.users = {}
+        self.tokens = {}
+        self.accounts = {}
+        self.images = {}
+        self.instances = {}
+        self.events = {}
+        self.aws_instances = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.superuser = self.create_user(
+            'superuser', 'superuser', 'superuser@example.com',
+            is_superuser=True)
+        self.superuser_token = superuser_token or uuid4()
+        self.tokens[self.superuser_token] = self.superuser['id']
+
+    def _next_id(self):
+        """Return the next id, shared by all kinds of objects."""
+        return next(self._ids)
+
+    # Users
+
+    def create_user(self, username, password, email='', is_superuser=False):
+        """Create a user.
+
+        :raises: :class:`StandInError` if the username is taken.
+        """
+        with self._lock:
+            if self.user_by_name(username) is not None:
+                raise StandInError(HTTPStatus.BAD_REQUEST, {
+                    'username': ['A user with that username already exists.']
+                })
+            user = {
+                'id': self._next_id(),
+                'username': username,
+                'email': email,
+                'password': password,
+                'is_superuser': is_superuser,
+            }
+            self.users[user['id']] = user
+            return user
+
+    def user_by_name(self, username):
+        """Return the user with a username, None if there is none."""
+        with self._lock:
+            return next((
+                user for user in self.users.values()
+                if user['username'] == username
+            ), None)
+
+    def create_token(self, username, password):
+        """Log a user in and return a new token.
+
+        :raises: :class:`StandInError` if the credentials are wrong.
+        """
+        with self._lock:
+            user = self.user_by_name(username)
+            if user is None or user['password'] != password:
+                raise StandInError(HTTPStatus.BAD_REQUEST, {
+                    'non_field_errors': [
+                        'Unable to log in with provided credentials.']
+                })
+            token = uuid4().replace('-', '')
+            self.tokens[token] = user['id']
+            return token
+
+    def destroy_token(self, token):
+        """Log out the user of a token."""
+        with self._lock:
+            self.tokens.pop(token, None)
+
+    def set_password(self, user, current_password, new_password):
+        """Change the password of a user.
+
+        :raises: :class:`StandInError` if the current password is wrong.
+        """
+        with self._lock:
+            if current_password != user['password']:
+                raise StandInError(HTTPStatus.BAD_REQUEST, {
+                    'current_password': ['Invalid password.']})
+            user['password'] = new_password
+
+    def user_for_token(self, token):
+        """Return the user of a token, None if the token is unknown."""
+        with self._lock:
+            user_id = self.tokens.get(token)
+            return self.users.get(user_id)
+
+    # AWS side
+
+    def add_aws_instance(self, arn, ec2_instance_id=None, ec2_ami_id=None,
+                         name=None, rhel=False, openshift=False,
+                         final_status='inspected', running_since=None):
+        """Run an instance in the AWS account of a role ARN.
+
+        The instance and its image are discovered when a cloud account is
+        created for ``arn``, or right away if one already exists.
+
+        :param final_status: Status the image reaches once inspected, like
+            ``'inspected'``, ``'error'`` or ``'unavailable'``.
+        :param running_since: datetime the instance was started at, now by
+            default.
+        :returns: The ec2 instance id.
+        """
+        instance = {
+            'ec2_instance_id': ec2_instance_id or (
+                f'i-{uuid4().replace("-", "")[:17]}'),
+            'ec2_ami_id': ec2_ami_id or f'ami-{uuid4().replace("-", "")[:17]}',
+            'name': name,
+            'rhel': rhel,
+            'openshift': openshift,
+            'final_status': final_status,
+            'running_since': running_since or _now(),
+        }
+        with self._lock:
+            self.aws_instances.setdefault(arn, []).append(instance)
+            for account in self.accounts.values():
+                if account['account_arn'] == arn:
+                    self._discover(account, instance)
+        return instance['ec2_instance_id']
+
+    def _discover(self, account, aws_instance):
+        """Record an instance of an account and its image."""
+        image = next((
+            image for image in self.images.values()
+            if image['ec2_ami_id'] == aws_instance['ec2_ami_id']
+        ), None)
+        if image is None:
+            image = {
+                'id': self._next_id(),
+                'ec2_ami_id': aws_instance['ec2_ami_id'],
+                'name': aws_instance['name'],
+                'owner_aws_account_id': account['aws_account_id'],
+                'platform': 'none',
+                'rhel_detected': aws_instance['rhel'],
+                'openshift_detected': aws_instance['openshift'],
+                'rhel_challenged': False,
+                'openshift_challenged': False,
+                'final_status': aws_instance['final_status'],
+                'discovered': self.clock(),
+                'created_at': _now(),
+            }
+            self.images[image['id']] = image
+        instance = {
+            'id': self._next_id(),
+            'account_id': account['id'],
+            'ec2_instance_id': aws_instance['ec2_instance_id'],
+            'image_id': image['id'],
+            'region': 'us-east-1',
+            'runs': [[aws_instance['running_since'], None]],
+            'created_at': _now(),
+        }
+        self.instances[instance['id']] = instance
+        self._add_event(instance, 'power_on', aws_instance['running_since'])
+
+    def _add_event(self, instance, event_type, occurred_at):
+        """Record a power event of an instance."""
+        event = {
+            'id': self._next_id(),
+            'instance_id': instance['id'],
+            'event_type': event_type,
+            'occurred_at': occurred_at,
+            'created_at': _now(),
+        }
+        self.events[event['id']] = event
+        return event
+
+    def record_event(self, ec2_instance_id, event_type, occurred_at=None):
+        """Record that a discovered instance was powered on or off.
+
+        This is what cloudigrade does when it reads the event in a CloudTrail
+        log. The runs of the instance, and so the reports, follow the events.
+
+        :param event_type: ``'power_on'`` or ``'power_off'``.
+        :param occurred_at: datetime of the event, now by default.
+        :returns: The recorded events, one per account the instance was
+            discovered in.
+        """
+        occurred_at = occurred_at or _now()
+        with self._lock:
+            events = []
+            for instance in list(self.instances.values()):
+                if instance['ec2_instance_id'] != ec2_instance_id:
+                    continue
+                runs = instance['runs']
+                if event_type == 'power_on' and (
+                        not runs or runs[-1][1] is not None):
+                    runs.append([occurred_at, None])
+                elif event_type == 'power_off' and runs and \
+                        runs[-1][1] is None:
+                    runs[-1][1] = occurred_at
+                events.append(
+                    self._add_event(instance, event_type, occurred_at))
+            return events
+
+    def image_status(self, image):
+        """Return the inspection status an image is in now."""
+        elapsed = self.clock() - image['discovered']
+        for status in INSPECTION_STATUSES:
+            delay = self.inspection_delays.get(status, 0)
+            if elapsed < delay:
+                return status
+            elapsed -= delay
+        return image['final_status']
+
+    # Accounts
+
+    def create_account(self, user, account_arn, name=None):
+        """Create a cloud account and discover its running instances.
+
+        :raises: :class:`StandInError` if the ARN is already used.
+        """
+        if not account_arn:
+            raise StandInError(HTTPStatus.BAD_REQUEST, {
+                'account_arn': ['This field is required.']})
+        with self._lock:
+            if any(account['account_arn'] == account_arn
+                   for account in self.accounts.values()):
+                raise StandInError(HTTPStatus.BAD_REQUEST, {
+                    'account_arn': [
+                        f'An ARN already exists for account "{account_arn}"']
+                })
+            now = _now()
+            account = {
+                'id': self._next_id(),
+                'user_id': user['id'],
+                'account_arn': account_arn,
+                'aws_account_id': _account_number(account_arn),
+                'name': name or uuid4(),
+                'created_at': now,
+                'updated_at': now,
+            }
+            self.accounts[account['id']] = account
+            for aws_instance in self.aws_instances.get(account_arn, []):
+                self._discover(account, aws_instance)
+            return account
+
+    def rename_account(self, account, name):
+        """Change the name of a cloud account."""
+        with self._lock:
+            account['name'] = name
+            account['updated_at'] = _now()
+            return account
+
+    def delete_account(self, account):
+        """Delete a cloud account and the instances found in it."""
+        with self._lock:
+            self.accounts.pop(account['id'], None)
+            for instance in list(self.instances.values()):
+                if instance['account_id'] == account['id']:
+                    del self.instances[instance['id']]
+            for event in list(self.events.values()):
+                if event['instance_id'] not in self.instances:
+                    del self.events[event['id']]
+
+    def visible(self, user, kind):
+        """Return the objects of a kind a user can see, oldest first."""
+        with self._lock:
+            objects = list(getattr(self, kind).values())
+            if user['is_superuser']:
+                return objects
+            account_ids = {
+                account['id'] for account in self.accounts.values()
+                if account['user_id'] == user['id']
+            }
+            if kind == 'accounts':
+                return [obj for obj in objects if obj['id'] in account_ids]
+            instances = [
+                instance for instance in self.instances.values()
+                if instance['account_id'] in account_ids
+            ]
+            if kind == 'instances':
+                return instances
+            if kind == 'events':
+                instance_ids = {instance['id'] for instance in instances}
+                return [
+                    obj for obj in objects
+                    if obj['instance_id'] in instance_ids
+                ]
+            image_ids = {instance['image_id'] for instance in instances}
+            return [obj for obj in objects if obj['id'] in image_ids]
+
+    def challenge(self, image, payload):
+        """Update the challenge flags of an image."""
+        with self._lock:
+            for flag in ('rhel_challenged', 'openshift_challenged'):
+                if flag in payload:
+                    image[flag] = bool(payload[flag])
+            return image
+
+
+def _iso(when):
+    """Format a datetime like cloudigrade does."""
+    return when.isoformat().replace('+00:00', 'Z')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answer cloudigrade API requests from the server's state."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, without this every answer on
+    # a kept-alive connection waits for the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    routes = [
+        ('POST', urls.AUTH_USERS_CREATE, 'v1_create_user'),
+        ('POST', urls.AUTH_TOKEN_CREATE, 'v1_create_token'),
+        ('POST', urls.AUTH_TOKEN_DESTROY, 'v1_destroy_token'),
+        ('GET', urls.AUTH_ME, 'v1_me'),
+        ('POST', urls.AUTH_PASSWORD, 'v1_set_password'),
+        ('GET', urls.USER_LIST, 'v1_users'),
+        ('GET', urls.SYSCONFIG, 'sysconfig'),
+        ('GET', urls.CLOUD_ACCOUNT, 'v1_list'),
+        ('POST', urls.CLOUD_ACCOUNT, 'create_account'),
+        ('GET', urls.IMAGE, 'v1_list'),
+        ('GET', urls.INSTANCE, 'v1_list'),
+        ('GET', urls.EVENT, 'v1_list'),
+        ('GET', urls.REPORT_ACCOUNTS, 'v1_report_accounts'),
+        ('GET', urls.REPORT_IMAGES, 'v1_report_images'),
+        ('GET', urls.REPORT_INSTANCES, 'v1_report_instances'),
+        ('GET', urls.CLOUD_ACCOUNT + '<id>/', 'v1_detail'),
+        ('PATCH', urls.CLOUD_ACCOUNT + '<id>/', 'v1_update_account'),
+        ('DELETE', urls.CLOUD_ACCOUNT + '<id>/', 'delete_account'),
+        ('GET', urls.IMAGE + '<id>/', 'v1_detail'),
+        ('PATCH', urls.IMAGE + '<id>/', 'challenge'),
+        ('GET', urls.INSTANCE + '<id>/', 'v1_detail'),
+        ('GET', urls.EVENT + '<id>/', 'v1_detail'),
+        ('GET', V2_PREFIX + 'sysconfig/', 'sysconfig'),
+        ('GET', V2_PREFIX + 'accounts/', 'v2_list'),
+        ('POST', V2_PREFIX + 'accounts/', 'create_account'),
+        ('GET', V2_PREFIX + 'images/', 'v2_list'),
+        ('GET', V2_PREFIX + 'instances/', 'v2_list'),
+        ('GET', V2_PREFIX + 'accounts/<id>/', 'v2_detail'),
+        ('DELETE', V2_PREFIX + 'accounts/<id>/', 'delete_account'),
+        ('GET', V2_PREFIX + 'images/<id>/', 'v2_detail'),
+        ('PATCH', V2_PREFIX + 'images/<id>/', 'challenge'),
+        ('GET', V2_PREFIX + 'instances/<id>/', 'v2_detail'),
+    ]
+    """``(method, path, handler)``, ``<id>`` matching an object id.
+
+    The trailing slash after an id is optional, as some tests join the id to
+    the list path with ``urljoin``.
+    """
+
+    _compiled = [
+        (method, re.compile(
+            '^' + re.escape(path).replace('<id>/', r'(?P<id>\d+)/?')
+            + '$'),
+         handler)
+        for method, path, handler in routes
+    ]
+
+    _kinds = {
+        'account': 'accounts', 'image': 'images', 'instance': 'instances',
+        'event': 'events',
+        'accounts': 'accounts', 'images': 'images', 'instances': 'instances',
+    }
+
+    @property
+    def state(self):
+        """Return the state shared by all requests of the server."""
+        return self.server.state
+
+    def log_message(self, format, *args):  # pylint:disable=redefined-builtin
+        """Log requests at debug level instead of printing them."""
+        logger.debug(format, *args)
+
+    def _respond(self, status, body=None):
+        """Send a JSON response, or an empty one if there is no body.
+
+        Successful GET responses have an ``ETag``, and are answered with a
+        304 without a body when the request has a matching ``If-None-Match``.
+        """
+        content = b'' if body is None else json.dumps(body).encode('utf-8')
+        etag = None
+        if self.command == 'GET' and status == HTTPStatus.OK:
+            etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+            if etag in (self.headers.get('If-None-Match') or ''):
+                status, body, content = HTTPStatus.NOT_MODIFIED, None, b''
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _read_body(self):
+        """Read the request body, as bytes.
+
+        The body is read for every request, even those answered with an
+        error: left on a kept-alive connection, it would be taken for the
+        start of the next request.
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _read_payload(self):
+        """Decode the JSON or form encoded request body."""
+        body = self.body.decode('utf-8')
+        if not body:
+            return {}
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            return json.loads(body)
+        return {key: values[-1] for key, values in parse_qs(body).items()}
+
+    def _dispatch(self, method):
+        """Route a request to its handler and answer its result."""
+        split = urlsplit(self.path)
+        self.query = {
+            key: values[-1] for key, values in parse_qs(split.query).items()}
+        self.body = self._read_body()
+        allowed = False
+        try:
+            for route_method, pattern, handler in self._compiled:
+                match = pattern.match(split.path)
+                if match is None:
+                    continue
+                allowed = True
+                if route_method != method:
+                    continue
+                self.payload = self._read_payload()
+                status, body = getattr(self, handler)(
+                    split.path, **match.groupdict())
+                break
+            else:
+                if allowed:
+                    raise StandInError(HTTPStatus.METHOD_NOT_ALLOWED, {
+                        'detail': f'Method "{method}" not allowed.'})
+                raise StandInError(
+                    HTTPStatus.NOT_FOUND, {'detail': 'Not found.'})
+        except StandInError as error:
+            status, body = error.status, error.body
+        self._respond(status, body)
+
+    def do_GET(self):  # noqa: N802
+        """Answer a GET request."""
+        self._dispatch('GET')
+
+    def do_POST(self):  # noqa: N802
+        """Answer a POST request."""
+        self._dispatch('POST')
+
+    def do_PATCH(self):  # noqa: N802
+        """Answer a PATCH request."""
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):  # noqa: N802
+        """Answer a DELETE request."""
+        self._dispatch('DELETE')
+
+    # Authentication
+
+    def _user(self, path):
+        """Authenticate the request, with a v1 token or v2 basic auth.
+
+        v2 users are created on their first request, like the identity
+        header of the real deployments does.
+        """
+        authorization = self.headers.get('Authorization') or ''
+        scheme, _, credentials = authorization.partition(' ')
+        if path.startswith(V2_PREFIX) and scheme == 'Basic':
+            try:
+                username, _, password = base64.b64decode(
+                    credentials).decode('utf-8').partition(':')
+            except (binascii.Error, UnicodeDecodeError):
+                username = ''
+            if username:
+                user = self.state.user_by_name(username)
+                if user is None:
+                    user = self.state.create_user(username, password, username)
+                return user
+        if scheme == 'Token':
+            user = self.state.user_for_token(credentials)
+            if user is None:
+                raise StandInError(
+                    HTTPStatus.UNAUTHORIZED, {'detail': 'Invalid token.'})
+            return user
+        raise StandInError(HTTPStatus.UNAUTHORIZED, {
+            'detail': 'Authentication credentials were not provided.'})
+
+    # Serialization
+
+    def _url(self, path, **query):
+        """Build an absolute URL on this server."""
+        host = self.headers.get('Host') or '{}:{}'.format(
+            *self.server.server_address[:2])
+        query = f'?{urlencode(query)}' if query else ''
+        return f'http://{host}{path}{query}'
+
+    def _v1(self, kind, obj):
+        """Render an object like the v1 API does."""
+        common = {
+            'id': obj['id'],
+            'created_at': _iso(obj['created_at']),
+            'url': self._url(f'/api/v1/{kind[:-1]}/{obj["id"]}/'),
+        }
+        if kind == 'accounts':
+            return dict(
+                common,
+                user_id=obj['user_id'],
+                account_arn=obj['account_arn'],
+                aws_account_id=obj['aws_account_id'],
+                name=obj['name'],
+                resourcetype='AwsAccount',
+                updated_at=_iso(obj['updated_at']),
+            )
+        if kind == 'images':
+            return dict(common, **self._image_fields(obj), **{
+                'ec2_ami_id': obj['ec2_ami_id'],
+                'owner_aws_account_id': obj['owner_aws_account_id'],
+                'platform': obj['platform'],
+                'resourcetype': 'AwsMachineImage',
+            })
+        if kind == 'events':
+            return dict(
+                common,
+                event_type=obj['event_type'],
+                instance=self._url(
+                    f'/api/v1/instance/{obj["instance_id"]}/'),
+                instance_id=obj['instance_id'],
+                occurred_at=_iso(obj['occurred_at']),
+                resourcetype='AwsInstanceEvent',
+            )
+        return dict(
+            common,
+            account=self._url(f'/api/v1/account/{obj["account_id"]}/'),
+            account_id=obj['account_id'],
+            ec2_instance_id=obj['ec2_instance_id'],
+            machineimage=self._url(f'/api/v1/image/{obj["image_id"]}/'),
+            region=obj['region'],
+            resourcetype='AwsInstance',
+        )
+
+    def _v2(self, kind, obj):
+        """Render an object like the v2 API does."""
+        created_at = _iso(obj['created_at'])
+        if kind == 'accounts':
+            return {
+                'account_id': obj['id'],
+                'cloud_type': 'aws',
+                'content_object': {
+                    'id': obj['id'],
+                    'account_arn': obj['account_arn'],
+                    'aws_account_id': obj['aws_account_id'],
+                    'created_at': created_at,
+                    'updated_at': _iso(obj['updated_at']),
+                },
+                'created_at': created_at,
+                'is_enabled': True,
+                'name': obj['name'],
+                'updated_at': _iso(obj['updated_at']),
+                'user_id': obj['user_id'],
+            }
+        if kind == 'images':
+            return dict(self._image_fields(obj), **{
+                'image_id': obj['id'],
+                'cloud_type': 'aws',
+                'content_object': {
+                    'id': obj['id'],
+                    'ec2_ami_id': obj['ec2_ami_id'],
+                    'owner_aws_account_id': obj['owner_aws_account_id'],
+                    'platform': obj['platform'],
+                    'region': 'us-east-1',
+                },
+                'created_at': created_at,
+            })
+        return {
+            'instance_id': obj['id'],
+            'cloud_account_id': obj['account_id'],
+            'cloud_type': 'aws',
+            'content_object': {
+                'id': obj['id'],
+                'ec2_instance_id': obj['ec2_instance_id'],
+                'region': obj['region'],
+            },
+            'created_at': created_at,
+            'machine_image_id': obj['image_id'],
+        }
+
+    def _image_fields(self, image):
+        """Render the fields images have in both API versions."""
+        status = self.state.image_status(image)
+        inspected = status == 'inspected'
+        rhel = inspected and image['rhel_detected']
+        openshift = inspected and image['openshift_detected']
+        return {
+            'name': image['name'],
+            'status': status,
+            'inspection_json': json.dumps({}) if inspected else None,
+            'rhel': rhel != image['rhel_challenged'],
+            'rhel_detected': rhel,
+            'rhel_challenged': image['rhel_challenged'],
+            'openshift': openshift != image['openshift_challenged'],
+            'openshift_detected': openshift,
+            'openshift_challenged': image['openshift_challenged'],
+        }
+
+    def _get(self, user, kind, object_id):
+        """Return an object a user can see, by id."""
+        obj = next((
+            obj for obj in self.state.visible(user, kind)
+            if obj['id'] == int(object_id)
+        ), None)
+        if obj is None:
+            raise StandInError(HTTPStatus.NOT_FOUND, {'detail': 'Not found.'})
+        return obj
+
+    @staticmethod
+    def _kind(path):
+        """Return the kind of objects a path is about."""
+        parts = path.split('/')
+        return StandInHandler._kinds[next(
+            part for part in reversed(parts)
+            if part in StandInHandler._kinds)]
+
+    def _int_param(self, name, default):
+        """Read a positive integer query parameter."""
+        try:
+            return max(0, int(self.query.get(name, default)))
+        except ValueError:
+            raise StandInError(HTTPStatus.BAD_REQUEST, {
+                name: ['A valid integer is required.']})
+
+    # v1 endpoints
+
+    def v1_create_user(self, path):
+        """Create a user, like djoser does."""
+        user = self.state.create_user(
+            self.payload.get('username', ''),
+            self.payload.get('password', ''),
+            self.payload.get('email', ''),
+        )
+        return HTTPStatus.CREATED, {
+            'id': user['id'], 'username': user['username'],
+            'email': user['email']}
+
+    def v1_create_token(self, path):
+        """Log a user in."""
+        token = self.state.create_token(
+            self.payload.get('username', ''),
+            self.payload.get('password', ''),
+        )
+        return HTTPStatus.OK, {'auth_token': token}
+
+    def v1_destroy_token(self, path):
+        """Log a user out."""
+        self._user(path)
+        self.state.destroy_token(
+            self.headers['Authorization'].partition(' ')[2])
+        return HTTPStatus.NO_CONTENT, None
+
+    def v1_me(self, path):
+        """Describe the authenticated user."""
+        user = self._user(path)
+        return HTTPStatus.OK, {
+            'id': user['id'], 'username': user['username'],
+            'email': user['email'], 'is_superuser': user['is_superuser']}
+
+    def v1_set_password(self, path):
+        """Change the password of the authenticated user."""
+        self.state.set_password(
+            self._user(path),
+            self.payload.get('current_password'),
+            self.payload.get('new_password', ''),
+        )
+        return HTTPStatus.NO_CONTENT, None
+
+    def v1_users(self, path):
+        """List the users, for superusers only."""
+        user = self._user(path)
+        if not user['is_superuser']:
+            raise StandInError(HTTPStatus.FORBIDDEN, {
+                'detail': 'You do not have permission to perform this'
+                          ' action.'})
+        users = [
+            {'id': obj['id'], 'username': obj['username'],
+             'is_superuser': obj['is_superuser']}
+            for obj in list(self.state.users.values())
+        ]
+        return self._v1_page(path, users)
+
+    def _v1_page(self, path, objects):
+        """Paginate like the v1 API, with ``page`` and ``page_size``."""
+        size = self._int_param('page_size', self.state.page_size) or 1
+        page = self._int_param('page', 1) or 1
+        start = (page - 1) * size
+        if start and start >= len(objects):
+            raise StandInError(
+                HTTPStatus.NOT_FOUND, {'detail': 'Invalid page.'})
+        return HTTPStatus.OK, {
+            'count': len(objects),
+            'next': self._url(path, page=page + 1, page_size=size)
+            if start + size < len(objects) else None,
+            'previous': self._url(path, page=page - 1, page_size=size)
+            if page > 1 else None,
+            'results': objects[start:start + size],
+        }
+
+    def v1_list(self, path):
+        """List accounts, images or instances."""
+        user = self._user(path)
+        kind = self._kind(path)
+        return self._v1_page(path, [
+            self._v1(kind, obj) for obj in self.state.visible(user, kind)])
+
+    def v1_detail(self, path, id):  # pylint:disable=redefined-builtin
+        """Describe an account, image or instance."""
+        kind = self._kind(path)
+        return HTTPStatus.OK, self._v1(
+            kind, self._get(self._user(path), kind, id))
+
+    def v1_update_account(self, path, id):  # pylint:disable=redefined-builtin
+        """Rename an account."""
+        account = self._get(self._user(path), 'accounts', id)
+        if 'name' in self.payload:
+            self.state.rename_account(account, self.payload['name'])
+        return HTTPStatus.OK, self._v1('accounts', account)
+
+    def _report_window(self):
+        """Read the ``start`` and ``end`` parameters of a report."""
+        errors = {}
+        window = []
+        for name in ('start', 'end'):
+            try:
+                window.append(isoparse(self.query[name]))
+            except (KeyError, ValueError):
+                errors[name] = ['This field is required.']
+        if errors:
+            raise StandInError(HTTPStatus.BAD_REQUEST, errors)
+        return [
+            when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+            for when in window
+        ]
+
+    def _report_instances(self, user, start, end):
+        """Return ``(instance, image, seconds)`` run in a report window."""
+        account_id = self.query.get('account_id')
+        images = {image['id']: image for image in self.state.images.values()}
+        for instance in self.state.visible(user, 'instances'):
+            if account_id and str(instance['account_id']) != account_id:
+                continue
+            seconds = _overlap(instance['runs'], start, end)
+            if seconds:
+                yield instance, images[instance['image_id']], seconds
+
+    def v1_report_accounts(self, path):
+        """Summarize the usage of each account."""
+        user = self._user(path)
+        start, end = self._report_window()
+        overviews = []
+        for account in self.state.visible(user, 'accounts'):
+            images = set()
+            counts = dict.fromkeys((
+                'instances', 'rhel_instances', 'openshift_instances',
+                'rhel_runtime_seconds', 'openshift_runtime_seconds'), 0)
+            for instance, image, seconds in self._report_instances(
+                    user, start, end):
+                if instance['account_id'] != account['id']:
+                    continue
+                fields = self._image_fields(image)
+                images.add(image['id'])
+                counts['instances'] += 1
+                for tag in ('rhel', 'openshift'):
+                    if fields[tag]:
+                        counts[f'{tag}_instances'] += 1
+                        counts[f'{tag}_runtime_seconds'] += seconds
+            overviews.append(dict(
+                counts,
+                id=account['id'],
+                cloud_account_id=account['aws_account_id'],
+                user_id=account['user_id'],
+                type='aws',
+                arn=account['account_arn'],
+                name=account['name'],
+                creation_date=_iso(account['created_at']),
+                images=len(images),
+            ))
+        return HTTPStatus.OK, {'cloud_account_overviews': overviews}
+
+    def v1_report_images(self, path):
+        """Summarize the usage of each image of an account."""
+        user = self._user(path)
+        start, end = self._report_window()
+        if 'account_id' not in self.query:
+            raise StandInError(HTTPStatus.BAD_REQUEST, {
+                'account_id': ['This field is required.']})
+        by_image = {}
+        for _, image, seconds in self._report_instances(user, start, end):
+            fields = self._image_fields(image)
+            report = by_image.setdefault(image['id'], {
+                'id': image['id'],
+                'cloud_image_id': image['ec2_ami_id'],
+                'name': image['name'],
+                'status': fields['status'],
+                'rhel': fields['rhel'],
+                'rhel_challenged': fields['rhel_challenged'],
+                'openshift': fields['openshift'],
+                'openshift_challenged': fields['openshift_challenged'],
+                'instances_seen': 0,
+                'runtime_seconds': 0,
+            })
+            report['instances_seen'] += 1
+            report['runtime_seconds'] += seconds
+        return HTTPStatus.OK, {'images': list(by_image.values())}
+
+    def v1_report_instances(self, path):
+        """Break the usage of the instances down per day."""
+        user = self._user(path)
+        start, end = self._report_window()
+        runs = [
+            (instance, self._image_fields(image))
+            for instance, image, _ in self._report_instances(user, start, end)
+        ]
+        daily_usage = []
+        day = datetime.combine(start.date(), datetime.min.time(),
+                               tzinfo=start.tzinfo)
+        while day < end:
+            next_day = day + timedelta(days=1)
+            usage = dict.fromkeys((
+                'rhel_instances', 'openshift_instances',
+                'rhel_runtime_seconds', 'openshift_runtime_seconds'), 0)
+            for instance, fields in runs:
+                seconds = _overlap(
+                    instance['runs'], max(day, start), min(next_day, end))
+                for tag in ('rhel', 'openshift'):
+                    if seconds and fields[tag]:
+                        usage[f'{tag}_instances'] += 1
+                        usage[f'{tag}_runtime_seconds'] += seconds
+            daily_usage.append(dict(usage, date=_iso(day)))
+            day = next_day
+        return HTTPStatus.OK, {
+            'daily_usage': daily_usage,
+            'instances_seen_with_rhel': sum(
+                fields['rhel'] for _, fields in runs),
+            'instances_seen_with_openshift': sum(
+                fields['openshift'] for _, fields in runs),
+        }
+
+    # Endpoints of both versions
+
+    def sysconfig(self, path):
+        """Describe the deployment."""
+        self._user(path)
+        return HTTPStatus.OK, {
+            'aws_account_id': self.state.aws_account_id,
+            'aws_policies': AWS_POLICIES,
+            'version': self.state.version,
+        }
+
+    def create_account(self, path):
+        """Create a cloud account."""
+        user = self._user(path)
+        account = self.state.create_account(
+            user,
+            self.payload.get('account_arn'),
+            self.payload.get('name'),
+        )
+        if path.startswith(V2_PREFIX):
+            return HTTPStatus.CREATED, self._v2('accounts', account)
+        return HTTPStatus.CREATED, self._v1('accounts', account)
+
+    def delete_account(self, path, id):  # pylint:disable=redefined-builtin
+        """Delete a cloud account."""
+        self.state.delete_account(
+            self._get(self._user(path), 'accounts', id))
+        return HTTPStatus.NO_CONTENT, None
+
+    def challenge(self, path, id):  # pylint:disable=redefined-builtin
+        """Challenge, or stop challenging, the tags of an image."""
+        image = self.state.challenge(
+            self._get(self._user(path), 'images', id), self.payload)
+        if path.startswith(V2_PREFIX):
+            return HTTPStatus.OK, self._v2('images', image)
+        return HTTPStatus.OK, self._v1('images', image)
+
+    # v2 endpoints
+
+    def v2_list(self, path):
+        """List accounts, images or instances, by ``limit`` and ``offset``."""
+        user = self._user(path)
+        kind = self._kind(path)
+        objects = self.state.visible(user, kind)
+        limit = self._int_param('limit', self.state.page_size) or 1
+        offset = self._int_param('offset', 0)
+        last = max(0, (len(objects) - 1) // limit * limit)
+        return HTTPStatus.OK, {
+            'data': [
+                self._v2(kind, obj) for obj in objects[offset:offset + limit]],
+            'links': {
+                'first': self._url(path, limit=limit, offset=0),
+                'last': self._url(path, limit=limit, offset=last),
+                'next': self._url(path, limit=limit, offset=offset + limit)
+                if offset + limit < len(objects) else None,
+                'previous': self._url(
+                    path, limit=limit, offset=max(0, offset - limit))
+                if offset else None,
+            },
+            'meta': {'count': len(objects)},
+        }
+
+    def v2_detail(self, path, id):  # pylint:disable=redefined-builtin
+        """Describe an account, image or instance."""
+        kind = self._kind(path)
+        return HTTPStatus.OK, self._v2(
+            kind, self._get(self._user(path), kind, id))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server answering from a :class:`CloudigradeState`."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address=('127.0.0.1', 0), state=None):
+        """Bind the server, requests are answered once it is served."""
+        super().__init__(server_address, StandInHandler)
+        self.state = state if state is not None else CloudigradeState()
+
+    @property
+    def base_url(self):
+        """Return the host and port, like $CLOUDIGRADE_BASE_URL expects."""
+        host, port = self.server_address[:2]
+        return f'{host}:{port}'
+
+    @property
+    def url(self):
+        """Return the root URL of the server."""
+        return f'http://{self.base_url}/'
+
+    @property
+    def v1_url(self):
+        """Return the URL of the v1 API, to give to ``api.Client``."""
+        return f'http://{self.base_url}/api/v1/'
+
+    @property
+    def v2_url(self):
+        """Return the URL of the v2 API, to give to ``api.ClientV2``."""
+        return f'http://{self.base_url}{V2_PREFIX}'
+
+
+@contextmanager
+def serve(state=None, host='127.0.0.1', port=0):
+    """Serve the stand-in in a background thread.
+
+    :param state: The :class:`CloudigradeState` to answer from, a new one by
+        default.
+    :param port: Port to listen on, any free one by default.
+    :returns: A context manager giving the running :class:`StandInServer`.
+    """
+    server = StandInServer((host, port), state)
+    thread = threading.Thread(
+        target=server.serve_forever,
+        kwargs={'poll_interval': 0.01},
+        daemon=True,
+    )
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
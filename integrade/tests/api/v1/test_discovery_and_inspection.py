@@ -9,22 +9,14 @@
 :upstream: yes
 """
 import functools
-import gzip
-import json
 import operator
-import os
 import random
 import sys
-import time
 from collections import namedtuple
 from copy import deepcopy
-from datetime import datetime, timezone
 from pprint import pformat
-from time import sleep
 from urllib.parse import urlparse
 
-import boto3
-
 import click
 
 import pytest
@@ -34,11 +26,21 @@ from integrade.constants import (
     CLOUD_ACCESS_AMI_NAME,
     MARKETPLACE_AMI_NAME,
 )
-from integrade.exceptions import MissingConfigurationError
-from integrade.tests import aws_utils, urls
+from integrade.index import ObjectIndex
+from integrade.injector import (
+    EventInjector,
+    bad_events,
+    cloudtrail_log,
+    cloudtrail_record,
+    create_event,
+    power_off_events,
+    power_on_events,
+)
+from integrade.tests import aws_utils, urls, utils
 from integrade.tests.aws_utils import aws_image_config_needed
 from integrade.tests.constants import AWS_ACCOUNT_TYPE
 from integrade.tests.utils import get_auth
+from integrade.waiters import MultiWaiter
 
 ImageData = namedtuple(
     'ImageData',
@@ -46,32 +48,6 @@ ImageData = namedtuple(
 )
 """Object to assist in passing around data shared by tests using an image."""
 
-BadEvent = namedtuple('BadEvent', 'name data gzipped')
-"""Object for describing what type of bad event data to place in s3 bucket."""
-
-power_on_events = [
-    'RunInstances',
-    'StartInstances',
-    'StartInstance'
-]
-"""List of possible power on events for use in mock cloudtrail event data."""
-
-
-bad_events = [
-    BadEvent('textfile', b'bad!', False),
-    BadEvent('badjson', b'"{}', True),
-    BadEvent('badinstanceid', None, True),
-    BadEvent('badawsaccount', None, True),
-]
-"""List of types of bad events that in the past have caused bugs."""
-
-power_off_events = [
-    'TerminateInstances',
-    'StopInstances',
-    'TerminateInstanceInAutoScalingGroup'
-]
-"""List of possible power off events for use in mock cloudtrail event data."""
-
 image_test_matrix = [
     ('owned', 'rhel-extra-detection-methods', 'inspected'),
     ('owned', 'rhel-openshift-extra-detection-methods', 'inspected'),
@@ -192,97 +168,221 @@ def image_fixture(request, aws_profile):
     yield images
 
 
-def get_s3_bucket_name():
-    """Get the cloudigrade bucket name and raise an exception if not found."""
-    bucket_name = config.get_config()['cloudigrade_s3_bucket']
-    if not bucket_name:
-        raise MissingConfigurationError(
-            "Need to know the name of cloudigrade's s3"
-            ' bucket to mock events!'
+DiscoveredImages = namedtuple('DiscoveredImages', 'instances images servers')
+"""What cloudigrade found for the images of :func:`image_fixture`.
+
+The ec2 instance ids and ami ids it listed, and the server info of each
+image once inspected, by ami id.
+"""
+
+
+@pytest.fixture(scope='module')
+def discovered_images(request, aws_profile, image_fixture):
+    """Create the cloud account once and wait on every image of the matrix.
+
+    The instances of all the images are waited for at once, then their
+    inspections, so each poll lists the instances or the images once for the
+    whole matrix. Tests then assert on the image they are about.
+    """
+    auth = get_auth()
+    client = api.Client(authenticate=False, response_handler=api.json_handler)
+    cloudtrail = (aws_profile['name'], aws_profile['cloudtrail_name'])
+    aws_utils.delete_cloudtrail(cloudtrail)
+    aws_utils.clean_cloudigrade_queues()
+
+    # Create cloud account on cloudigrade
+    cloud_account = {
+        'name': aws_profile['name'],
+        'account_arn': aws_profile['arn'],
+        'resourcetype': AWS_ACCOUNT_TYPE
+    }
+    client.post(
+        urls.CLOUD_ACCOUNT,
+        payload=cloud_account,
+        auth=auth
+    )
+
+    # Cleanup cloudtrail after the tests so events
+    # don't keep coming into the cloudigrade s3 bucket
+    request.addfinalizer(functools.partial(
+        utils.delete_cloudtrails, [cloudtrail]))
+
+    # Look for instances and images that should have been discovered
+    # upon account creation.
+    found_instances = wait_for_cloudigrade_instances(
+        [image.instance_id for image in image_fixture], auth)
+    list_images = client.get(urls.IMAGE, auth=auth)
+    found_images = [image['ec2_ami_id'] for image in list_images['results']]
+    servers = wait_for_image_inspections(
+        [
+            (image.source_image, expected_state)
+            for image, (_, _, expected_state) in zip(
+                image_fixture, IMAGES_TO_TEST)
+        ],
+        auth,
+    )
+    return DiscoveredImages(found_instances, found_images, servers)
+
+
+def _is_listed(item, listing):
+    """Check whether an item is in a listing."""
+    return item in listing
+
+
+def _progressbar_updater(bar):
+    """Build an ``on_tick`` callback moving ``bar`` along with the waiter."""
+    def on_tick(waiter):
+        bar.update(min(waiter.elapsed, waiter.timeout) - bar.pos)
+    return on_tick
+
+
+def wait_for_cloudigrade_instances(
+        instance_ids, auth, timeout=800, sleep_period=15):
+    """Wait for instances to appear in cloudigrade.
+
+    The instances are listed once per poll, no matter how many are waited
+    for.
+
+    :param instance_ids: The ec2 instance ids you expect to find.
+    :param auth: the auth object for using with the server to authenticate as
+        the user in question.
+
+    :returns: The ec2 instance ids found in cloudigrade on the last poll.
+    """
+    client = api.Client(
+        authenticate=False, response_handler=api.shared_json_handler)
+    sys.stdout.write('\n')
+    with click.progressbar(
+            length=timeout,
+            label=f'Waiting for {len(instance_ids)} instance(s) to appear in'
+            ' cloudigrade'
+    ) as bar:
+        waiter = MultiWaiter(
+            timeout,
+            max_interval=sleep_period,
+            on_tick=_progressbar_updater(bar),
         )
-    return bucket_name
-
-
-def create_event(instance_id, aws_profile, event_type, time=None,
-                 data=None, gzipped=True):
-    """Create an event and place it in the cloudigrade s3 bucket."""
-    bucket_name = get_s3_bucket_name()
-    s3 = boto3.resource('s3')
-    cloudi_bucket = s3.Bucket(bucket_name)
-    if not time:
-        time = datetime.now(timezone.utc).astimezone().isoformat()
-    # create event
-    if data is None:
-        mock_cloudtrail_event = {
-            'Records': [
-                {
-                    'userIdentity': {
-                        'accountId': aws_profile['account_number']},
-                    'awsRegion': os.environ.get('AWS_DEFAULT_REGION',
-                                                'us-east-1'),
-                    'eventSource': 'ec2.amazonaws.com',
-                    'eventName': event_type,
-                    'eventTime': time,
-                    'responseElements': {
-                        'instancesSet': {
-                            'items': [
-                                {
-                                    'instanceId': instance_id
-                                }
-                            ]
-                        }
-                    }
-                }
-            ]
-        }
-        data = bytes(json.dumps(mock_cloudtrail_event), encoding='utf-8')
-    aws_profile_name = aws_profile['name']
-    upload_file = f'{aws_profile_name}-{event_type}-{instance_id}.json.gz'
-    if gzipped:
-        with gzip.open(upload_file, 'wb') as f:
-            f.write(data)
-    else:
-        with open(upload_file, 'wb') as f:
-            f.write(data)
-    path = f'AWSLogs/mock_events/{upload_file}'
-    cloudi_bucket.upload_file(upload_file, path)
-    os.remove(upload_file)
-    return data
+        waiter.add_source('instances', lambda: {
+            instance['ec2_instance_id']
+            for instance in client.get(urls.INSTANCE, auth=auth)['results']
+        })
+        for instance_id in instance_ids:
+            waiter.add(
+                'instances',
+                functools.partial(_is_listed, instance_id),
+                name=instance_id,
+            )
+        waiter.wait()
+    return waiter.listings['instances']
 
 
 def wait_for_cloudigrade_instance(
         instance_id, auth, timeout=800, sleep_period=15):
-    """Wait for image to be inspected and assert on findings.
+    """Wait for an instance to appear in cloudigrade.
 
     :param instance_id: The ec2 instance id you expect to find.
     :param auth: the auth object for using with the server to authenticate as
         the user in question.
 
-    :raises: AssertionError if the image is not inspected or if the results do
-        not match the expected results for product identification.
+    :returns: The ec2 instance ids found in cloudigrade on the last poll.
     """
-    # Wait, keeping track of what images are inspected
-    client = api.Client(authenticate=False, response_handler=api.json_handler)
-    start = time.time()
-    timepassed = 0
+    return wait_for_cloudigrade_instances(
+        [instance_id], auth, timeout, sleep_period)
+
+
+def _find_image(images, ec2_ami_id):
+    """Find the server info of an image in a list of images."""
+    if not isinstance(images, ObjectIndex):
+        images = ObjectIndex(images)
+    return images.get('ec2_ami_id', ec2_ami_id)
+
+
+def _image_status(ec2_ami_id, images):
+    """Return the inspection status of an image, None if it is not listed."""
+    image = _find_image(images, ec2_ami_id)
+    return image['status'] if image else None
+
+
+def _inspection_finished(expected_state, ec2_ami_id, images):
+    """Return the server info of an image that is done being inspected."""
+    image = _find_image(images, ec2_ami_id)
+    if image and image['status'] in (expected_state, 'error'):
+        return image
+    return None
+
+
+def wait_for_image_inspections(
+        source_images_and_states, auth, timeout=4800, sleep_period=30):
+    """Wait for images to be inspected, each to its own expected state.
+
+    The images are listed once per poll, no matter how many are waited for.
+
+    :param source_images_and_states: List of tuples of (source_image,
+        expected_state), see :func:`wait_for_inspection`.
+    :param auth: the auth object for using with the server to authenticate as
+        the user in question.
+
+    :returns: The server info of each image on the last poll, by image id,
+        None for the images which were not listed.
+    """
+    client = api.Client(
+        authenticate=False, response_handler=api.shared_json_handler)
     sys.stdout.write('\n')
+    image_ids = [
+        source_image['image_id']
+        for source_image, _ in source_images_and_states
+    ]
     with click.progressbar(
             length=timeout,
-            label=f'Waiting for instance {instance_id} to appear in'
-            ' cloudigrade'
+            label=f'Waiting for inspection of {", ".join(image_ids)}'
     ) as bar:
-        while True:
-            list_instances = client.get(urls.INSTANCE, auth=auth)
-            found_instances = [instance['ec2_instance_id']
-                               for instance in list_instances['results']]
-            if instance_id in found_instances:
-                return found_instances
-            sleep(sleep_period)
-            now = time.time()
-            timepassed = now - start
-            bar.update(timepassed)
-            if timepassed >= timeout:
-                return found_instances
+        waiter = MultiWaiter(
+            timeout,
+            max_interval=sleep_period,
+            on_tick=_progressbar_updater(bar),
+        )
+        waiter.add_source('images', lambda: ObjectIndex(
+            client.get(urls.IMAGE, auth=auth)['results']))
+        for image_id, (_, expected_state) in zip(
+                image_ids, source_images_and_states):
+            waiter.add(
+                'images',
+                functools.partial(
+                    _inspection_finished, expected_state, image_id),
+                name=image_id,
+                state=functools.partial(_image_status, image_id),
+            )
+        waiter.wait()
+    return {
+        image_id: _find_image(waiter.listings['images'], image_id)
+        for image_id in image_ids
+    }
+
+
+def wait_for_inspections(
+        source_images, expected_state, auth, timeout=4800, sleep_period=30):
+    """Wait for images to be inspected and assert on findings.
+
+    The images are listed once per poll, no matter how many are waited for.
+
+    :param source_images: List of dictionaries with information about each
+        image, see :func:`wait_for_inspection`.
+    :param auth: the auth object for using with the server to authenticate as
+        the user in question.
+
+    :raises: AssertionError if an image is not inspected or if the results do
+        not match the expected results for product identification.
+    """
+    server_infos = wait_for_image_inspections(
+        [(source_image, expected_state) for source_image in source_images],
+        auth,
+        timeout,
+        sleep_period,
+    )
+    for source_image in source_images:
+        _assert_inspection_results(
+            source_image, expected_state,
+            server_infos[source_image['image_id']])
 
 
 def wait_for_inspection(
@@ -303,41 +403,17 @@ def wait_for_inspection(
     :raises: AssertionError if the image is not inspected or if the results do
         not match the expected results for product identification.
     """
-    # Wait, keeping track of what images are inspected
-    client = api.Client(authenticate=False, response_handler=api.json_handler)
-    source_image_id = source_image['image_id']
-    start = time.time()
-    timepassed = 0
-    sys.stdout.write('\n')
+    wait_for_inspections(
+        [source_image], expected_state, auth, timeout, sleep_period)
+
+
+def _assert_inspection_results(source_image, expected_state, server_info):
+    """Assert an image reached the expected state with the expected facts."""
     status = 'ABSENT'
     inspection_json = None
-    with click.progressbar(
-            length=timeout,
-            label=f'Waiting for inspection of {source_image["image_id"]}'
-    ) as bar:
-        while True:
-            server_info = client.get(urls.IMAGE, auth=auth)
-            if server_info:
-                server_info = [
-                    image for image in server_info['results'] if
-                    image['ec2_ami_id'] == source_image_id
-                ]
-                if server_info:
-                    server_info = server_info[0]
-                    status = server_info['status']
-                    inspection_json = pformat(server_info['inspection_json'])
-            if status == 'error':
-                break
-            if status in ['pending', 'preparing', 'inspecting', 'ABSENT']:
-                sleep(sleep_period)
-                now = time.time()
-                timepassed = now - start
-                bar.update(timepassed)
-
-            if status == expected_state:
-                break
-            if timepassed >= timeout:
-                break
+    if server_info:
+        status = server_info['status']
+        inspection_json = pformat(server_info['inspection_json'])
     # assert the image did reach expected state before timeout
     assert status == expected_state, (
                         f'\nState was {status} instead of expected:'
@@ -379,6 +455,74 @@ def wait_for_inspection(
                 assert server_info['rhel_detected'] is False
 
 
+def _list_instance_events(client, auth, instance_ids_by_url):
+    """List the events as (event_type, ec2_instance_id) tuples.
+
+    The ec2 instance id of an instance never changes, so it is looked up only
+    once per instance and remembered in ``instance_ids_by_url``.
+    """
+    events = []
+    for event in client.get(urls.EVENT, auth=auth).get('results'):
+        instance_url = event.get('instance')
+        if instance_url not in instance_ids_by_url:
+            instance_path = urlparse(instance_url).path
+            instance_ids_by_url[instance_url] = client.get(
+                instance_path, auth=auth).get('ec2_instance_id')
+        events.append(
+            (event.get('event_type'), instance_ids_by_url[instance_url]))
+    return events
+
+
+def wait_for_instance_events(
+        instances_and_event_types,
+        auth,
+        aws_profile_name,
+        events=None,
+        timeout=1200,
+        sleep_period=30):
+    """Wait until events of the types specified occur for the instances.
+
+    The events are listed once per poll, no matter how many are waited for.
+
+    :param instances_and_event_types: List of tuples of (instance_id,
+        event_type).
+    :param events: Optional list with the mocked event data, used to describe
+        what was waited for on timeout.
+
+    :raises: integrade.exceptions.EventTimeoutError if any such event is not
+        found in the time allowed.
+    """
+    client = api.Client(
+        authenticate=False, response_handler=api.shared_json_handler)
+    instance_ids_by_url = {}
+    sys.stdout.write('\n')
+    event_types = sorted({
+        event_type for _, event_type in instances_and_event_types})
+    with click.progressbar(
+            length=timeout,
+            label=f'Waiting for {", ".join(event_types)} event(s)') as bar:
+        waiter = MultiWaiter(
+            timeout,
+            max_interval=sleep_period,
+            on_tick=_progressbar_updater(bar),
+        )
+        waiter.add_source('events', functools.partial(
+            _list_instance_events, client, auth, instance_ids_by_url))
+        for instance_id, event_type in instances_and_event_types:
+            waiter.add(
+                'events',
+                functools.partial(_is_listed, (event_type, instance_id)),
+                name=f'{event_type} event for instance {instance_id}',
+            )
+        if waiter.wait():
+            return
+    missing = '\n'.join(condition.name for condition in waiter.pending)
+    events = pformat(events)
+    raise exceptions.EventTimeoutError(
+        f'\nTimed out while waiting for events for the aws profile'
+        f'\n{aws_profile_name}:\n{missing}\nThe event data was:\n{events}')
+
+
 def wait_for_instance_event(
         instance_id,
         event_type,
@@ -392,32 +536,14 @@ def wait_for_instance_event(
     :raises: integrade.exceptions.EventTimeoutError if no such event is found
         in the time allowed.
     """
-    client = api.Client(authenticate=False, response_handler=api.json_handler)
-    timepassed = 0
-    sys.stdout.write('\n')
-    with click.progressbar(
-            length=timeout,
-            label=f'Waiting for {event_type} event') as bar:
-        while True:
-            events = client.get('/api/v1/event/', auth=auth).get('results')
-            for event in events:
-                if event.get('event_type') == event_type:
-                    instance_url = event.get('instance')
-                    instance_path = urlparse(instance_url).path
-                    this_instance_id = client.get(
-                        instance_path, auth=auth).get('ec2_instance_id')
-                    if this_instance_id == instance_id:
-                        return
-            sleep(sleep_period)
-            timepassed += sleep_period
-            bar.update(timeout / timepassed)
-            if timepassed >= timeout:
-                break
-    event = pformat(event)
-    raise exceptions.EventTimeoutError(
-        f'\nTimed out while waiting for {event_type} event for instance'
-        f'\nwith instance id {instance_id} for the aws profile'
-        f'\n{aws_profile_name}. The event data was:\n{event}')
+    wait_for_instance_events(
+        [(instance_id, event_type)],
+        auth,
+        aws_profile_name,
+        [event],
+        timeout,
+        sleep_period,
+    )
 
 
 @pytest.mark.inspection
@@ -430,9 +556,8 @@ def wait_for_instance_event(
                          )
 def test_find_running_instances(
         test_case,
-        aws_profile,
-        cloudtrails_to_delete,
         image_fixture,
+        discovered_images,
 ):
     """Ensure instances are discovered on account creation.
 
@@ -456,10 +581,8 @@ def test_find_running_instances(
         3) The images are eventually inspected.
     """
     image_type, image_name, expected_state = test_case
-    bypass_inspection = False
     if image_fixture[0].image_name == test_case[1]:
         image_fixture = image_fixture[0]
-        bypass_inspection = True
     else:
         image_fixture = image_fixture[1]
 
@@ -470,46 +593,16 @@ def test_find_running_instances(
             or image_type != image_fixture.image_type:
         pytest.skip(f'Only testing {IMAGES_TO_TEST}')
 
-    auth = get_auth()
-    client = api.Client(authenticate=False, response_handler=api.json_handler)
-    aws_profile_name = aws_profile['name']
-    aws_utils.delete_cloudtrail(
-        (aws_profile_name, aws_profile['cloudtrail_name']))
-    aws_utils.clean_cloudigrade_queues()
-
-    # Create cloud account on cloudigrade
-    cloud_account = {
-        'name': aws_profile['name'],
-        'account_arn': aws_profile['arn'],
-        'resourcetype': AWS_ACCOUNT_TYPE
-    }
-    client.post(
-        urls.CLOUD_ACCOUNT,
-        payload=cloud_account,
-        auth=auth
-    )
-
-    # Cleanup cloudtrail after test so events
-    # don't keep coming into the cloudigrade s3 bucket
-    cloudtrails_to_delete.append(
-        (aws_profile['name'], aws_profile['cloudtrail_name'])
+    # Instances and images were discovered, and the images inspected, upon
+    # account creation.
+    assert instance_id in discovered_images.instances
+    assert source_image_id in discovered_images.images
+    _assert_inspection_results(
+        source_image,
+        expected_state,
+        discovered_images.servers[source_image_id],
     )
 
-    # Look for instances that should have been discovered
-    # upon account creation.
-    found_instances = wait_for_cloudigrade_instance(instance_id, auth)
-    assert instance_id in found_instances
-
-    # Look for images that should have been discovered
-    # upon account creation.
-    list_images = client.get(urls.IMAGE, auth=auth)
-    found_images = [image['ec2_ami_id'] for image in list_images['results']]
-    assert source_image_id in found_images
-    if bypass_inspection:
-        wait_for_inspection(source_image, expected_state, auth, timeout=200)
-    else:
-        wait_for_inspection(source_image, expected_state, auth)
-
 
 @pytest.mark.inspection
 @aws_image_config_needed
@@ -547,7 +640,7 @@ def test_on_off_events(
         5) The power on events events eventually recorded.
     """
     # check and make sure the instance is not running
-    client = aws_utils.aws_session(aws_profile['name']).client('ec2')
+    client = aws_utils.aws_client(aws_profile['name'], 'ec2')
     reservations = client.describe_instances(Filters=[{
         'Name': 'instance-state-name',
         'Values': [
@@ -602,14 +695,16 @@ def test_on_off_events(
         bad_event_aws_profile['account_number'] = 123
     elif bad_event.name == 'badinstanceid':
         bad_event_instance_id = 'i-123'
-    for _ in range(random.randint(1, 10)):
-        create_event(
-            bad_event_instance_id,
-            bad_event_aws_profile,
-            event_type='BadEvent',
-            data=bad_event.data,
-            gzipped=bad_event.gzipped
-        )
+    with EventInjector() as injector:
+        for _ in range(random.randint(1, 10)):
+            data = bad_event.data
+            if data is None:
+                data = cloudtrail_log([cloudtrail_record(
+                    bad_event_instance_id,
+                    bad_event_aws_profile,
+                    'BadEvent',
+                )])
+            injector.put(data, gzipped=bad_event.gzipped)
 
     wait_for_instance_event(
         instance_id,
@@ -636,9 +731,8 @@ def test_on_off_events(
 @aws_image_config_needed
 @pytest.mark.serial_only
 def test_broken_image(
-        aws_profile,
-        cloudtrails_to_delete,
         image_fixture,
+        discovered_images,
 ):
     """Ensure Houndigrade handles broken image inspection gracefully.
 
@@ -668,39 +762,12 @@ def test_broken_image(
     source_image_id = source_image['image_id']
     instance_id = image_fixture.instance_id
 
-    auth = get_auth()
-    client = api.Client(authenticate=False, response_handler=api.json_handler)
-    aws_profile_name = aws_profile['name']
-    aws_utils.delete_cloudtrail(
-        (aws_profile_name, aws_profile['cloudtrail_name']))
-    aws_utils.clean_cloudigrade_queues()
-
-    # Create cloud account on cloudigrade
-    cloud_account = {
-        'name': aws_profile['name'],
-        'account_arn': aws_profile['arn'],
-        'resourcetype': AWS_ACCOUNT_TYPE
-    }
-    client.post(
-        urls.CLOUD_ACCOUNT,
-        payload=cloud_account,
-        auth=auth
+    # Instances and images were discovered, and the images inspected, upon
+    # account creation.
+    assert instance_id in discovered_images.instances
+    assert source_image_id in discovered_images.images
+    _assert_inspection_results(
+        source_image,
+        expected_state,
+        discovered_images.servers[source_image_id],
     )
-
-    # Cleanup cloudtrail after test so events
-    # don't keep coming into the cloudigrade s3 bucket
-    cloudtrails_to_delete.append(
-        (aws_profile['name'], aws_profile['cloudtrail_name'])
-    )
-
-    # Look for instances that should have been discovered
-    # upon account creation.
-    found_instances = wait_for_cloudigrade_instance(instance_id, auth)
-    assert instance_id in found_instances
-
-    # Look for images that should have been discovered
-    # upon account creation.
-    list_images = client.get(urls.IMAGE, auth=auth)
-    found_images = [image['ec2_ami_id'] for image in list_images['results']]
-    assert source_image_id in found_images
-    wait_for_inspection(source_image, expected_state, auth)
@@ -85,14 +85,12 @@ def test_create_cloud_account(cloudtrails_to_delete, aws_profile, request):
     assert 'allow-dev11-cloudigrade-metering' in permission
 
     # Start AWS session and cloudtrail client
-    session = aws_utils.aws_session('DEV07CUSTOMER')
+    cloudtrails_client = aws_utils.aws_client('DEV07CUSTOMER', 'cloudtrail')
     env_bucket_name = config.get_config(
         )['openshift_prefix'].strip('c-review-')
-    aws_cloudtrails = session.client(
-        'cloudtrail').describe_trails()['trailList']
+    aws_cloudtrails = cloudtrails_client.describe_trails()['trailList']
     aws_cloudtrail_found = False
     aws_cloudtrail_arn = ''
-    cloudtrails_client = session.client('cloudtrail')
 
     # Find the cloudtrail for this particular account and check that
     # it's enabled.
@@ -18,12 +18,14 @@ from uuid import uuid4
 import pytest
 
 from integrade import api, config
+from integrade.index import ObjectIndex
 from integrade.tests import aws_utils
 from integrade.tests.constants import (
     LONG_TIMEOUT,
     MEDIUM_TIMEOUT,
 )
 from integrade.tests.utils import delete_preexisting_accounts
+from integrade.waiters import MultiWaiter
 
 
 _logger = logging.getLogger(__name__)
@@ -50,22 +52,18 @@ def _get_object_with_timeout(client, path, timeout):
     """
     Repoll a cloudigrade path until some data is returned.
 
+    The data is returned as an :class:`integrade.index.ObjectIndex`, so the
+    objects can be looked up by their ec2 ids without scanning them.
+
     Args:
       client: An API client
       path (string): An enpoint located at /v2/{path}
       timeout (int): timeout time in minutes
     """
     start_time = datetime.now()
-    data = []
     while datetime.now() < start_time+timedelta(minutes=timeout):
-        objects = client.request('get', path).json()
-        count = objects['meta']['count']
-        if count != 0:
-            data.extend(objects['data'])
-            while objects['links']['next'] is not None:
-                objects = client.request(
-                    'get', objects['links']['next']).json()
-                data.extend(objects['data'])
+        data = ObjectIndex(client.iter_objects(path))
+        if data:
             return data
         else:
             sleep(5)
@@ -73,6 +71,13 @@ def _get_object_with_timeout(client, path, timeout):
     _logger.info('No objects at %s were found before timeout.', path)
 
 
+def _as_index(objects):
+    """Index API objects by their ec2 ids, unless they already are."""
+    if isinstance(objects, ObjectIndex):
+        return objects
+    return ObjectIndex(objects)
+
+
 def _get_instance_id_with_ec2_instance_id(ec2_instance_id, instances):
     """
     Get the instance id of a given ec2 instance with ec2_instance_id.
@@ -84,9 +89,9 @@ def _get_instance_id_with_ec2_instance_id(ec2_instance_id, instances):
       instances [Instance]: instance data from cloudigrade's /v2/instances/
         endpoint.
     """
-    for instance in instances:
-        if instance['content_object']['ec2_instance_id'] == ec2_instance_id:
-            return instance['content_object']['ec2_instance_id']
+    instance = _as_index(instances).get('ec2_instance_id', ec2_instance_id)
+    if instance is not None:
+        return instance['content_object']['ec2_instance_id']
     return None
 
 
@@ -101,114 +106,160 @@ def _image_id_with_ec2_image_id(ec2_image_id, images):
         endpoint.
 
     """
-    for image in images:
-        if image['content_object']['ec2_ami_id'] == ec2_image_id:
-            return image['content_object']['ec2_ami_id']
+    image = _as_index(images).get('ec2_ami_id', ec2_image_id)
+    if image is not None:
+        return image['content_object']['ec2_ami_id']
     return None
 
 
-def _aws_image_id(ec2_image_id, images):
-    """Get AWS image id of an image by its ec2 id."""
-    for image in images:
-        if image['content_object']['ec2_ami_id'] == ec2_image_id:
-            return image['content_object']['id']
-    return None
+# Seconds between two reports of an image whose status did not change.
+_REPORT_INTERVAL = 100
 
+_WAITING_MESSAGES = [
+    (900, '(ノಠ益ಠ)ノ彡┻━┻ '),
+    (800, 'щ（ﾟДﾟщ） < "Dear god why‽ )'),
+    (700, 'Come ON aws. ಠ╭╮ಠ Get this show on the road!'),
+    (600, '(☞ﾟヮﾟ)☞ ☜(ﾟヮﾟ☜) You still here? Ya, me too ಠ_ಠ'),
+    (500, 'ᕙ(⇀｡↼‶)ᕗ  I need a nap.'),
+    (400, '(´･_･`) You should probably leave.'),
+    (300, 'And here we are. ( ͡~ ͜ʖ ͡°) Still waiting'),
+    (200, '♪~ ᕕ(ᐛ)ᕗ Still waiting.'),
+]
 
-def _get_image_data(item, ec2_ami_id):
-    """Find the response data for a specific image."""
-    if item['content_object']['ec2_ami_id'] == ec2_ami_id:
-        return item
 
+def _waiting_message(time_lapsed, status):
+    """Pick something to say while waiting on an image in ``status``."""
+    if status != 'preparing':
+        return 'This looks like progress ┬┴┤( ͡⚆ل͜├┬┴┬'
+    for seconds, message in _WAITING_MESSAGES:
+        if time_lapsed >= seconds:
+            return message
+    return 'Waiting...'
 
-def _wait_for_inspection_with_timeout(
-        client, image_id, timeout, expected_state):
+
+def _image_status(ec2_image_id, images):
+    """Get the inspection status of an image by its ec2 id."""
+    image = _as_index(images).get('ec2_ami_id', ec2_image_id)
+    if image is not None:
+        return image['status']
+    return 'ABSENT'
+
+
+def _inspection_complete(ec2_image_id, expected_state, complete_status,
+                         images):
+    """Return the status of an image if it is done being inspected.
+
+    An image which is not listed, for example because it was deleted, will
+    never be inspected, so it is done too, with the status ``ABSENT``.
     """
-    Repoll a cloudigrade path until some data is returned.
+    status = _image_status(ec2_image_id, images)
+    if (status == expected_state or status in complete_status
+            or status == 'ABSENT'):
+        return status
+    return None
+
+
+def _wait_for_inspections_with_timeout(
+        client, image_ids, timeout, expected_state):
+    """
+    Repoll cloudigrade until the images are done being inspected.
+
+    The images are listed once per poll, no matter how many are waited for.
 
     Args:
       client: An API client
-      ec2_ami_id (string): The image id that is being inspected
+      image_ids [string]: The ec2 image ids that are being inspected
       timeout (int): timeout time in minutes
       expected_state (string): The expected state of the inspection
+
+    Returns a dict telling for each image id whether it reached the expected
+    state.
     """
-    start_time = datetime.now()
-    time_lapsed = 0
-    status = 'ABSENT'
-    message = 'Waiting...'
     complete_status = [
         'inspected',
         'unavailable',
         'error']
-    incomplete_status = [
-        'pending',
-        'preparing',
-        'inspecting',
-        'ABSENT',
-        'unavailable',
-        ]
 
     if expected_state in complete_status:
         complete_status.remove(expected_state)
-    if expected_state in incomplete_status:
-        incomplete_status.remove(expected_state)
+
+    # Status last printed for each image, and when.
+    reported = {}
+
+    def report(waiter):
+        images = waiter.listings['images']
+        for condition in waiter.pending:
+            status = _image_status(condition.name, images)
+            last_status, last_time = reported.get(condition.name, (None, 0))
+            if (status == last_status
+                    and waiter.elapsed - last_time < _REPORT_INTERVAL):
+                continue
+            reported[condition.name] = (status, waiter.elapsed)
+            message = _waiting_message(waiter.elapsed, status)
+            print(f"\nStatus of {condition.name} is '{status}'. {message}")
+            print(f'time lapsed: {int(waiter.elapsed)}sec.')
 
     # Watch for inspection process to work
-    while datetime.now() < start_time+timedelta(minutes=timeout):
+    waiter = MultiWaiter(
+        timeout * 60,
+        min_interval=5,
+        max_interval=100,
+        on_tick=report,
+    )
+    waiter.add_source(
+        'images',
+        lambda: ObjectIndex(client.iter_objects('images/', shared=True)))
+    conditions = [
+        waiter.add(
+            'images',
+            functools.partial(
+                _inspection_complete,
+                image_id,
+                expected_state,
+                complete_status,
+            ),
+            name=image_id,
+            state=functools.partial(_image_status, image_id),
+        )
+        for image_id in image_ids
+    ]
+    waiter.wait()
+
+    results = {}
+    for condition in conditions:
+        image_id = condition.name
+        if condition.result == expected_state:
+            print(
+                f"\nStatus of {image_id} is '{condition.result}'."
+                ' (◎≧v≦)人(≧v≦●)')
+            results[image_id] = True
+        elif condition.result == 'ABSENT':
+            _logger.info('Image %s does not exist, was it deleted?', image_id)
+            results[image_id] = False
+        elif condition.done:
+            print(
+                f'Inspection of {image_id} complete with unexpected status:'
+                f' {condition.result}')
+            results[image_id] = False
+        else:
+            _logger.info('Image %s not inspected before timeout.', image_id)
+            results[image_id] = False
+    return results
 
-        # Get the image specific image.
-        images = _get_object_with_timeout(client, 'images/', MEDIUM_TIMEOUT)
-        image = _aws_image_id(image_id, images)
 
-        response = client.request('get', f'images/{image}/')
-        if response.status_code == 404:
-            _logger.info(
-                'Image {}, id: {} does not exist, was it deleted?',
-                image_id,
-                image)
-            return False
-        image_data = response.json()
-
-        # Watch image status
-        if image_data is not None:
-            status = image_data['status']
-            if status == expected_state:
-                print(
-                    f"\nStatus is '{status}'. (◎≧v≦)人(≧v≦●)")
-                return True
-            elif status in complete_status:
-                print(f'Inspection complete with unexpected status: {status}')
-                return False
-            elif status in incomplete_status:
-
-                time_lapsed += 100
-                if time_lapsed == 200:
-                    message = '♪~ ᕕ(ᐛ)ᕗ Still waiting.'
-                elif time_lapsed == 300:
-                    message = 'And here we are. ( ͡~ ͜ʖ ͡°) Still waiting'
-                elif time_lapsed == 400:
-                    message = '(´･_･`) You should probably leave.'
-                elif time_lapsed == 500:
-                    message = 'ᕙ(⇀｡↼‶)ᕗ  I need a nap.'
-                elif time_lapsed == 600:
-                    message = '(☞ﾟヮﾟ)☞ ☜(ﾟヮﾟ☜) You still here? Ya, me too ಠ_ಠ'
-                elif time_lapsed == 700:
-                    message = 'Come ON aws. ಠ╭╮ಠ Get this show on the road!'
-                elif time_lapsed == 800:
-                    message = 'щ（ﾟДﾟщ） < "Dear god why‽ )'
-                elif time_lapsed == 900:
-                    message = '(ノಠ益ಠ)ノ彡┻━┻ '
-                if status != 'preparing':
-                    message = 'This looks like progress ┬┴┤( ͡⚆ل͜├┬┴┬'
-                print(f"\nStatus is '{status}'. {message}")
-                print(f'time lapsed: {time_lapsed}sec.')
-                sleep(100)
-            if status == expected_state:
-                print(
-                    f"\nStatus is '{status}'. (◎≧v≦)人(≧v≦●)")
-                return True
-    _logger.info('Image %s not inspected before timeout.', image_id)
-    return False
+def _wait_for_inspection_with_timeout(
+        client, image_id, timeout, expected_state):
+    """
+    Repoll cloudigrade until an image is done being inspected.
+
+    Args:
+      client: An API client
+      image_id (string): The ec2 image id that is being inspected
+      timeout (int): timeout time in minutes
+      expected_state (string): The expected state of the inspection
+    """
+    return _wait_for_inspections_with_timeout(
+        client, [image_id], timeout, expected_state)[image_id]
 
 
 # Run test against all of the images
@@ -307,29 +358,23 @@ def test_discovery(test_case, request):
     assert _image_id_with_ec2_image_id(ec2_ami_id, images) is not None
 
 
-@pytest.mark.parametrize('test_case', IMAGES_TO_INSPECT,
-                         ids=[
-                             '{}-{}'.format(item[0], item[1])
-                             for item in IMAGES_TO_INSPECT
-                         ],
-                         )
-def test_inspection(test_case, request):
-    """Ensure instances are inspected.
+InspectedImage = namedtuple('InspectedImage', 'instance_id image_id result')
+"""What cloudigrade found for one of :data:`IMAGES_TO_INSPECT`.
 
-    :id: 45BBB27E-F38D-415F-B64F-B2543D1132DE
-    :description: Ensure images are inspected for all running instances.
-    :steps: 1) Create a cloud account
-        2) Run instances based off of a non-windows image
-        3) Send a GET to '/api/cloudigrade/v2/instances/' with a timeout and
-            expect to get the instances we created
-        4) Send a GET to '/api/cloudigrade/v2/images/' and expect to get the
-            image that the instances were based off of.
-        5) Keep checking to see that the images progress from "pending",
-            "preparing", "inspecting", to "inspected"
-    :expectedresults:
-        1) We get 200 responses for our GET requests and information about
-            the images includes inspection state information.
-        2) The images are eventually inspected.
+The instance and image ids it listed, None if they were not found, and
+whether the image reached its expected state.
+"""
+
+
+@pytest.fixture(scope='module')
+def inspected_images(request):
+    """Run an instance of every image to inspect and wait on all of them.
+
+    The cloud account is created once, and the inspections of all the images
+    are waited for at once, so each poll lists the images once for the whole
+    matrix.
+
+    :returns: dict of the :data:`InspectedImage` of each test case.
     """
     aws_profile = config.get_config()['aws_profiles'][0]
     aws_profile_name = aws_profile['name']
@@ -356,32 +401,81 @@ def test_inspection(test_case, request):
         'post', 'accounts/', data=acct_data_params)
     assert add_acct_response.status_code == 201
 
-    # Start an instance for initial discovery
-    image_type, image_name, expected_state = test_case
-    ec2_ami_id = ''
-    for image in aws_profile['images'][image_type]:
-        if image_name == image['name']:
-            ec2_ami_id = image['image_id']
-
-    instance_id = aws_utils.run_instances_by_name(
-        aws_profile_name, image_type, image_name, count=1)[0]
-    request.addfinalizer(functools.partial(
-        aws_utils.terminate_instance,
-        (aws_profile_name, instance_id)
-    ))
+    # Start an instance of every image for initial discovery
+    ec2_ami_ids = {}
+    instance_ids = {}
+    for test_case in IMAGES_TO_INSPECT:
+        image_type, image_name, expected_state = test_case
+        ec2_ami_ids[test_case] = ''
+        for image in aws_profile['images'][image_type]:
+            if image_name == image['name']:
+                ec2_ami_ids[test_case] = image['image_id']
+        instance_ids[test_case] = aws_utils.run_instances_by_name(
+            aws_profile_name, image_type, image_name, count=1)[0]
+        request.addfinalizer(functools.partial(
+            aws_utils.terminate_instance,
+            (aws_profile_name, instance_ids[test_case])
+        ))
 
     instances = _get_object_with_timeout(
         client, 'instances/', MEDIUM_TIMEOUT)
     images = _get_object_with_timeout(client, 'images/', MEDIUM_TIMEOUT)
+    image_ids = {
+        test_case: _image_id_with_ec2_image_id(ec2_ami_id, images)
+        for test_case, ec2_ami_id in ec2_ami_ids.items()
+    }
 
-    # Check that images and instances show up in Cloudigrade account
-    assert _get_instance_id_with_ec2_instance_id(instance_id, instances) is \
-        not None
+    # Wait for the images expecting the same state together.
+    results = {}
+    for expected_state in {test_case[2] for test_case in IMAGES_TO_INSPECT}:
+        waited = [
+            image_id for test_case, image_id in image_ids.items()
+            if test_case[2] == expected_state and image_id is not None
+        ]
+        if waited:
+            results[expected_state] = _wait_for_inspections_with_timeout(
+                client, waited, LONG_TIMEOUT, expected_state)
+
+    return {
+        test_case: InspectedImage(
+            _get_instance_id_with_ec2_instance_id(
+                instance_ids[test_case], instances),
+            image_ids[test_case],
+            results.get(test_case[2], {}).get(image_ids[test_case]),
+        )
+        for test_case in IMAGES_TO_INSPECT
+    }
+
+
+@pytest.mark.parametrize('test_case', IMAGES_TO_INSPECT,
+                         ids=[
+                             '{}-{}'.format(item[0], item[1])
+                             for item in IMAGES_TO_INSPECT
+                         ],
+                         )
+def test_inspection(test_case, inspected_images):
+    """Ensure instances are inspected.
 
-    image_id = _image_id_with_ec2_image_id(ec2_ami_id, images)
+    :id: 45BBB27E-F38D-415F-B64F-B2543D1132DE
+    :description: Ensure images are inspected for all running instances.
+    :steps: 1) Create a cloud account
+        2) Run instances based off of a non-windows image
+        3) Send a GET to '/api/cloudigrade/v2/instances/' with a timeout and
+            expect to get the instances we created
+        4) Send a GET to '/api/cloudigrade/v2/images/' and expect to get the
+            image that the instances were based off of.
+        5) Keep checking to see that the images progress from "pending",
+            "preparing", "inspecting", to "inspected"
+    :expectedresults:
+        1) We get 200 responses for our GET requests and information about
+            the images includes inspection state information.
+        2) The images are eventually inspected.
+    """
+    instance_id, image_id, inspection_results = inspected_images[test_case]
+
+    # Check that images and instances show up in Cloudigrade account
+    assert instance_id is not None
     assert image_id is not None
 
     # Check that Cloudigrade eventually inspects images.
-    inspection_results = _wait_for_inspection_with_timeout(
-        client, image_id, LONG_TIMEOUT, expected_state)
     assert inspection_results is True
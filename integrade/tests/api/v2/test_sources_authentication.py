@@ -15,6 +15,7 @@ import time
 from datetime import datetime, timedelta
 
 from integrade import api, config
+from integrade.index import ObjectIndex
 from integrade.tests.constants import (
     SOURCES_URL,
 )
@@ -84,24 +85,17 @@ def wait_for_response_with_timeout(client, params, arn, timeout):
             second one (also string) is the endpoint to hit.
         timeout (int): how long (seconds) do we want to wait before giving up.
         Currently in these tests, there won't me many items returned in the
-        response, but pagination is included in case there are more than 10.
+        response, but pages are followed lazily in case there are more than
+        10, stopping at the page where the arn is found.
     """
     start_time = datetime.now()
     method, endpoint = params
+    assert method.lower() == 'get', 'Only list endpoints can be polled.'
     while datetime.now() < start_time+timedelta(seconds=timeout):
-        cloudi_response = client.request(f'{method}', f'{endpoint}').json()
-        count = cloudi_response['meta']['count']
-        if count != 0:
-            for response_arn in cloudi_response['data']:
-                if response_arn['content_object']['account_arn'] == arn:
-                    return response_arn
-                else:
-                    while cloudi_response['links']['next'] is not None:
-                        cloudi_response = client.request(
-                            'get', cloudi_response['links']['next']).json()
-                        for response_arn in cloudi_response['data']:
-                            if response_arn == arn:
-                                return response_arn
+        accounts = ObjectIndex(client.iter_objects(endpoint))
+        account = accounts.get('account_arn', arn)
+        if account is not None:
+            return account
         time.sleep(3)
     _logger.info(
         f"Cloudigrade didn't notice event {params} before timeout.")
@@ -1,10 +1,15 @@
 """Utility functions for interacting with the AWS API."""
 
+import functools
+import hashlib
+import itertools
 import json
 import logging
 import os
 import random
-from multiprocessing import Pool
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 
@@ -16,10 +21,44 @@ from integrade import config
 from integrade.exceptions import (
     AWSCredentialsNotFoundError,
     ConfigFileNotFoundError,
+    InstanceStateError,
+    LifecycleError,
     MissingConfigurationError
 )
-from integrade.tests.constants import EC2_TERMINATED_CODE
+from integrade.local_aws import default_client, local_backend
+from integrade.tests.constants import (
+    EC2_INVALID_INSTANCE_ID_ERRORS,
+    EC2_MAX_FILTER_VALUES,
+    EC2_MAX_INSTANCE_IDS,
+    EC2_NOT_TERMINATED_STATES,
+    EC2_UNREACHABLE_STATES,
+)
 from integrade.utils import uuid4
+from integrade.waiters import MultiWaiter
+
+
+# `aws_session`, `aws_client` and `aws_resource` use these as a per-process
+# cache. Creating a client loads the service model and sets up endpoint
+# resolution, so it is done once per profile and service. Nothing is shared
+# across a fork: the cache is dropped when the process id changes. Resources
+# are not thread safe, so they are also cached per thread.
+_AWS_CACHE = {}
+_AWS_CACHE_PID = None
+_AWS_CACHE_GENERATION = 0
+_AWS_CACHE_LOCK = threading.RLock()
+_AWS_RESOURCES = threading.local()
+_AWS_CACHE_STATS = {
+    kind: {'created': 0, 'reused': 0}
+    for kind in ('sessions', 'clients', 'resources')
+}
+
+# `lifecycle_executor` uses these as a per-process cache, see `_AWS_CACHE`.
+_EXECUTOR = None
+_EXECUTOR_PID = None
+_EXECUTOR_LOCK = threading.Lock()
+
+JobResult = namedtuple('JobResult', 'item result error')
+"""Outcome of a lifecycle job: its item, and its result or error."""
 
 
 def get_image_id_by_name(aws_profile, image_type, image_name):
@@ -50,18 +89,313 @@ aws_image_config_needed = pytest.mark.skipif(
     aws_image_config_missing(), reason='AWS configuration missing.')
 
 
+def lifecycle_executor():
+    """Return the thread pool shared by AWS lifecycle jobs of this process.
+
+    Launching, stopping, terminating and deleting AWS resources mostly means
+    waiting on AWS, so threads are enough. They share the cached boto3
+    clients, see :func:`aws_client`. At most ``aws_max_concurrency`` jobs run
+    at once.
+
+    Jobs must not wait on other lifecycle jobs, or they could wait forever
+    for a free thread.
+    """
+    global _EXECUTOR, _EXECUTOR_PID  # pylint:disable=global-statement
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None or _EXECUTOR_PID != os.getpid():
+            max_workers = config.get_config(need_base_url=False).get(
+                'aws_max_concurrency', 16)
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='aws-lifecycle',
+            )
+            _EXECUTOR_PID = os.getpid()
+        return _EXECUTOR
+
+
+def submit_lifecycle_jobs(job, items):
+    """Run ``job(item)`` for every item on the lifecycle executor.
+
+    :returns: list of futures, in the same order as ``items``.
+    """
+    executor = lifecycle_executor()
+    return [executor.submit(job, item) for item in items]
+
+
+def run_lifecycle_jobs(job, items, raise_errors=True):
+    """Run ``job(item)`` for every item and wait for all of them.
+
+    Unlike ``multiprocessing.pool.Pool.map``, a failing job does not stop the
+    others: every error is collected with its item.
+
+    :param job: Callable taking a single item, like :func:`terminate_instance`.
+    :param items: The items to run the job for.
+    :param raise_errors: Raise once all jobs are done if any failed.
+    :returns: list of :data:`JobResult`, in the same order as ``items``.
+    :raises: LifecycleError if a job failed and ``raise_errors`` is set.
+    """
+    items = list(items)
+    results = []
+    for item, future in zip(items, submit_lifecycle_jobs(job, items)):
+        try:
+            results.append(JobResult(item, future.result(), None))
+        except Exception as error:  # pylint:disable=broad-except
+            results.append(JobResult(item, None, error))
+    failures = [result for result in results if result.error is not None]
+    if failures and raise_errors:
+        raise LifecycleError(failures, results)
+    return results
+
+
+def _group_by_profile(profiles_and_ids):
+    """Group ``(aws_profile, instance_id)`` tuples by profile.
+
+    :returns: dict mapping each profile to its list of instance ids.
+    """
+    groups = {}
+    for aws_profile, instance_id in profiles_and_ids:
+        groups.setdefault(aws_profile, []).append(instance_id)
+    return groups
+
+
+def _chunks(items, size):
+    """Split any iterable in lists of at most ``size`` items, lazily."""
+    items = iter(items)
+    chunk = list(itertools.islice(items, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(items, size))
+
+
+def describe_instance_states(aws_profile, instance_ids):
+    """Get the states of many instances of a profile with few calls.
+
+    The instances are described with an ``instance-id`` filter rather than
+    ``InstanceIds``, so that ids AWS does not know (yet or anymore) are left
+    out instead of failing the whole call.
+
+    :param aws_profile: (string) Name of profile as defined in config file.
+    :param instance_ids: (list of string) The instance ids to describe.
+    :returns: dict mapping the instance ids found to their state name.
+    """
+    states = {}
+    if not instance_ids:
+        return states
+    paginator = aws_client(aws_profile, 'ec2').get_paginator(
+        'describe_instances')
+    for chunk in _chunks(list(instance_ids), EC2_MAX_FILTER_VALUES):
+        for page in paginator.paginate(
+                Filters=[{'Name': 'instance-id', 'Values': chunk}]):
+            for reservation in page.get('Reservations', []):
+                for instance in reservation.get('Instances', []):
+                    states[instance['InstanceId']] = instance['State']['Name']
+    return states
+
+
+def _instance_state_reached(state, on_state, aws_profile, instance_id,
+                            states):
+    """Check an instance in a listing of :func:`describe_instance_states`.
+
+    :returns: The state of the instance if it is ``state`` or if it can not
+        become ``state`` anymore, None otherwise.
+    """
+    current = states.get(instance_id)
+    if current is None and state == 'terminated':
+        # Terminated instances eventually stop being listed.
+        current = state
+    if current == state:
+        if on_state is not None:
+            on_state(aws_profile, instance_id)
+        return current
+    if current in EC2_UNREACHABLE_STATES.get(state, ()):
+        return current
+    return None
+
+
+def wait_for_instance_states(profiles_and_ids, state, timeout=600,
+                             on_state=None):
+    """Wait for many instances, of any profiles, to reach a state.
+
+    Each profile is described once per poll, for all of its instances still
+    waited on at once, see :func:`describe_instance_states`.
+
+    :param profiles_and_ids: list of tuples of (aws_profile_name,
+        instance_id).
+    :param state: (string) The state to wait for, like ``'running'``.
+    :param timeout: (int) Seconds to wait before giving up.
+    :param on_state: Optional callable called with the profile name and the
+        instance id of each instance as soon as it reaches ``state``.
+    :raises: InstanceStateError if some instances did not reach ``state``
+        before the timeout or can not reach it anymore.
+    """
+    profiles_and_ids = list(dict.fromkeys(profiles_and_ids))
+    waiter = MultiWaiter(timeout, min_interval=5, max_interval=15)
+
+    def fetch(aws_profile):
+        instance_ids = [
+            condition.name[1] for condition in waiter.pending
+            if condition.source == aws_profile
+        ]
+        return describe_instance_states(aws_profile, instance_ids)
+
+    for aws_profile in _group_by_profile(profiles_and_ids):
+        waiter.add_source(aws_profile, functools.partial(fetch, aws_profile))
+    conditions = [
+        waiter.add(
+            aws_profile,
+            functools.partial(
+                _instance_state_reached,
+                state,
+                on_state,
+                aws_profile,
+                instance_id,
+            ),
+            name=(aws_profile, instance_id),
+        )
+        for aws_profile, instance_id in profiles_and_ids
+    ]
+    waiter.wait()
+    failures = {}
+    for condition in conditions:
+        if condition.result != state:
+            aws_profile, instance_id = condition.name
+            failures[condition.name] = condition.result or waiter.listings.get(
+                aws_profile, {}).get(instance_id)
+    if failures:
+        raise InstanceStateError(state, failures)
+
+
+def wait_until_all_running(profiles_and_ids, **kwargs):
+    """Wait until many instances are running.
+
+    See :func:`wait_for_instance_states` for the arguments.
+    """
+    wait_for_instance_states(profiles_and_ids, 'running', **kwargs)
+
+
+def wait_until_all_stopped(profiles_and_ids, **kwargs):
+    """Wait until many instances are stopped.
+
+    See :func:`wait_for_instance_states` for the arguments.
+    """
+    wait_for_instance_states(profiles_and_ids, 'stopped', **kwargs)
+
+
+def wait_until_all_terminated(profiles_and_ids, **kwargs):
+    """Wait until many instances are terminated.
+
+    See :func:`wait_for_instance_states` for the arguments.
+    """
+    wait_for_instance_states(profiles_and_ids, 'terminated', **kwargs)
+
+
+def _is_invalid_instance_id(error):
+    """Tell if an EC2 call failed because it got an unknown instance id."""
+    return error.response.get('Error', {}).get(
+        'Code') in EC2_INVALID_INSTANCE_ID_ERRORS
+
+
+def _call_for_instances(aws_profile, method, instance_ids):
+    """Call an EC2 method for many instances, in as few calls as possible.
+
+    EC2 fails a whole call if one of its instance ids is unknown, for
+    example when an instance was terminated long ago. When a chunk fails so,
+    the ids EC2 still knows are found with :func:`describe_instance_states`
+    and the call is made again for those only. If that fails too, as an
+    instance disappeared in between, the call is made for each id.
+
+    :param aws_profile: (string) Name of profile as defined in config file.
+    :param method: (string) Name of the EC2 client method, like
+        ``'terminate_instances'``.
+    :param instance_ids: (list of string) The instance ids to call it for.
+    :returns: list of the instance ids which EC2 did not know.
+    """
+    call = getattr(aws_client(aws_profile, 'ec2'), method)
+    unknown = []
+    for chunk in _chunks(instance_ids, EC2_MAX_INSTANCE_IDS):
+        try:
+            call(InstanceIds=chunk)
+            continue
+        except botocore.exceptions.ClientError as error:
+            if not _is_invalid_instance_id(error):
+                raise
+        states = describe_instance_states(aws_profile, chunk)
+        known = [instance_id for instance_id in chunk if instance_id in states]
+        unknown.extend(
+            instance_id for instance_id in chunk if instance_id not in states)
+        if not known:
+            continue
+        try:
+            call(InstanceIds=known)
+            continue
+        except botocore.exceptions.ClientError as error:
+            if not _is_invalid_instance_id(error):
+                raise
+        for instance_id in known:
+            try:
+                call(InstanceIds=[instance_id])
+            except botocore.exceptions.ClientError as error:
+                if not _is_invalid_instance_id(error):
+                    raise
+                unknown.append(instance_id)
+    if unknown:
+        logging.getLogger(__name__).warning(
+            'Skipped %s of %d unknown %s instances: %s', method,
+            len(unknown), aws_profile, ', '.join(unknown))
+    return unknown
+
+
+def stop_instances(profiles_and_ids, wait=True):
+    """Stop many instances with one call per profile.
+
+    Instances EC2 does not know are skipped, and not waited for, see
+    :func:`_call_for_instances`.
+
+    :param profiles_and_ids: list of tuples of (aws_profile_name,
+        instance_id).
+    :param wait: Wait until all instances are stopped.
+    """
+    profiles_and_ids = list(profiles_and_ids)
+    unknown = set()
+    for aws_profile, instance_ids in _group_by_profile(
+            profiles_and_ids).items():
+        unknown.update(
+            (aws_profile, instance_id) for instance_id in _call_for_instances(
+                aws_profile, 'stop_instances', instance_ids))
+    if wait:
+        wait_until_all_stopped([
+            profile_and_id for profile_and_id in profiles_and_ids
+            if profile_and_id not in unknown
+        ])
+
+
+def terminate_instances(profiles_and_ids, wait=True):
+    """Terminate many instances with one call per profile.
+
+    Instances EC2 does not know are skipped, see :func:`_call_for_instances`.
+
+    :param profiles_and_ids: list of tuples of (aws_profile_name,
+        instance_id).
+    :param wait: Wait until all instances are terminated.
+    """
+    profiles_and_ids = list(profiles_and_ids)
+    for aws_profile, instance_ids in _group_by_profile(
+            profiles_and_ids).items():
+        _call_for_instances(aws_profile, 'terminate_instances', instance_ids)
+    if wait:
+        wait_until_all_terminated(profiles_and_ids)
+
+
 def wait_until_running(profile_and_id):
     """Wait until an instance is running.
 
     :params: tuple of (aws_profile_name, instance_id)
 
     Note: input is taken in as a tuple to facilitate calling this with
-        ``multiprocessing.pool.Pool.map``.
+        :func:`run_lifecycle_jobs`. Prefer :func:`wait_until_all_running` to
+        wait on many instances.
     """
-    (aws_profile, ec2_instance_id) = profile_and_id
-    session = aws_session(aws_profile)
-    instance = session.resource('ec2').Instance(ec2_instance_id)
-    instance.wait_until_running()
+    wait_until_all_running([profile_and_id])
 
 
 def terminate_instance(profile_and_id):
@@ -70,13 +404,10 @@ def terminate_instance(profile_and_id):
     :params: tuple of (aws_profile_name, instance_id)
 
     Note: input is taken in as a tuple to facilitate calling this with
-        ``multiprocessing.pool.Pool.map``.
+        :func:`run_lifecycle_jobs`. Prefer :func:`terminate_instances` to
+        terminate many instances.
     """
-    (aws_profile, ec2_instance_id) = profile_and_id
-    session = aws_session(aws_profile)
-    instance = session.resource('ec2').Instance(ec2_instance_id)
-    instance.terminate()
-    instance.wait_until_terminated()
+    terminate_instances([profile_and_id])
 
 
 def stop_instance(profile_and_id):
@@ -85,13 +416,10 @@ def stop_instance(profile_and_id):
     :params: tuple of (aws_profile_name, instance_id)
 
     Note: input is taken in as a tuple to facilitate calling this with
-        ``multiprocessing.pool.Pool.map``.
+        :func:`run_lifecycle_jobs`. Prefer :func:`stop_instances` to stop
+        many instances.
     """
-    (aws_profile, ec2_instance_id) = profile_and_id
-    session = aws_session(aws_profile)
-    instance = session.resource('ec2').Instance(ec2_instance_id)
-    instance.stop()
-    instance.wait_until_stopped()
+    stop_instances([profile_and_id])
 
 
 def delete_s3_bucket(profile_and_bucket_name):
@@ -100,12 +428,11 @@ def delete_s3_bucket(profile_and_bucket_name):
     :params: tuple of (aws_profile_name, bucket_name)
 
     Note: input is taken in as a tuple to facilitate calling this with
-        ``multiprocessing.pool.Pool.map``.
+        :func:`run_lifecycle_jobs`.
     """
     (aws_profile, bucket_name) = profile_and_bucket_name
-    session = aws_session(aws_profile)
-    s3client = session.client('s3')
-    s3resource = session.resource('s3')
+    s3client = aws_client(aws_profile, 's3')
+    s3resource = aws_resource(aws_profile, 's3')
     bucket_resource = s3resource.Bucket(bucket_name)
     bucket_resource.objects.all().delete()
     s3client.delete_bucket(Bucket=bucket_name)
@@ -117,11 +444,10 @@ def delete_cloudtrail(profile_and_cloudtrail_name):
     :params: tuple of (aws_profile_name, cloudtrail_name)
 
     Note: input is taken in as a tuple to facilitate calling this with
-        ``multiprocessing.pool.Pool.map``.
+        :func:`run_lifecycle_jobs`.
     """
     (aws_profile, cloudtrail_name) = profile_and_cloudtrail_name
-    session = aws_session(aws_profile)
-    client = session.client('cloudtrail')
+    client = aws_client(aws_profile, 'cloudtrail')
     trail_names = [trail['Name']
                    for trail in client.describe_trails()['trailList']]
     if cloudtrail_name in trail_names:
@@ -135,7 +461,7 @@ def delete_bucket_and_cloudtrail(profile_cloudtrail_bucket):
     :params: tuple of (aws_profile_name, cloudtrail_name, bucket_name)
 
     Note: input is taken in as a tuple to facilitate calling this with
-        ``multiprocessing.pool.Pool.map``.
+        :func:`run_lifecycle_jobs`.
     """
     (aws_profile, cloudtrail_name, bucket_name) = profile_cloudtrail_bucket
     if cloudtrail_name:
@@ -219,7 +545,7 @@ def run_instances_by_id(
 
     :returns: (list of string) List of the instance ids as strings.
     """
-    client = aws_session(aws_profile).client('ec2')
+    client = aws_client(aws_profile, 'ec2')
     response = client.run_instances(
         MaxCount=count,
         MinCount=count,
@@ -228,10 +554,8 @@ def run_instances_by_id(
     instance_ids = []
     for instance in response.get('Instances', []):
         instance_ids.append(instance['InstanceId'])
-    with Pool() as p:
-        p.map(
-            wait_until_running, zip(
-                [aws_profile] * len(instance_ids), instance_ids))
+    wait_until_all_running(
+        [(aws_profile, instance_id) for instance_id in instance_ids])
     return instance_ids
 
 
@@ -257,6 +581,33 @@ def run_instances_by_name(
     return instance_ids
 
 
+def iter_instances(aws_profile, filters=None, states=None):
+    """Stream the instances of an account, page by page.
+
+    :param aws_profile: (string) Name of profile as defined in config file
+    :param filters: Optional list of ``describe_instances`` filters, applied
+        by AWS.
+    :param states: Optional list of instance state names to keep, like
+        ``['running']``, also applied by AWS.
+
+    :returns: Generator of instance dictionaries.
+    """
+    filters = list(filters or [])
+    if states:
+        filters.append({'Name': 'instance-state-name', 'Values': states})
+    paginator = aws_client(aws_profile, 'ec2').get_paginator(
+        'describe_instances')
+    for page in paginator.paginate(Filters=filters):
+        for reservation in page.get('Reservations', []):
+            yield from reservation.get('Instances', [])
+
+
+def iter_instance_ids(aws_profile, filters=None, states=None):
+    """Stream the instance ids of an account, see :func:`iter_instances`."""
+    for instance in iter_instances(aws_profile, filters, states):
+        yield instance['InstanceId']
+
+
 def terminate_all_instances(aws_profile):
     """Terminate all instances for a given aws account.
 
@@ -266,19 +617,19 @@ def terminate_all_instances(aws_profile):
     in an account. Terminated instances eventually disappear from the list of
     instances visible in the EC2 console or via describe_instances(), but this
     is cannot be controlled by the user (happens on the AWS backend).
+
+    Instances are terminated in chunks while they are listed, then all of
+    them are waited on at once.
     """
-    client = aws_session(aws_profile).client('ec2')
-    instances_to_terminate = []
-    for reservation in client.describe_instances().get('Reservations', []):
-        for instance in reservation.get('Instances'):
-            if instance['State']['Code'] != EC2_TERMINATED_CODE:
-                instances_to_terminate.append(instance['InstanceId'])
-    num_instances = len(instances_to_terminate)
-    if instances_to_terminate:
-        with Pool() as p:
-            p.map(
-                terminate_instance, zip(
-                    [aws_profile] * num_instances, instances_to_terminate))
+    instance_ids = iter_instance_ids(
+        aws_profile, states=EC2_NOT_TERMINATED_STATES)
+    terminated = []
+    for chunk in _chunks(instance_ids, EC2_MAX_INSTANCE_IDS):
+        chunk = [(aws_profile, instance_id) for instance_id in chunk]
+        terminate_instances(chunk, wait=False)
+        terminated.extend(chunk)
+    if terminated:
+        wait_until_all_terminated(terminated)
 
 
 def get_instances_from_image(aws_profile, image_name):
@@ -289,40 +640,38 @@ def get_instances_from_image(aws_profile, image_name):
 
     :returns: List
     """
-    client = aws_session(aws_profile).client('ec2')
     cfg = config.get_aws_image_config()
     image_id = cfg['profiles'][aws_profile]['images'][image_name]['image_id']
-    instances = []
-    for reservation in client.describe_instances(
-            Filters=[{
-                'Name': 'image-id',
-                'Values': [image_id]
-            }]).get('Reservations', []):
-        instances.extend([inst for inst in reservation.get('Instances', [])])
-    return instances
+    return list(iter_instances(
+        aws_profile, filters=[{'Name': 'image-id', 'Values': [image_id]}]))
 
 
 def get_current_instances(aws_profile):
     """Return list of instance ids of currently existing instances."""
-    client = aws_session(aws_profile).client('ec2')
-    instance_ids = []
-    for reservation in client.describe_instances().get('Reservations', []):
-        instance_ids.extend([inst['InstanceId']
-                             for inst in reservation.get('Instances', [])])
-    return instance_ids
+    return list(iter_instance_ids(aws_profile))
+
+
+def iter_available_volumes(aws_profile):
+    """Stream the available (dangling) volumes of an account."""
+    paginator = aws_client(aws_profile, 'ec2').get_paginator(
+        'describe_volumes')
+    for page in paginator.paginate(
+            Filters=[{'Name': 'status', 'Values': ['available']}]):
+        yield from page.get('Volumes', [])
 
 
 def delete_available_volumes(aws_profile):
-    """Delete any available (dangling) volumes."""
-    ec2_client = aws_session(aws_profile).client('ec2')
-    for volume in ec2_client.describe_volumes(
-            Filters=[
-                {
-                    'Name': 'status',
-                    'Values': ['available']
-                }
-            ]).get('Volumes'):
-        ec2_client.delete_volume(VolumeId=volume['VolumeId'])
+    """Delete any available (dangling) volumes.
+
+    Deletions are not streamed page by page: the ids of all the volumes are
+    listed, and kept in memory, before the first is deleted, as deleting
+    while paginating could shift the pages and skip some volumes.
+    """
+    ec2_client = aws_client(aws_profile, 'ec2')
+    volume_ids = [
+        volume['VolumeId'] for volume in iter_available_volumes(aws_profile)]
+    for volume_id in volume_ids:
+        ec2_client.delete_volume(VolumeId=volume_id)
 
 
 def create_bucket_for_cloudtrail(aws_profile):
@@ -330,8 +679,7 @@ def create_bucket_for_cloudtrail(aws_profile):
 
     :returns: (string) name of the s3 bucket to point the cloudtrail to.
     """
-    session = aws_session(aws_profile)
-    s3client = session.client('s3')
+    s3client = aws_client(aws_profile, 's3')
     bucket_name = uuid4()
     s3client.create_bucket(Bucket=bucket_name, ACL='public-read-write')
     unique_name1 = uuid4()
@@ -365,12 +713,46 @@ def create_bucket_for_cloudtrail(aws_profile):
         ]
     }
 
-    s3_resource = session.resource('s3')
+    s3_resource = aws_resource(aws_profile, 's3')
     bucket_policy = s3_resource.BucketPolicy(bucket_name)
     bucket_policy.put(Policy=json.dumps(new_policy))
     return bucket_name
 
 
+def iter_cloudigrade_ami_copies(aws_profile):
+    """Stream the copies of AMIs that cloudigrade made in an account."""
+    paginator = aws_client(aws_profile, 'ec2').get_paginator(
+        'describe_images')
+    for page in paginator.paginate(
+            Owners=['self'],
+            Filters=[{
+                'Name': 'name',
+                'Values': ['*cloudigrade reference copy*'],
+            }]):
+        yield from page.get('Images', [])
+
+
+def ami_snapshot_ids(image):
+    """List the ids of the EBS snapshots backing an image."""
+    return [
+        device['Ebs']['SnapshotId']
+        for device in image.get('BlockDeviceMappings', [])
+        if device.get('Ebs', {}).get('SnapshotId')
+    ]
+
+
+def delete_ami_copy(aws_profile, image):
+    """Deregister an image, then delete its snapshots.
+
+    :param aws_profile: (string) Name of profile as defined in config file
+    :param image: (dict) The image as described by ``describe_images``.
+    """
+    client = aws_client(aws_profile, 'ec2')
+    client.deregister_image(ImageId=image['ImageId'])
+    for snapshot_id in ami_snapshot_ids(image):
+        client.delete_snapshot(SnapshotId=snapshot_id)
+
+
 def clean_up_cloudigrade_ami_copies(aws_profile):
     """Clean up any copies of AMIs that cloudigrade made.
 
@@ -378,20 +760,14 @@ def clean_up_cloudigrade_ami_copies(aws_profile):
     by the account being metered. These add up and make it unclear
     what the current test session is doing, so it is good to clean
     them up on a regular basis.
+
+    Deletions are not streamed page by page: all the copies are listed, and
+    kept in memory, before the first is deleted, as deleting while
+    paginating could skip some. Then each copy is deregistered, followed by
+    its snapshots.
     """
-    client = aws_session(aws_profile).client('ec2')
-    cloudigrade_image_copies = []
-    cloudigrade_snapshots = []
-    for image in client.describe_images(Owners=['self']).get('Images', []):
-        if 'cloudigrade reference copy' in image['Name']:
-            cloudigrade_image_copies.append(image['ImageId'])
-            for device in image.get('BlockDeviceMappings', []):
-                if device.get('Ebs', {}).get('SnapshotId'):
-                    cloudigrade_snapshots.append(device['Ebs']['SnapshotId'])
-    for image_id in cloudigrade_image_copies:
-        client.deregister_image(ImageId=image_id)
-    for snap_id in cloudigrade_snapshots:
-        client.delete_snapshot(SnapshotId=snap_id)
+    for image in list(iter_cloudigrade_ami_copies(aws_profile)):
+        delete_ami_copy(aws_profile, image)
 
 
 def clean_cloudigrade_queues():
@@ -403,11 +779,10 @@ def clean_cloudigrade_queues():
         2) AWSCredentialsNotFoundError if the credentials expected for the
         cloudigrade are not found in the environment.
     """
-    session = aws_session('CLOUDIGRADE')
-    client = session.client('sqs')
+    client = aws_client('CLOUDIGRADE', 'sqs')
     deployment_prefix = os.environ.get('AWS_QUEUE_PREFIX', False)
     if not deployment_prefix:
-        iam = session.resource('iam')
+        iam = aws_resource('CLOUDIGRADE', 'iam')
         current_user_arn = iam.CurrentUser().arn
         raise MissingConfigurationError(
             'No deployment prefix was specified with the environment'
@@ -422,9 +797,142 @@ def clean_cloudigrade_queues():
             logging.getLogger().error(str(e))
 
 
+def _credentials(aws_profile):
+    """Find the credentials of an aws profile in the environment.
+
+    :returns: tuple of (access_key_id, secret_access_key)
+    :raises: AWSCredentialsNotFoundError if they are not set.
+    """
+    if aws_profile == 'CLOUDIGRADE':
+        access_key_id = os.environ.get('AWS_ACCESS_KEY_ID')
+        access_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    else:
+        access_key_id = os.environ.get(f'AWS_ACCESS_KEY_ID_{aws_profile}')
+        access_key = os.environ.get(f'AWS_SECRET_ACCESS_KEY_{aws_profile}')
+    if access_key_id and access_key:
+        return access_key_id, access_key
+    elif local_backend() is not None:
+        return access_key_id, access_key
+    else:
+        raise AWSCredentialsNotFoundError(
+            f'Could not find credentials in the environment for {aws_profile}'
+        )
+
+
+def _credential_identity(aws_profile):
+    """Identify the credentials of an aws profile, for use as a cache key.
+
+    The secret access key is hashed, so it is not kept in the cache keys
+    where a debugger or a crash report could show it.
+
+    :returns: tuple of (profile, access_key_id, hash of the secret key)
+    :raises: AWSCredentialsNotFoundError if the credentials are not set.
+    """
+    access_key_id, access_key = _credentials(aws_profile)
+    secret_hash = None
+    if access_key is not None:
+        secret_hash = hashlib.sha256(access_key.encode('utf-8')).hexdigest()
+    return aws_profile, access_key_id, secret_hash
+
+
+def _cached(kind, key, create):
+    """Return a cached boto3 object, creating it if needed.
+
+    :param kind: One of ``'sessions'``, ``'clients'`` or ``'resources'``.
+        Resources are cached per thread, the rest per process.
+    :param key: The cache key.
+    :param create: Callable creating the object on a cache miss.
+    """
+    global _AWS_CACHE_PID  # pylint:disable=global-statement
+    with _AWS_CACHE_LOCK:
+        if _AWS_CACHE_PID != os.getpid():
+            clear_aws_cache()
+            _AWS_CACHE_PID = os.getpid()
+        cache = _AWS_CACHE
+        if kind == 'resources':
+            if getattr(_AWS_RESOURCES, 'generation', None) != \
+                    _AWS_CACHE_GENERATION:
+                _AWS_RESOURCES.generation = _AWS_CACHE_GENERATION
+                _AWS_RESOURCES.cache = {}
+            cache = _AWS_RESOURCES.cache
+        if key in cache:
+            _AWS_CACHE_STATS[kind]['reused'] += 1
+        else:
+            cache[key] = create()
+            _AWS_CACHE_STATS[kind]['created'] += 1
+        return cache[key]
+
+
+def clear_aws_cache():
+    """Forget all cached boto3 sessions, clients and resources.
+
+    They are created again on next use.
+    """
+    global _AWS_CACHE_GENERATION  # pylint:disable=global-statement
+    with _AWS_CACHE_LOCK:
+        _AWS_CACHE.clear()
+        _AWS_CACHE_GENERATION += 1
+        for counters in _AWS_CACHE_STATS.values():
+            counters.update(created=0, reused=0)
+
+
+def aws_cache_stats():
+    """Report how many boto3 objects were created and reused.
+
+    :returns: dict with a ``created`` and ``reused`` counter for each of
+        ``sessions``, ``clients`` and ``resources``.
+    """
+    with _AWS_CACHE_LOCK:
+        return {
+            kind: dict(counters)
+            for kind, counters in _AWS_CACHE_STATS.items()
+        }
+
+
+def aws_client(aws_profile, service_name):
+    """Return the cached boto3 client of a service for an aws profile.
+
+    Clients are thread safe and shared by all threads of the process.
+
+    :param aws_profile: (string) Name of profile as defined in config file,
+        see :func:`aws_session`.
+    :param service_name: (string) Name of the service, like ``'ec2'``.
+    """
+    aws_profile = aws_profile.upper()
+    key = (*_credential_identity(aws_profile), service_name)
+    return _cached(
+        'clients',
+        key,
+        lambda: aws_session(aws_profile).client(service_name),
+    )
+
+
+def aws_resource(aws_profile, service_name):
+    """Return the cached boto3 resource of a service for an aws profile.
+
+    Resources are not thread safe, so each thread gets its own.
+
+    :param aws_profile: (string) Name of profile as defined in config file,
+        see :func:`aws_session`.
+    :param service_name: (string) Name of the service, like ``'s3'``.
+    """
+    aws_profile = aws_profile.upper()
+    key = (*_credential_identity(aws_profile), service_name)
+    return _cached(
+        'resources',
+        key,
+        lambda: aws_session(aws_profile).resource(service_name),
+    )
+
+
 def aws_session(aws_profile):
     """Retreive a boto3 Session for the given aws profile name.
 
+    The session is cached per process for each profile and set of
+    credentials, so calling this repeatedly is cheap. Prefer
+    :func:`aws_client` and :func:`aws_resource`, which cache what is created
+    from the session too.
+
     Profiles are defined in ~/.aws/config with the following syntax:
         [profile name_of_profile]
         aws_access_key_id=123456
@@ -436,20 +944,22 @@ def aws_session(aws_profile):
     be defined in the ~/.aws/config file.
     """
     aws_profile = aws_profile.upper()
-    if aws_profile == 'CLOUDIGRADE':
-        access_key_id = os.environ.get('AWS_ACCESS_KEY_ID')
-        access_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
-    else:
-        access_key_id = os.environ.get(f'AWS_ACCESS_KEY_ID_{aws_profile}')
-        access_key = os.environ.get(f'AWS_SECRET_ACCESS_KEY_{aws_profile}')
-    if access_key_id and access_key:
-        return boto3.Session(
-            aws_access_key_id=access_key_id,
-            aws_secret_access_key=access_key)
-    else:
-        raise AWSCredentialsNotFoundError(
-            f'Could not find credentials in the environment for {aws_profile}'
+    access_key_id, access_key = _credentials(aws_profile)
+    key = _credential_identity(aws_profile)
+    backend = local_backend()
+    if backend is not None:
+        return _cached(
+            'sessions',
+            (*key, 'local'),
+            lambda: backend.session(access_key_id, access_key),
         )
+    return _cached(
+        'sessions',
+        key,
+        lambda: boto3.Session(
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=access_key),
+    )
 
 
 def purge_queue_messages():
@@ -457,7 +967,7 @@ def purge_queue_messages():
     queue_prefix = os.getenv('AWS_QUEUE_PREFIX')
     queue_prefix = f'review-{queue_prefix[:-1]}'
     queue_url = ''
-    client = boto3.client('sqs')
+    client = default_client('sqs')
     queue_urls = client.list_queues(
         QueueNamePrefix=queue_prefix).get('QueueUrls', [])
 
@@ -484,7 +994,7 @@ def describe_auto_scaling_group(name):
         dict: Details describing the Auto Scaling group
 
     """
-    autoscaling = boto3.client('autoscaling')
+    autoscaling = default_client('autoscaling')
     groups = autoscaling.describe_auto_scaling_groups(
         AutoScalingGroupNames=[name],
         MaxRecords=1
@@ -506,7 +1016,7 @@ def scale_down_houndigrade():
 
     # If groups are not scaled down, scale them down
     if not scaled_down:
-        autoscaling = boto3.client('autoscaling')
+        autoscaling = default_client('autoscaling')
         autoscaling.update_auto_scaling_group(
             AutoScalingGroupName=asg_name,
             MinSize=0,
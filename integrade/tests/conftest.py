@@ -1,18 +1,20 @@
 """Pytest customizations and fixtures for cloudigrade tests."""
 import atexit
+import glob
+import json
 import os
 import subprocess
-from multiprocessing import Pool
-from time import time
 from urllib.parse import urljoin
 
 import pytest
 
-from integrade import api
+from integrade import api, metrics, tracing
 from integrade.tests import urls, utils
 from integrade.tests.aws_utils import (
+    aws_cache_stats,
     delete_bucket_and_cloudtrail,
-    terminate_instance,
+    run_lifecycle_jobs,
+    terminate_instances,
 )
 
 
@@ -62,43 +64,73 @@ def capture_logs():
                        )
 
 
-T = 0
-TIMINGS = {}
-
-
-def timemetric(name):
-    """Create a timer context to record blocks of time."""
-    return TimeMetricContext(name)
+def timemetric(name, **labels):
+    """Create a timer context to record blocks of time.
 
+    See :func:`integrade.metrics.span`.
+    """
+    return metrics.span(name, **labels)
 
-class TimeMetricContext:
-    """Conext manager meausure the time blocks of code take.
 
-    Each timer is given a name and all of the timers of the same name are
-    added up and the total time can be reported at the end of the test via the
-    report_timers() atexit callback.
-    """
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """Attribute the time spent by a test and its fixtures to the test."""
+    with metrics.attribute(item.nodeid):
+        yield
 
-    def __init__(self, name):
-        """Remember what named timer we're adding to."""
-        self.name = name
 
-    def __enter__(self):
-        """Mark the time at the start of the timer entry."""
-        self.start = time()
+def pytest_sessionfinish(session):
+    """Save the timings to $INTEGRADE_METRICS_DIR, if set.
 
-    def __exit__(self, *args):
-        """Add the elapsed time to the appropriate timer."""
-        self.end = time()
-        TIMINGS.setdefault(self.name, 0)
-        TIMINGS[self.name] += self.end - self.start
+    Each process dumps its samples and the requests it traced there. The
+    main process, which is the only one without pytest-xdist, then exports
+    the samples of all of them to metrics.json and metrics.prom. Use a new
+    directory for each run, or the samples of previous runs are exported
+    too.
+    """
+    directory = os.environ.get('INTEGRADE_METRICS_DIR')
+    if not directory:
+        return
+    metrics.dump(directory)
+    tracing.buffer().dump(
+        os.path.join(directory, f'requests-{os.getpid()}.jsonl'))
+    if hasattr(session.config, 'workerinput'):
+        return
+    merged = metrics.load(directory)
+    with open(os.path.join(directory, 'metrics.json'), 'w') as f:
+        json.dump(merged.to_json(), f, indent=2)
+    with open(os.path.join(directory, 'metrics.prom'), 'w') as f:
+        f.write(merged.to_prometheus())
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report the endpoints whose requests were the slowest.
+
+    With $INTEGRADE_METRICS_DIR set, the requests of all processes saved
+    there by :func:`pytest_sessionfinish` are reported.
+    """
+    records = tracing.buffer().records()
+    directory = os.environ.get('INTEGRADE_METRICS_DIR')
+    if directory:
+        records = [
+            record
+            for path in glob.glob(os.path.join(directory, 'requests-*.jsonl'))
+            for record in tracing.load(path)
+        ]
+    if records:
+        terminalreporter.write_sep('=', 'slowest API endpoints')
+        terminalreporter.write_line(tracing.report(records))
 
 
 @atexit.register
 def report_timers():
     """Report results of all timers."""
-    for t in TIMINGS:
-        print(f'Timer "{t}": {TIMINGS[t]:.2f}s')
+    if metrics.registry().series:
+        print(metrics.registry().report(top=30))
+    for kind, counters in aws_cache_stats().items():
+        if counters['created']:
+            print(f'boto3 {kind}: {counters["created"]} created,'
+                  f' {counters["reused"]} reused')
 
 
 # @pytest.fixture()
@@ -140,9 +172,7 @@ def instances_to_terminate():
     yield instances_to_terminate
 
     if instances_to_terminate:
-        with Pool() as p:
-            p.map(
-                terminate_instance, instances_to_terminate)
+        terminate_instances(instances_to_terminate)
 
 
 @pytest.fixture
@@ -196,7 +226,4 @@ def cloudtrails_and_buckets_to_delete():
     yield to_delete
 
     if to_delete:
-        with Pool() as p:
-            # import pdb; pdb.set_trace()
-            p.map(
-                delete_bucket_and_cloudtrail, to_delete)
+        run_lifecycle_jobs(delete_bucket_and_cloudtrail, to_delete)
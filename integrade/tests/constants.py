@@ -7,6 +7,26 @@ AWS_ACCOUNT_TYPE = 'AwsAccount'
 EC2_TERMINATED_CODE = 48
 """Terminated EC2 instances have the state code of 48."""
 
+EC2_NOT_TERMINATED_STATES = [
+    'pending', 'running', 'shutting-down', 'stopping', 'stopped']
+"""Names of all EC2 instance states but terminated."""
+
+EC2_UNREACHABLE_STATES = {
+    'running': ('shutting-down', 'terminated'),
+    'stopped': ('shutting-down', 'terminated'),
+}
+"""States from which an EC2 instance can not reach the state in the key."""
+
+EC2_MAX_FILTER_VALUES = 200
+"""EC2 accepts at most 200 values for a describe filter."""
+
+EC2_MAX_INSTANCE_IDS = 1000
+"""Number of instance ids sent at most in one EC2 stop or terminate call."""
+
+EC2_INVALID_INSTANCE_ID_ERRORS = (
+    'InvalidInstanceID.NotFound', 'InvalidInstanceID.Malformed')
+"""Error codes of EC2 calls given an instance id it does not know."""
+
 RH_NETWORK_URL = 'https://stage.cloud.redhat.com/api'
 
 QA_URL = 'https://qa.cloud.redhat.com/api/cloudigrade/v2/'
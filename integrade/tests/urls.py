@@ -10,6 +10,7 @@ CLOUD_ACCOUNT = '/api/v1/account/'
 REPORT_ACCOUNTS = '/api/v1/report/accounts/'
 REPORT_IMAGES = '/api/v1/report/images/'
 REPORT_INSTANCES = '/api/v1/report/instances/'
+EVENT = '/api/v1/event/'
 IMAGE = '/api/v1/image/'
 INSTANCE = '/api/v1/instance/'
 SYSCONFIG = '/api/v1/sysconfig/'
@@ -4,7 +4,6 @@ import calendar
 import copy
 import logging
 from datetime import datetime, time, timedelta, timezone
-from multiprocessing import Pool
 
 import requests
 
@@ -172,9 +171,8 @@ def delete_cloudtrails(cloudtrails_to_delete=None):
     cloudtrail_name).
     """
     if cloudtrails_to_delete:
-        with Pool() as p:
-            p.map(
-                aws_utils.delete_cloudtrail, cloudtrails_to_delete)
+        aws_utils.run_lifecycle_jobs(
+            aws_utils.delete_cloudtrail, cloudtrails_to_delete)
 
 
 def get_auth(user=None):
@@ -0,0 +1,250 @@
+"""Keep a record of every HTTP request sent to cloudigrade.
+
+Requests sent through :func:`integrade.api.get_session` (so by
+:class:`integrade.api.Client` and :class:`integrade.api.ClientV2`) and by
+:class:`integrade.api.AsyncClient` are each recorded as a
+:class:`RequestRecord`, in a ring buffer keeping the latest ones. The buffer
+is per process and its size is $INTEGRADE_TRACE_BUFFER_SIZE, 10000 by
+default.
+
+Example::
+
+    >>> from integrade import tracing
+    >>> client.get(urls.IMAGE)
+    >>> record = tracing.buffer().records()[-1]
+    >>> record.endpoint, record.status, record.elapsed
+    ('/api/v1/image/', 200, 0.0123)
+    >>> print(tracing.report(tracing.buffer().records()))
+
+"""
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from integrade import config, metrics
+
+DEFAULT_BUFFER_SIZE = 10000
+"""Number of records kept when the size is not configured."""
+
+RequestRecord = namedtuple('RequestRecord', [
+    'started',
+    'method',
+    'endpoint',
+    'status',
+    'bytes',
+    'elapsed',
+    'connect',
+    'tls',
+    'server',
+    'retries',
+    'test',
+    'error',
+])
+RequestRecord.__doc__ = """Timing of an HTTP request.
+
+``started`` is the epoch time the request was sent at and ``endpoint`` the
+path of its URL, with ids replaced by ``<id>``. ``status`` and ``bytes`` of
+the response body are None when no response was received, ``error`` then
+names the exception raised.
+
+Times are in seconds. ``elapsed`` is the whole request, body included.
+``connect`` is the time spent resolving the host and opening the connection,
+and ``tls`` the time spent on the TLS handshake, both None when a kept-alive
+connection was reused. ``server`` is the time from sending the request to
+receiving the response headers. Only ``elapsed`` is known for requests of
+:class:`integrade.api.AsyncClient`.
+
+``retries`` is the number of times the request was retried before, by
+:mod:`integrade.retry` or urllib3, and ``test`` the test it was sent by, see
+:func:`integrade.metrics.attribute`.
+"""
+
+# `buffer` uses these as a per-process singleton, recreated after a fork.
+_BUFFER = None
+_BUFFER_PID = None
+_BUFFER_LOCK = threading.Lock()
+
+# Trace of the request being sent by the current thread.
+_LOCAL = threading.local()
+
+
+class TraceBuffer(object):
+    """The latest requests, older ones are dropped.
+
+    :param size: Number of records kept.
+    """
+
+    def __init__(self, size=DEFAULT_BUFFER_SIZE):
+        """Start without records."""
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def size(self):
+        """Return the number of records kept."""
+        return self._records.maxlen
+
+    def add(self, record):
+        """Add a record, dropping the oldest one if the buffer is full."""
+        with self._lock:
+            if len(self._records) == self._records.maxlen:
+                self.dropped += 1
+            self._records.append(record)
+
+    def records(self):
+        """Return a list of the records, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        """Forget all records."""
+        with self._lock:
+            self._records.clear()
+            self.dropped = 0
+
+    def dump(self, path):
+        """Save the records to a file, as JSON lines."""
+        with open(path, 'w') as f:
+            for record in self.records():
+                f.write(json.dumps(record._asdict()))
+                f.write('\n')
+
+
+def buffer():
+    """Return the buffer of this process."""
+    global _BUFFER, _BUFFER_PID  # pylint:disable=global-statement
+    with _BUFFER_LOCK:
+        if _BUFFER is None or _BUFFER_PID != os.getpid():
+            size = config.get_config(need_base_url=False).get(
+                'trace_buffer_size', DEFAULT_BUFFER_SIZE)
+            _BUFFER = TraceBuffer(size)
+            _BUFFER_PID = os.getpid()
+        return _BUFFER
+
+
+def load(path):
+    """Load the records saved by :meth:`TraceBuffer.dump`."""
+    with open(path) as f:
+        return [
+            RequestRecord(**json.loads(line)) for line in f if line.strip()
+        ]
+
+
+class Trace(object):
+    """Timings of the request being sent, see :func:`trace`."""
+
+    def __init__(self, method, endpoint):
+        """Start the clock."""
+        self.method = method
+        self.endpoint = endpoint
+        self.status = None
+        self.bytes = None
+        self.connect = None
+        self.tls = None
+        self.server = None
+        self.retries = getattr(_LOCAL, 'attempt', 0)
+        self.started = time.time()
+        self._start = time.perf_counter()
+
+    def connected(self, connect, tls=None):
+        """Note the time it took to open a new connection."""
+        self.connect = connect
+        self.tls = tls
+
+    def headers_received(self, response):
+        """Note the status and the time until the response headers."""
+        self.server = (
+            time.perf_counter() - self._start
+            - (self.connect or 0) - (self.tls or 0)
+        )
+        self.status = response.status_code
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None:
+            self.retries += len(retries.history)
+
+    def record(self, error=None):
+        """Build the record of the request."""
+        return RequestRecord(
+            started=self.started,
+            method=self.method,
+            endpoint=self.endpoint,
+            status=self.status,
+            bytes=self.bytes,
+            elapsed=time.perf_counter() - self._start,
+            connect=self.connect,
+            tls=self.tls,
+            server=self.server,
+            retries=self.retries,
+            test=metrics.current_test(),
+            error=None if error is None else type(error).__name__,
+        )
+
+
+@contextmanager
+def trace(method, endpoint):
+    """Record the request sent in the block.
+
+    The :class:`Trace` given is also returned by :func:`current` in the
+    thread, for the connection to report how long it took to open.
+    """
+    current = _LOCAL.trace = Trace(method, endpoint)
+    try:
+        yield current
+    except Exception as error:
+        buffer().add(current.record(error))
+        raise
+    else:
+        buffer().add(current.record())
+    finally:
+        _LOCAL.trace = None
+
+
+@contextmanager
+def attempt(number):
+    """Tell the traces of the block how many retries preceded them."""
+    _LOCAL.attempt = number
+    try:
+        yield
+    finally:
+        _LOCAL.attempt = 0
+
+
+def current():
+    """Return the trace of the request sent by this thread, if any."""
+    return getattr(_LOCAL, 'trace', None)
+
+
+def report(records, top=10):
+    """Format a table of the endpoints whose requests were the slowest.
+
+    :param records: The :class:`RequestRecord` to report on.
+    :param top: Number of endpoints to report.
+    """
+    endpoints = {}
+    for record in records:
+        endpoints.setdefault(
+            (record.method, record.endpoint), []).append(record)
+    rows = sorted(
+        endpoints.items(),
+        key=lambda item: -max(record.elapsed for record in item[1]),
+    )
+    lines = [
+        f'{"endpoint":<50} {"count":>7} {"mean":>9} {"max":>9} {"errors":>6}'
+    ]
+    for (method, endpoint), records in rows[:top]:
+        elapsed = [record.elapsed for record in records]
+        errors = sum(
+            1 for record in records
+            if record.error or (record.status or 0) >= 400
+        )
+        title = f'{method} {endpoint}'
+        lines.append(
+            f'{title:<50} {len(records):>7}'
+            f' {sum(elapsed) / len(elapsed):>8.3f}s {max(elapsed):>8.3f}s'
+            f' {errors:>6}'
+        )
+    return '\n'.join(lines)
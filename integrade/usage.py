@@ -0,0 +1,249 @@
+"""Keep track of the usage cloudigrade is expected to report.
+
+:class:`UsageModel` absorbs power on and off events as they are injected and
+keeps the running time of each instance in day buckets. The expected usage of
+any window of days, for everything, an account, an image of an account or a
+single instance, is then answered from prefix sums in O(log n) instead of
+being summed up again from the whole event history.
+
+Example::
+
+    >>> from integrade.injector import EventInjector
+    >>> from integrade.usage import UsageModel
+    >>> usage = UsageModel()
+    >>> with EventInjector(usage=usage) as injector:
+    ...     injector.add_event(instance_id, aws_profile, 'RunInstances')
+    >>> usage.hours(start, end, account=aws_profile['account_number'])
+
+"""
+from datetime import datetime, time, timedelta, timezone
+
+from dateutil.parser import isoparse
+
+from integrade.injector import power_off_events, power_on_events
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+_DAYS = 1 << 20
+"""Number of day buckets, enough for any ``date.toordinal()``."""
+
+
+def _day(when):
+    """Return the day bucket of a date or datetime."""
+    if isinstance(when, datetime):
+        when = _utc(when).astimezone(timezone.utc).date()
+    return when.toordinal()
+
+
+def _midnight(day):
+    """Return the UTC datetime a day bucket starts at."""
+    return datetime.combine(
+        datetime.fromordinal(day).date(), time(), tzinfo=timezone.utc)
+
+
+def _utc(when):
+    """Parse an ISO formatted time, and make naive datetimes UTC ones."""
+    if isinstance(when, str):
+        when = isoparse(when)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when
+
+
+class RangeSums(object):
+    """Add to ranges of day buckets and sum ranges of them in O(log n).
+
+    Two Fenwick trees, stored sparsely in dicts so that only the nodes on the
+    path of an update use memory.
+    """
+
+    def __init__(self):
+        """Start with every bucket at 0."""
+        self._values = {}
+        self._weighted = {}
+
+    def _update(self, position, value):
+        """Add ``value`` from ``position`` on, positions starting at 1."""
+        weighted = value * (position - 1)
+        while position <= _DAYS:
+            self._values[position] = self._values.get(position, 0) + value
+            self._weighted[position] = (
+                self._weighted.get(position, 0) + weighted)
+            position += position & -position
+
+    def _prefix(self, position):
+        """Sum the buckets up to ``position`` included."""
+        values = weighted = 0
+        index = position
+        while index > 0:
+            values += self._values.get(index, 0)
+            weighted += self._weighted.get(index, 0)
+            index -= index & -index
+        return values * position - weighted
+
+    def add(self, first, last, value):
+        """Add ``value`` to each bucket of ``[first, last)``."""
+        if first >= last:
+            return
+        self._update(first + 1, value)
+        self._update(last + 1, -value)
+
+    def total(self, first, last):
+        """Sum the buckets of ``[first, last)``."""
+        if first >= last:
+            return 0
+        return self._prefix(last) - self._prefix(first)
+
+
+class UsageModel(object):
+    """Expected running time of instances, by account, image and instance.
+
+    Finished runs are spread over the day buckets they cover, for every level
+    of the key: all usage, the account, the account's image and the instance.
+    Runs still going are kept aside and counted up to ``now`` when queried,
+    which costs one step per running instance of the queried key.
+    """
+
+    def __init__(self):
+        """Start without any usage."""
+        self._sums = {}
+        self._running = {}
+        self._images = {}
+        self.events = 0
+        """Number of power on and off events absorbed."""
+
+    @staticmethod
+    def _key(account=None, image=None, instance=None):
+        """Return the key of a level, checking the lower levels are given."""
+        key = (account, image, instance)
+        depth = 0
+        while depth < 3 and key[depth] is not None:
+            depth += 1
+        if any(part is not None for part in key[depth:]):
+            raise ValueError(
+                'An image needs its account and an instance needs its account'
+                ' and image.')
+        return key[:depth]
+
+    def _add_run(self, key, start, end):
+        """Spread a finished run over its day buckets for all key levels."""
+        if end <= start:
+            return
+        first, last = _day(start), _day(end)
+        for depth in range(len(key) + 1):
+            sums = self._sums.setdefault(key[:depth], RangeSums())
+            if first == last:
+                sums.add(first, first + 1, (end - start).total_seconds())
+                continue
+            sums.add(
+                first,
+                first + 1,
+                (_midnight(first + 1) - start).total_seconds(),
+            )
+            sums.add(first + 1, last, SECONDS_PER_DAY)
+            sums.add(last, last + 1, (end - _midnight(last)).total_seconds())
+
+    def power_on(self, account, image, instance, when):
+        """Start a run, unless the instance is already running.
+
+        :param when: datetime or ISO formatted time of the event.
+        """
+        self.events += 1
+        self._images[(account, instance)] = image
+        key = (account, image, instance)
+        if key not in self._running:
+            self._running[key] = _utc(when)
+
+    def power_off(self, account, instance, when, image=None):
+        """End the run of an instance, unless it is not running.
+
+        :param image: The image of the instance, the one it was last powered
+            on with by default.
+        """
+        self.events += 1
+        if image is None:
+            image = self._images.get((account, instance))
+        key = (account, image, instance)
+        start = self._running.pop(key, None)
+        if start is not None:
+            self._add_run(key, start, _utc(when))
+
+    def add_record(self, record, image_id=None):
+        """Absorb a CloudTrail record, as built by the injector.
+
+        :param image_id: The image of the instance, when the record does not
+            tell it.
+        :returns: True if the record powered an instance on or off.
+        """
+        event_type = record['eventName']
+        if event_type not in power_on_events + power_off_events:
+            return False
+        account = record['userIdentity']['accountId']
+        when = record['eventTime']
+        for item in record['responseElements']['instancesSet']['items']:
+            instance = item['instanceId']
+            image = item.get('imageId', image_id)
+            if event_type in power_on_events:
+                if image is None:
+                    image = self._images.get((account, instance))
+                self.power_on(account, image, instance, when)
+            else:
+                self.power_off(account, instance, when, image)
+        return True
+
+    def running(self, account=None, image=None, instance=None):
+        """Return the instances of a key running now and since when.
+
+        :returns: dict mapping ``(account, image, instance)`` to the datetime
+            of its power on.
+        """
+        key = self._key(account, image, instance)
+        return {
+            running_key: since
+            for running_key, since in self._running.items()
+            if running_key[:len(key)] == key
+        }
+
+    def seconds(self, start, end, account=None, image=None, instance=None,
+                now=None):
+        """Return the seconds of usage in the days ``[start, end)``.
+
+        :param start: First date of the window.
+        :param end: Date the window ends at, excluded.
+        :param now: Until when running instances count, now by default.
+        """
+        key = self._key(account, image, instance)
+        first, last = _day(start), _day(end)
+        total = 0
+        sums = self._sums.get(key)
+        if sums is not None:
+            total += sums.total(first, last)
+        if self._running:
+            now = _utc(now or datetime.now(timezone.utc))
+            window_start = _midnight(first)
+            window_end = min(_midnight(last), now)
+            for since in self.running(*key).values():
+                since = max(since, window_start)
+                if since < window_end:
+                    total += (window_end - since).total_seconds()
+        return total
+
+    def hours(self, start, end, account=None, image=None, instance=None,
+              now=None):
+        """Return the hours of usage in the days ``[start, end)``.
+
+        See :meth:`seconds`, and :func:`integrade.utils.round_hours` to round
+        them like the UI.
+        """
+        return self.seconds(
+            start, end, account, image, instance, now) / 3600
+
+
+def window(days, now=None):
+    """Return the ``(start, end)`` dates of the last ``days`` days.
+
+    The window ends with today, in UTC, included.
+    """
+    today = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    end = today.date() + timedelta(days=1)
+    return end - timedelta(days=days), end
@@ -0,0 +1,206 @@
+"""Wait for many conditions to be met on the cloudigrade API at once.
+
+Waiting on cloudigrade usually means listing a collection (images, instances,
+events...) over and over until some item reaches some state. When several
+items are waited on, doing that independently for each of them lists the same
+collection once per item on every poll.
+
+:class:`MultiWaiter` instead lists each registered source once per tick and
+checks all pending conditions against that single listing. It polls quickly
+while things are changing and backs off while nothing happens.
+
+Example::
+
+    >>> from integrade import api
+    >>> from integrade.tests import urls
+    >>> from integrade.waiters import MultiWaiter
+    >>> client = api.Client(response_handler=api.shared_json_handler)
+    >>> waiter = MultiWaiter(timeout=600, max_interval=30)
+    >>> waiter.add_source(
+    ...     'images', lambda: client.get(urls.IMAGE)['results'])
+    >>> for ami_id in ami_ids:
+    ...     waiter.add('images', functools.partial(is_inspected, ami_id),
+    ...                name=ami_id)
+    >>> if not waiter.wait():
+    ...     print('Still waiting for', [c.name for c in waiter.pending])
+
+"""
+import time
+
+from integrade import metrics
+from integrade.index import ObjectIndex
+
+# Value of `Condition.last_state` before the state was first observed.
+_UNSEEN = object()
+
+
+class Condition(object):
+    """Something a :class:`MultiWaiter` waits for.
+
+    :param source: Name of the source whose listing is checked.
+    :param check: Callable receiving the latest listing of the source. It
+        returns a truthy value once the condition is met, which is then kept
+        in :attr:`result`.
+    :param name: Optional name used to describe the condition.
+    :param state: Optional callable receiving the latest listing of the
+        source and returning the state of what is waited for, like the
+        status of an image. A change of state counts as progress.
+    """
+
+    def __init__(self, source, check, name=None, state=None):
+        """Save the source and check for later."""
+        self.source = source
+        self.check = check
+        self.name = name if name is not None else repr(check)
+        self.state = state
+        self.last_state = _UNSEEN
+        self.done = False
+        self.result = None
+
+    def observe(self, listing):
+        """Note the state of the condition in a listing.
+
+        :returns: True if the state changed since the previous listing.
+        """
+        if self.state is None or self.done:
+            return False
+        state = self.state(listing)
+        changed = self.last_state is not _UNSEEN and state != self.last_state
+        self.last_state = state
+        return changed
+
+    def evaluate(self, listing):
+        """Check the condition against a listing and remember the result.
+
+        :returns: True if the condition is now met.
+        """
+        if not self.done:
+            result = self.check(listing)
+            if result:
+                self.done = True
+                self.result = result
+        return self.done
+
+    def __repr__(self):
+        """Describe the condition and its state."""
+        state = 'done' if self.done else 'pending'
+        return f'<Condition {self.name} on {self.source}: {state}>'
+
+
+class MultiWaiter(object):
+    """Wait on many conditions, listing each source once per tick.
+
+    The time between ticks starts at ``min_interval``. After a tick where no
+    condition was met, changed state or saw its listing change, it is
+    multiplied by ``backoff`` up to ``max_interval``. Any progress brings it
+    back to ``min_interval``.
+
+    Listings are compared with the previous ones, except
+    :class:`integrade.index.ObjectIndex` listings: comparing those would
+    fetch all their pages, defeating their lazy lookups. Give the conditions
+    on them a ``state`` to detect progress instead.
+
+    :param timeout: Seconds to wait for all conditions before giving up.
+    :param min_interval: Shortest time in seconds between two ticks.
+    :param max_interval: Longest time in seconds between two ticks.
+    :param backoff: Factor applied to the interval after an idle tick.
+    :param on_tick: Optional callable called with the waiter after every
+        tick, for example to report progress.
+    :param clock: Callable returning the current time in seconds.
+    :param sleep: Callable used to sleep between ticks.
+    """
+
+    def __init__(self, timeout, min_interval=1, max_interval=30, backoff=2,
+                 on_tick=None, clock=time.monotonic, sleep=time.sleep):
+        """Create a waiter with no sources and no conditions."""
+        assert timeout >= 0
+        assert 0 < min_interval <= max_interval
+        assert backoff >= 1
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.on_tick = on_tick
+        self.clock = clock
+        self.sleep = sleep
+        self.sources = {}
+        self.listings = {}
+        self.conditions = []
+        self.ticks = 0
+        self.fetches = 0
+        self.elapsed = 0
+
+    def add_source(self, name, fetch):
+        """Register a source to be listed by calling ``fetch()``."""
+        self.sources[name] = fetch
+
+    def add(self, source, check, name=None, state=None):
+        """Add a condition to wait for and return it.
+
+        See :class:`Condition` for the arguments.
+        """
+        if source not in self.sources:
+            raise KeyError(f'Unknown source {source!r}.')
+        condition = Condition(source, check, name, state)
+        self.conditions.append(condition)
+        return condition
+
+    @property
+    def pending(self):
+        """List the conditions that are not met yet."""
+        return [c for c in self.conditions if not c.done]
+
+    def tick(self):
+        """List each source with pending conditions once and check them.
+
+        :returns: True if there was progress, that is if a condition was met
+            or changed state, or a listing changed since the previous tick.
+        """
+        by_source = {}
+        for condition in self.pending:
+            by_source.setdefault(condition.source, []).append(condition)
+        progress = False
+        for source, conditions in by_source.items():
+            with metrics.span('waiter.fetch', source=source):
+                listing = self.sources[source]()
+            self.fetches += 1
+            if (source in self.listings
+                    and not isinstance(listing, ObjectIndex)
+                    and self.listings[source] != listing):
+                progress = True
+            self.listings[source] = listing
+            for condition in conditions:
+                if condition.observe(listing):
+                    progress = True
+                if condition.evaluate(listing):
+                    progress = True
+        self.ticks += 1
+        return progress
+
+    def wait(self):
+        """Tick until all conditions are met or the timeout is reached.
+
+        :returns: True if all conditions were met, False on timeout. Check
+            :attr:`pending` to find out which conditions were not met.
+        """
+        with metrics.span('waiter.wait'):
+            return self._wait()
+
+    def _wait(self):
+        """Tick until all conditions are met or the timeout is reached."""
+        start = self.clock()
+        interval = self.min_interval
+        while True:
+            progress = self.tick()
+            self.elapsed = self.clock() - start
+            if self.on_tick is not None:
+                self.on_tick(self)
+            if not self.pending:
+                return True
+            if self.elapsed >= self.timeout:
+                return False
+            if progress:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            self.sleep(min(interval, self.timeout - self.elapsed))
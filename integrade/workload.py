@@ -0,0 +1,326 @@
+"""Generate synthetic CloudTrail workloads to load test cloudigrade.
+
+A workload is a time ordered stream of CloudTrail records for many instances
+across the configured customer profiles. Each instance runs an image from its
+profile's section of the aws image config. It powers on and off a few times
+using the events of :data:`integrade.injector.power_on_events` and
+:data:`integrade.injector.power_off_events`, until it is eventually
+terminated. Malformed logs shaped like :data:`integrade.injector.bad_events`
+are mixed in.
+
+The same seed always generates the same workload. :func:`run_workload`
+uploads a workload through an :class:`integrade.injector.EventInjector` at a
+target rate, to measure how fast cloudigrade ingests events. Given a check
+like :func:`last_event_listed`, it also measures how long cloudigrade takes
+to list the last uploaded event.
+
+Example::
+
+    >>> from integrade import api
+    >>> from integrade.injector import EventInjector
+    >>> from integrade.workload import (
+    ...     generate_workload, last_event_listed, run_workload)
+    >>> client = api.Client(response_handler=api.shared_json_handler)
+    >>> events = generate_workload(seed=42, instances=5000)
+    >>> with EventInjector(records_per_object=200) as injector:
+    ...     stats = run_workload(
+    ...         events, injector, rate=200,
+    ...         ingested=last_event_listed(client))
+
+"""
+import heapq
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+from dateutil.parser import isoparse
+
+from integrade import config
+from integrade.exceptions import ConfigFileNotFoundError
+from integrade.injector import (
+    bad_events,
+    cloudtrail_log,
+    cloudtrail_record,
+    power_off_events,
+    power_on_events,
+)
+from integrade.tests import urls
+
+TERMINATE_EVENTS = tuple(
+    event for event in power_off_events if event.startswith('Terminate'))
+"""Power off events after which an instance never powers on again."""
+
+STOP_EVENTS = tuple(
+    event for event in power_off_events if event not in TERMINATE_EVENTS)
+"""Power off events after which an instance can power on again."""
+
+SyntheticInstance = namedtuple(
+    'SyntheticInstance', 'instance_id aws_profile image_id')
+"""An instance of a workload, its profile dict and the AMI it runs."""
+
+WorkloadEvent = namedtuple('WorkloadEvent', 'time record data gzipped bad')
+"""One event of a workload.
+
+Good events have a CloudTrail ``record`` to pack into a log with others. Bad
+events have the ``data`` of a whole log of their own, uploaded as is, and
+the name of the :data:`integrade.injector.bad_events` entry they are shaped
+like in ``bad``.
+"""
+
+WorkloadStats = namedtuple(
+    'WorkloadStats', 'events bad records objects seconds rate lag')
+"""What :func:`run_workload` uploaded and how fast.
+
+``lag`` is how many seconds after the last upload cloudigrade listed the last
+event, None if that was not measured or not seen in time.
+"""
+
+
+def profile_image_ids(aws_profile_name, aws_image_config):
+    """List the AMI ids of all image sections of a profile."""
+    images = aws_image_config.get('profiles', {}).get(
+        aws_profile_name, {}).get('images', {})
+    return [image['image_id'] for group in images.values() for image in group]
+
+
+def generate_instances(count, profiles, aws_image_config, rng):
+    """Create ``count`` instances spread randomly over ``profiles``.
+
+    :param rng: The ``random.Random`` to draw from.
+    :returns: list of :data:`SyntheticInstance`.
+    """
+    image_ids = {
+        profile['name']: profile_image_ids(profile['name'], aws_image_config)
+        for profile in profiles
+    }
+    instances = []
+    for _ in range(count):
+        profile = rng.choice(profiles)
+        choices = image_ids[profile['name']]
+        instances.append(SyntheticInstance(
+            f'i-{rng.getrandbits(68):017x}',
+            profile,
+            rng.choice(choices) if choices else None,
+        ))
+    return instances
+
+
+def _instance_events(instance, rng, start, end, cycles, mean_on_hours,
+                     mean_off_hours, terminate_ratio):
+    """Yield ``(time, instance, event_type)`` for one instance, in order.
+
+    Events after ``end``, unless it is None, are left out.
+    """
+    when = start + timedelta(hours=rng.expovariate(1 / mean_off_hours))
+    for _ in range(cycles):
+        if end is not None and when > end:
+            return
+        yield when, instance, rng.choice(power_on_events)
+        when += timedelta(hours=rng.expovariate(1 / mean_on_hours))
+        if end is not None and when > end:
+            return
+        if rng.random() < terminate_ratio:
+            yield when, instance, rng.choice(TERMINATE_EVENTS)
+            return
+        yield when, instance, rng.choice(STOP_EVENTS)
+        when += timedelta(hours=rng.expovariate(1 / mean_off_hours))
+
+
+def _bad_event(when, instance, rng):
+    """Build a bad event shaped like one of the known bad events."""
+    bad_event = rng.choice(bad_events)
+    data = bad_event.data
+    if data is None:
+        instance_id = instance.instance_id
+        aws_profile = instance.aws_profile
+        if bad_event.name == 'badinstanceid':
+            instance_id = 'i-123'
+        elif bad_event.name == 'badawsaccount':
+            aws_profile = dict(aws_profile, account_number=123)
+        data = cloudtrail_log([cloudtrail_record(
+            instance_id, aws_profile, 'BadEvent', when.isoformat())])
+    return WorkloadEvent(
+        when.isoformat(), None, data, bad_event.gzipped, bad_event.name)
+
+
+def generate_workload(seed, instances=1000, cycles=3, bad_ratio=0.01,
+                      terminate_ratio=0.2, mean_on_hours=8,
+                      mean_off_hours=16, start=None, end=None,
+                      profiles=None, aws_image_config=None):
+    """Generate a CloudTrail workload, lazily and in time order.
+
+    Only the next event of each instance is kept in memory, so workloads
+    with many instances and cycles can be streamed.
+
+    :param seed: Seed of the workload, the same seed gives the same events.
+    :param instances: Number of instances.
+    :param cycles: Most power on/off cycles per instance.
+    :param bad_ratio: Chance for each good event to be followed by a bad one.
+    :param terminate_ratio: Chance for each power off to be a termination.
+    :param mean_on_hours: Average time an instance runs for.
+    :param mean_off_hours: Average time an instance is off for.
+    :param start: ``datetime`` of the workload start. By default, the
+        workload spans the ``cycles`` average power cycles before now.
+    :param end: ``datetime`` after which no event is generated, so instances
+        may be left running. Now by default when ``start`` is not given,
+        unbounded otherwise.
+    :param profiles: Profile dicts, the configured ``aws_profiles`` by
+        default.
+    :param aws_image_config: AWS image config, the configured one by
+        default.
+    :returns: Generator of :data:`WorkloadEvent`.
+    """
+    rng = random.Random(seed)
+    if start is None:
+        if end is None:
+            end = datetime.now(timezone.utc)
+        start = end - timedelta(
+            hours=cycles * (mean_on_hours + mean_off_hours))
+    if profiles is None:
+        profiles = config.get_config()['aws_profiles']
+    if aws_image_config is None:
+        try:
+            aws_image_config = config.get_aws_image_config()
+        except ConfigFileNotFoundError:
+            aws_image_config = {}
+    streams = [
+        _instance_events(
+            instance,
+            random.Random(rng.getrandbits(64)),
+            start,
+            end,
+            cycles,
+            mean_on_hours,
+            mean_off_hours,
+            terminate_ratio,
+        )
+        for instance in generate_instances(
+            instances, profiles, aws_image_config, rng)
+    ]
+    for when, instance, event_type in heapq.merge(
+            *streams, key=lambda event: event[0]):
+        image_id = instance.image_id if event_type in power_on_events else None
+        record = cloudtrail_record(
+            instance.instance_id,
+            instance.aws_profile,
+            event_type,
+            when.isoformat(),
+            image_id,
+        )
+        yield WorkloadEvent(when.isoformat(), record, None, True, None)
+        if rng.random() < bad_ratio:
+            yield _bad_event(when, instance, rng)
+
+
+def last_event_listed(client, auth=None):
+    """Build a check of whether cloudigrade lists an uploaded event.
+
+    The check receives a CloudTrail record and lists the events of the v1
+    API, page by page, until one of the record's instance occurred no earlier
+    than the record. Events of an instance are uploaded in time order, so
+    this is true once the record itself was ingested.
+
+    :param client: An :class:`integrade.api.Client` decoding the responses,
+        with :func:`integrade.api.shared_json_handler` for example.
+    :param auth: The auth object for the user owning the instances.
+    :returns: Callable to give :func:`run_workload` as ``ingested``.
+    """
+    ec2_instance_ids = {}
+
+    def ingested(record):
+        items = record['responseElements']['instancesSet']['items']
+        ec2_instance_id = items[0]['instanceId']
+        occurred_at = isoparse(record['eventTime'])
+        url = urls.EVENT
+        while url:
+            page = client.get(url, auth=auth)
+            for event in page['results']:
+                if isoparse(event['occurred_at']) < occurred_at:
+                    continue
+                instance_url = event['instance']
+                if instance_url not in ec2_instance_ids:
+                    ec2_instance_ids[instance_url] = client.get(
+                        urlsplit(instance_url).path,
+                        auth=auth,
+                    )['ec2_instance_id']
+                if ec2_instance_ids[instance_url] == ec2_instance_id:
+                    return True
+            url = page.get('next')
+        return False
+
+    return ingested
+
+
+def run_workload(events, injector, rate, limit=None, flush_interval=1,
+                 ingested=None, ingest_timeout=600, poll_interval=5,
+                 clock=time.monotonic, sleep=time.sleep):
+    """Upload workload events through an injector at a target rate.
+
+    Good events are packed into logs by the injector; logs that are not full
+    are uploaded anyway every ``flush_interval`` seconds, so that events do
+    not wait on the client side. Bad events are uploaded as logs of their
+    own.
+
+    Once everything is uploaded, ``ingested`` is called with the record of
+    the last good event every ``poll_interval`` seconds, until it returns
+    true or ``ingest_timeout`` seconds passed. The time it took is the
+    ingestion lag of the stats.
+
+    :param events: Iterable of :data:`WorkloadEvent`.
+    :param injector: An :class:`integrade.injector.EventInjector`.
+    :param rate: Target number of events per second.
+    :param limit: Stop after this many events.
+    :param flush_interval: Most seconds records wait before being uploaded.
+    :param ingested: Optional callable telling whether cloudigrade ingested
+        a record, see :func:`last_event_listed`.
+    :param ingest_timeout: Most seconds to wait for the last record.
+    :param poll_interval: Seconds between two calls to ``ingested``.
+    :param clock: Callable returning the current time in seconds.
+    :param sleep: Callable used to wait before sending the next event.
+    :returns: :data:`WorkloadStats`, once all uploads are done.
+    """
+    assert rate > 0
+    start = last_flush = clock()
+    count = bad = records = 0
+    last_record = None
+    for event in events:
+        if limit is not None and count >= limit:
+            break
+        now = clock()
+        due = start + count / rate
+        if due > now:
+            sleep(due - now)
+            now = due
+        if event.record is not None:
+            injector.add(event.record)
+            records += 1
+            last_record = event.record
+        else:
+            injector.put(event.data, gzipped=event.gzipped)
+            bad += 1
+        count += 1
+        if now - last_flush >= flush_interval:
+            injector.upload_pending()
+            last_flush = now
+    injector.flush()
+    flushed = clock()
+    seconds = flushed - start
+    lag = None
+    if ingested is not None and last_record is not None:
+        while not ingested(last_record):
+            if clock() - flushed >= ingest_timeout:
+                break
+            sleep(poll_interval)
+        else:
+            lag = clock() - flushed
+    return WorkloadStats(
+        count,
+        bad,
+        records,
+        len(injector.keys),
+        seconds,
+        count / seconds if seconds else 0,
+        lag,
+    )
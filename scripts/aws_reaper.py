@@ -1,14 +1,149 @@
 """Terminate all instances and delete dangling volumes in customer accounts."""
 
 import argparse
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from integrade import config
 from integrade.tests import aws_utils
+from integrade.tests.constants import EC2_NOT_TERMINATED_STATES
+
+PHASES = ('cloudtrails', 'instances', 'volumes', 'amis')
+"""Cleanup phases, in the order they run for each profile."""
+
+PhaseTiming = namedtuple('PhaseTiming', 'profile phase count seconds')
+"""How long a phase took for a profile and how many resources it handled."""
+
+
+def plan_profile(profile, env_cloudtrail_only, all_integrade_cloudtrails):
+    """List the resources to clean up in a customer account.
+
+    :returns: dict mapping each of :data:`PHASES` to the resources that phase
+        will delete: cloudtrail names, instance ids, volume ids and AMI
+        dicts.
+    """
+    trail_names = [
+        trail['Name'] for trail in
+        aws_utils.aws_client(profile['name'], 'cloudtrail').describe_trails(
+        )['trailList']
+    ]
+    plan = {phase: [] for phase in PHASES}
+    plan['cloudtrails'] = [
+        name for name in trail_names
+        if name == profile['cloudtrail_name'] or (
+            all_integrade_cloudtrails and not env_cloudtrail_only and
+            'integrade' in name)
+    ]
+    if not env_cloudtrail_only:
+        plan['instances'] = list(aws_utils.iter_instance_ids(
+            profile['name'], states=EC2_NOT_TERMINATED_STATES))
+        plan['volumes'] = [
+            volume['VolumeId'] for volume in
+            aws_utils.iter_available_volumes(profile['name'])
+        ]
+        plan['amis'] = list(
+            aws_utils.iter_cloudigrade_ami_copies(profile['name']))
+    return plan
+
+
+def build_plan(profiles, env_cloudtrail_only, all_integrade_cloudtrails,
+               executor):
+    """Plan the cleanup of all customer accounts at once.
+
+    :returns: dict mapping each profile name to its plan, see
+        :func:`plan_profile`.
+    """
+    futures = {
+        profile['name']: executor.submit(
+            plan_profile,
+            profile,
+            env_cloudtrail_only,
+            all_integrade_cloudtrails,
+        )
+        for profile in profiles
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def print_plan(plan):
+    """Print what the cleanup would delete in each account."""
+    for profile_name, profile_plan in plan.items():
+        print(f'{profile_name}:')
+        for phase in PHASES:
+            resources = profile_plan[phase]
+            print(f'  {phase}: {len(resources)}')
+            for resource in resources:
+                if phase == 'amis':
+                    snapshots = ', '.join(aws_utils.ami_snapshot_ids(resource))
+                    resource = f'{resource["ImageId"]} ({snapshots})'
+                print(f'    {resource}')
+
+
+def reap_profile(profile_name, plan, max_workers):
+    """Run the cleanup plan of one customer account.
+
+    Phases run one after the other, but the resources of a phase are deleted
+    by up to ``max_workers`` threads. Volumes are listed again after the
+    instances are terminated, to also delete the volumes they freed.
+
+    :returns: list of :data:`PhaseTiming`.
+    """
+    client = aws_utils.aws_client(profile_name, 'ec2')
+    trail_client = aws_utils.aws_client(profile_name, 'cloudtrail')
+    timings = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for phase in PHASES:
+            start = time.monotonic()
+            resources = plan[phase]
+            if phase == 'cloudtrails':
+                list(executor.map(
+                    lambda name: trail_client.delete_trail(Name=name),
+                    resources))
+            elif phase == 'instances':
+                aws_utils.terminate_instances(
+                    [(profile_name, instance_id) for instance_id in resources])
+            elif phase == 'volumes':
+                if plan['instances']:
+                    resources = [
+                        volume['VolumeId'] for volume in
+                        aws_utils.iter_available_volumes(profile_name)
+                    ]
+                list(executor.map(
+                    lambda volume_id: client.delete_volume(VolumeId=volume_id),
+                    resources))
+            elif phase == 'amis':
+                list(executor.map(
+                    lambda image: aws_utils.delete_ami_copy(
+                        profile_name, image),
+                    resources))
+            timings.append(PhaseTiming(
+                profile_name, phase, len(resources),
+                time.monotonic() - start))
+    return timings
+
+
+def print_timings(timings, elapsed):
+    """Print how long each phase took and how fast resources were handled."""
+    for timing in timings:
+        rate = timing.count / timing.seconds if timing.seconds else 0
+        print(f'{timing.profile:<20} {timing.phase:<12} {timing.count:>6}'
+              f' in {timing.seconds:8.2f}s ({rate:.2f}/s)')
+    for phase in PHASES:
+        count = sum(t.count for t in timings if t.phase == phase)
+        seconds = max(
+            (t.seconds for t in timings if t.phase == phase), default=0)
+        print(f'{"all profiles":<20} {phase:<12} {count:>6}'
+              f' in {seconds:8.2f}s (slowest profile)')
+    print(f'Total: {elapsed:.2f}s')
 
 
 def customer_aws_reaper(
         env_cloudtrail_only=False,
-        all_integrade_cloudtrails=False
+        all_integrade_cloudtrails=False,
+        dry_run=False,
+        max_per_profile=4,
 ):
     """Clean up customer accounts from all testing activities.
 
@@ -25,6 +160,11 @@ def customer_aws_reaper(
     Do not use if you think you have important things running in these
     accounts.
 
+    A plan of everything to delete is first built for all accounts at once.
+    Then all accounts are cleaned up concurrently, each by up to
+    ``max_per_profile`` threads, and the time taken by each phase is
+    reported.
+
     Expects all the same configuration as used by the tests to be present in
     the environment, most critcally the AWS credentials for any customer
     accounts.
@@ -33,6 +173,8 @@ def customer_aws_reaper(
 
         --env-cloudtrail-only
         --all-integrade-cloudtrails
+        --dry-run
+        --max-per-profile N
 
     The ``--env-cloudtrail-only`` option makes it so that **only** the
     cloudtrail associated with this environments DEPLOYMENT_PREFIX is deleted,
@@ -44,6 +186,8 @@ def customer_aws_reaper(
     other cleanup activities are also taken, so all instances are terminated
     and cloudigrade AMI copies are deleted, etc.
 
+    The ``--dry-run`` option prints the plan and deletes nothing.
+
     Example::
 
         # in a python 3 virutal environment
@@ -63,30 +207,43 @@ def customer_aws_reaper(
         # would ONLY delete the cloudtrail for this environment
         $ python scripts/aws_reaper.py --env-cloudtrail-only --all-integrade-cloudtrails # noqa E501
 
+        # would show what would be deleted, without deleting it
+        $ python scripts/aws_reaper.py --dry-run
+
 
     This script is called by a nightly job running on gitlab-ci, and is meant
     to help reduce any detritus we leave behind on AWS during daily testing on
     the accounts used by automation as customers.
+
+    :returns: True if all accounts were cleaned up without errors.
     """
     cfg = config.get_config(need_base_url=False)
-    for profile in cfg['aws_profiles']:
-        aws_utils.delete_cloudtrail(
-            (profile['name'], profile['cloudtrail_name']))
-        if env_cloudtrail_only:
-            continue
-        else:
-            aws_utils.terminate_all_instances(profile['name'])
-            aws_utils.delete_available_volumes(profile['name'])
-            aws_utils.clean_up_cloudigrade_ami_copies(profile['name'])
-            if all_integrade_cloudtrails:
-                session = aws_utils.aws_session(profile['name'])
-                client = session.client('cloudtrail')
-                trail_names = [
-                    trail['Name'] for trail in
-                    client.describe_trails()['trailList']]
-                for trail_name in trail_names:
-                    if 'integrade' in trail_name:
-                        client.delete_trail(Name=trail_name)
+    profiles = cfg['aws_profiles']
+    if not profiles:
+        return True
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+        plan = build_plan(
+            profiles, env_cloudtrail_only, all_integrade_cloudtrails, executor)
+        print_plan(plan)
+        print(f'Planned in {time.monotonic() - start:.2f}s')
+        if dry_run:
+            return True
+        futures = {
+            profile_name: executor.submit(
+                reap_profile, profile_name, profile_plan, max_per_profile)
+            for profile_name, profile_plan in plan.items()
+        }
+        timings = []
+        succeeded = True
+        for profile_name, future in futures.items():
+            try:
+                timings.extend(future.result())
+            except Exception as error:  # pylint:disable=broad-except
+                print(f'Cleaning up {profile_name} failed: {error!r}')
+                succeeded = False
+    print_timings(timings, time.monotonic() - start)
+    return succeeded
 
 
 if __name__ == '__main__':
@@ -111,8 +268,25 @@ if __name__ == '__main__':
             'Delete all integrade review environment cloudtrails. '
             'Not compatible with --env-cloudtrail-only, which takes '
             'precedence.'))
+    parser.add_argument(
+        '--dry-run',
+        required=False,
+        default=False,
+        action='store_true',
+        dest='dry_run',
+        help='Print what would be deleted, without deleting anything.')
+    parser.add_argument(
+        '--max-per-profile',
+        required=False,
+        default=4,
+        type=int,
+        dest='max_per_profile',
+        help='Number of resources deleted at once in each account.')
     args = parser.parse_args()
 
-    customer_aws_reaper(
-        args.env_cloudtrail_only,
-        args.all_integrade_cloudtrails)
+    if not customer_aws_reaper(
+            args.env_cloudtrail_only,
+            args.all_integrade_cloudtrails,
+            args.dry_run,
+            args.max_per_profile):
+        sys.exit(1)
@@ -0,0 +1,80 @@
+"""Serve a local stand-in for the cloudigrade API.
+
+Instances of the images in the aws image config are run in the stand-in's
+AWS side for each configured customer profile, so creating accounts for
+those profiles discovers them. See :mod:`integrade.standin`.
+
+Example::
+
+    $ python scripts/cloudigrade_standin.py --port 8000 --inspection-delay 2
+    # then, in another shell, export the printed variables and run a suite
+    $ py.test integrade/tests/api/v2
+"""
+
+import argparse
+import time
+
+from integrade import config
+from integrade.standin import CloudigradeState, serve
+
+
+def seed_profiles(state, instances_per_image):
+    """Run instances of every configured image in the stand-in."""
+    for profile in config.get_config(need_base_url=False)['aws_profiles']:
+        for images in (profile.get('images') or {}).values():
+            for image in images:
+                for _ in range(instances_per_image):
+                    state.add_aws_instance(
+                        profile['arn'],
+                        ec2_ami_id=image['image_id'],
+                        name=image.get('name'),
+                        rhel=bool(image.get('rhel')),
+                        openshift=bool(image.get('openshift')),
+                    )
+
+
+def cloudigrade_standin(host, port, inspection_delay, page_size,
+                        instances_per_image):
+    """Serve the stand-in until interrupted."""
+    state = CloudigradeState(
+        inspection_delays=inspection_delay, page_size=page_size)
+    seed_profiles(state, instances_per_image)
+    with serve(state, host, port) as server:
+        print(f'export CLOUDIGRADE_BASE_URL={server.base_url}')
+        print('export USE_HTTPS=false')
+        print(f'export CLOUDIGRADE_API_V2_URL={server.v2_url}')
+        print(f'export CLOUDIGRADE_TOKEN={state.superuser_token}')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve a local stand-in for the cloudigrade API.')
+    parser.add_argument(
+        '--host', default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument(
+        '--port', type=int, default=8000, help='Port to listen on.')
+    parser.add_argument(
+        '--inspection-delay', type=float, default=1,
+        dest='inspection_delay',
+        help='Seconds images spend in each inspection status.')
+    parser.add_argument(
+        '--page-size', type=int, default=10, dest='page_size',
+        help='Number of objects in each page of a list endpoint.')
+    parser.add_argument(
+        '--instances-per-image', type=int, default=1,
+        dest='instances_per_image',
+        help='Instances run for each configured image of each profile.')
+    args = parser.parse_args()
+
+    cloudigrade_standin(
+        args.host,
+        args.port,
+        args.inspection_delay,
+        args.page_size,
+        args.instances_per_image,
+    )
@@ -0,0 +1,111 @@
+"""Load cloudigrade with a synthetic CloudTrail workload.
+
+Generates CloudTrail records for many instances across the configured
+customer profiles and uploads them to cloudigrade's s3 bucket at a target
+rate. See :mod:`integrade.workload`.
+
+Example::
+
+    # 5000 instances, 200 events per second, at most 20000 events
+    $ python scripts/cloudtrail_workload.py --seed 42 --instances 5000 \
+        --rate 200 --limit 20000
+
+    # also wait up to 10 minutes for cloudigrade to list the last event
+    $ python scripts/cloudtrail_workload.py --seed 42 --ingest-timeout 600
+
+    # only count what would be uploaded
+    $ python scripts/cloudtrail_workload.py --seed 42 --dry-run
+"""
+
+import argparse
+import itertools
+from collections import Counter
+
+from integrade import api
+from integrade.injector import EventInjector
+from integrade.workload import (
+    generate_workload,
+    last_event_listed,
+    run_workload,
+)
+
+
+def cloudtrail_workload(seed, instances, cycles, bad_ratio, rate, limit,
+                        records_per_object, dry_run, ingest_timeout=None):
+    """Upload a workload, or count its events on a dry run.
+
+    With an ``ingest_timeout``, also wait for cloudigrade to list the last
+    event and print how long that took.
+    """
+    events = generate_workload(
+        seed, instances=instances, cycles=cycles, bad_ratio=bad_ratio)
+    if dry_run:
+        counts = Counter(
+            event.bad or event.record['eventName']
+            for event in itertools.islice(events, limit)
+        )
+        for name, count in sorted(counts.items()):
+            print(f'{name:<40} {count:>8}')
+        print(f'{"total":<40} {sum(counts.values()):>8}')
+        return
+    ingested = None
+    if ingest_timeout is not None:
+        ingested = last_event_listed(
+            api.Client(response_handler=api.shared_json_handler))
+    with EventInjector(records_per_object=records_per_object) as injector:
+        stats = run_workload(
+            events, injector, rate, limit=limit, ingested=ingested,
+            ingest_timeout=ingest_timeout)
+    print(f'Uploaded {stats.events} events ({stats.bad} bad) in'
+          f' {stats.objects} objects, {injector.bytes} bytes, in'
+          f' {stats.seconds:.2f}s: {stats.rate:.2f} events/s')
+    if ingest_timeout is not None:
+        if stats.lag is None:
+            print(f'The last event was not listed after {ingest_timeout}s')
+        else:
+            print(f'The last event was listed {stats.lag:.2f}s after upload')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Load cloudigrade with synthetic CloudTrail events.')
+    parser.add_argument(
+        '--seed', type=int, default=0, help='Seed of the workload.')
+    parser.add_argument(
+        '--instances', type=int, default=1000, help='Number of instances.')
+    parser.add_argument(
+        '--cycles', type=int, default=3,
+        help='Most power on/off cycles per instance.')
+    parser.add_argument(
+        '--bad-ratio', type=float, default=0.01, dest='bad_ratio',
+        help='Chance for each event to be followed by a bad one.')
+    parser.add_argument(
+        '--rate', type=float, default=100,
+        help='Target number of events uploaded per second.')
+    parser.add_argument(
+        '--limit', type=int, default=None,
+        help='Stop after this many events.')
+    parser.add_argument(
+        '--records-per-object', type=int, default=500,
+        dest='records_per_object',
+        help='Most CloudTrail records packed into each uploaded log.')
+    parser.add_argument(
+        '--dry-run', default=False, action='store_true', dest='dry_run',
+        help='Count the events by type instead of uploading them.')
+    parser.add_argument(
+        '--ingest-timeout', type=float, default=None, dest='ingest_timeout',
+        help='Wait up to this many seconds for cloudigrade to list the last'
+        ' event, and print how long it took.')
+    args = parser.parse_args()
+
+    cloudtrail_workload(
+        args.seed,
+        args.instances,
+        args.cycles,
+        args.bad_ratio,
+        args.rate,
+        args.limit,
+        args.records_per_object,
+        args.dry_run,
+        args.ingest_timeout,
+    )
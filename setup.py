@@ -38,12 +38,22 @@ setup(
             # For `make test-coverage`
             'pytest-cov',
         ],
+        'local-aws': [
+            # For INTEGRADE_AWS_BACKEND=local, see integrade.local_aws
+            'moto>=5',
+        ],
+        'fast-json': [
+            # For INTEGRADE_JSON_CODEC=orjson, see integrade.codec
+            'orjson',
+        ],
     },
     install_requires=[
+        'aiohttp',
         'awscli',
         'boto3',
         'click',
         'flaky',
+        'numpy',
         'pytest',
         'pytest-selenium',
         'python-dateutil',
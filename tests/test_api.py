@@ -1,16 +1,24 @@
 """Unit tests for :mod:`integrade.api`."""
+import asyncio
 import json
+import socket
+import threading
+import time
 from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from json import JSONDecodeError
 from unittest import mock
 from unittest.mock import Mock, patch
-from urllib.parse import urljoin
+from urllib.parse import parse_qs, urljoin, urlparse
+
+import aiohttp
 
 import pytest
 
 import requests
 
-from integrade import api, config, exceptions
+from integrade import api, config, exceptions, metrics, tracing
+from integrade.retry import RetryPolicy
 from integrade.utils import uuid4
 
 
@@ -36,6 +44,88 @@ def mock_request():
     return mock_request
 
 
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Answer every request with a small JSON body over HTTP/1.1.
+
+    Requests to paths starting with ``/slow/`` take a little while to be
+    answered, paths starting with ``/missing/`` are not found and paths
+    starting with ``/pages/`` return paginated v2 style lists. The highest
+    number of requests seen in flight at the same time is kept in
+    ``max_in_flight``.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    paths = []
+    page_size = 10
+    pages = 3
+
+    def page(self):
+        """Build a v2 style page of objects for ``/pages/?page=N``."""
+        query = parse_qs(urlparse(self.path).query)
+        number = int(query.get('page', ['1'])[0])
+        start = (number - 1) * self.page_size
+        next_link = None
+        if number < self.pages:
+            next_link = f'/pages/?page={number + 1}'
+        return {
+            'meta': {'count': self.page_size * self.pages},
+            'links': {'next': next_link},
+            'data': [
+                {'id': i} for i in range(start, start + self.page_size)
+            ],
+        }
+
+    def do_GET(self):  # noqa: N802
+        """Send a JSON body that echoes the requested path and headers."""
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        cls.paths.append(self.path)
+        if self.path.startswith('/slow/'):
+            time.sleep(0.05)
+        if self.path.startswith('/pages/'):
+            body = json.dumps(self.page()).encode('utf-8')
+        else:
+            body = json.dumps({
+                'path': self.path,
+                'headers': dict(self.headers),
+            }).encode('utf-8')
+        with cls.lock:
+            cls.in_flight -= 1
+        if self.path.startswith('/missing/'):
+            self.send_response(404)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keep the test output clean."""
+
+
+@pytest.fixture
+def local_server():
+    """Run a keep-alive capable HTTP server on localhost for a test."""
+    KeepAliveHandler.max_in_flight = 0
+    KeepAliveHandler.paths = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(
+        target=server.serve_forever,
+        kwargs={'poll_interval': 0.01},
+        daemon=True,
+    )
+    thread.start()
+    yield 'http://127.0.0.1:{}/'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
 @pytest.fixture
 def good_response():
     """Return a mock response with a 200 status code."""
@@ -149,6 +239,7 @@ def test_response_handlers(good_response, handler):
                          [
                              api.code_handler,
                              api.json_handler,
+                             api.shared_json_handler,
                              api.echo_handler,
                          ]
                          )
@@ -176,6 +267,7 @@ def test_response_handler_raises(
                          [
                              api.code_handler,
                              api.json_handler,
+                             api.shared_json_handler,
                              api.echo_handler,
                          ]
                          )
@@ -201,6 +293,62 @@ def test_response_handler_raises_no_json(
             client.response_handler(bad_response)
 
 
+def error_response(content, status=400, body=None):
+    """Build a response to a POST request, as the adapter does."""
+    request = requests.Request(
+        'POST', 'http://example.com/api/v1/image/12/?page=2', data=body,
+        headers={'Authorization': 'Token secret'}).prepare()
+    response = api.APIResponse()
+    response.status_code = status
+    response.request = request
+    response.url = request.url
+    response.encoding = 'utf-8'
+    response._content = content
+    return response
+
+
+def test_http_error_fields():
+    """Test HTTP errors tell what went wrong without parsing the message."""
+    response = error_response(b'{"detail": "Bad image."}', body=b'{"a": 1}')
+    with pytest.raises(exceptions.CloudigradeHTTPError) as exc_info:
+        api.code_handler(response)
+    error = exc_info.value
+    assert isinstance(error, requests.exceptions.HTTPError)
+    assert error.response is response
+    assert error.request is response.request
+    assert error.status == 400
+    assert error.endpoint == '/api/v1/image/12/'
+    assert error.json == {'detail': 'Bad image.'}
+    assert error.args == ('400 for POST /api/v1/image/12/?page=2',)
+
+
+def test_http_error_is_rendered_lazily():
+    """Test the report of an HTTP error is only rendered when printed."""
+    response = error_response(b'<html>Bad Gateway</html>', status=502,
+                              body=b'{"a": 1}')
+    with patch.object(exceptions, 'pformat', wraps=exceptions.pformat) as fmt:
+        with pytest.raises(exceptions.CloudigradeHTTPError) as exc_info:
+            api.code_handler(response)
+        fmt.assert_not_called()
+        report = str(exc_info.value)
+        assert str(exc_info.value) is report
+    assert exc_info.value.json is None
+    assert "text_error_message : '<html>Bad Gateway</html>'" in report
+    assert 'request body : \'{"a": 1}\'' in report
+    assert "'Authorization': '********'" in report
+    assert 'response code : 502' in report
+
+
+def test_http_error_truncates_bodies():
+    """Test huge bodies are cut in the report of an HTTP error."""
+    content = json.dumps({'detail': 'x' * 100000}).encode('utf-8')
+    error = exceptions.CloudigradeHTTPError(error_response(content))
+    report = str(error)
+    assert len(report) < 6000
+    assert f'({len(content) - error.max_body} more characters)' in report
+    assert error.json == {'detail': 'x' * 100000}
+
+
 def test_patch(good_response):
     """Test that the patch method sends a well formed request."""
     with patch.object(config, '_CONFIG', VALID_CONFIG):
@@ -282,13 +430,14 @@ def test_request(good_response):
     """Test that the request method sets all options correctly."""
     with patch.object(config, '_CONFIG', VALID_CONFIG):
         client = api.Client()
-        requests.request = Mock(return_value=good_response)
+        client.session = Mock()
+        client.session.request = Mock(return_value=good_response)
         client.request(
             'GET',
             'http://example.com/api/v1/',
             headers={
                 'Foo': 'bar'})
-        args, kwargs = requests.request.call_args
+        args, kwargs = client.session.request.call_args
         assert args == ('GET', 'http://example.com/api/v1/')
         assert kwargs == {
             'headers': {
@@ -309,3 +458,221 @@ def test_token_auth():
     assert changed_request is request
     assert 'Authorization' in request.headers
     assert request.headers['Authorization'] == f'{header_format} {token}'
+
+
+def test_shared_session():
+    """Test that clients share one pooled session per process."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client1 = api.Client(authenticate=False)
+        client2 = api.Client(authenticate=False)
+        assert client1.session is client2.session
+        assert client1.session is api.get_session()
+        adapter = client1.session.get_adapter('https://example.com/')
+        assert isinstance(adapter, api.PooledHTTPAdapter)
+
+
+def test_session_config():
+    """Test that the session is configured with the pool settings."""
+    cfg = dict(VALID_CONFIG)
+    cfg.update({
+        'http_pool_connections': 3,
+        'http_pool_maxsize': 7,
+        'http_pool_block': True,
+        'http_keep_alive': False,
+    })
+    session = api.new_session(cfg)
+    adapter = session.get_adapter('http://example.com/')
+    assert adapter._pool_connections == 3
+    assert adapter._pool_maxsize == 7
+    assert adapter._pool_block is True
+    assert session.headers['Connection'] == 'close'
+
+
+def test_connection_reuse(local_server):
+    """Test that consecutive requests reuse the kept-alive connection."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        session = api.new_session()
+        client = api.Client(
+            url=local_server,
+            authenticate=False,
+            response_handler=api.json_handler,
+            session=session,
+        )
+        for i in range(5):
+            assert client.get(f'item/{i}/')['path'] == f'/item/{i}/'
+        assert client.connection_stats() == {
+            'opened': 1,
+            'reused': 4,
+            'requests': 5,
+        }
+
+
+def test_connection_no_keep_alive(local_server):
+    """Test that disabling keep-alive opens a connection per request."""
+    cfg = dict(VALID_CONFIG, http_keep_alive=False)
+    with patch.object(config, '_CONFIG', cfg):
+        session = api.new_session()
+        client = api.Client(
+            url=local_server,
+            authenticate=False,
+            session=session,
+        )
+        for _ in range(3):
+            client.get()
+        stats = api.connection_stats(session)
+        assert stats['opened'] == 3
+        assert stats['reused'] == 0
+
+
+def test_async_client(local_server):
+    """Test that the async client sends well formed requests."""
+    async def fetch():
+        async with api.AsyncClient(
+            url=local_server,
+            response_handler=api.json_handler,
+            token='my-token',
+        ) as client:
+            return await client.get('api/v1/', params={'limit': 1})
+
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        response = asyncio.run(fetch())
+    assert response['path'] == '/api/v1/?limit=1'
+    assert response['headers']['Authorization'] == 'Token my-token'
+
+
+def test_async_client_from_client(local_server):
+    """Test that the async client copies the settings of a ClientV2."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.ClientV2(
+            url=local_server,
+            auth=api.TokenAuth('v2-token', 'Bearer'),
+            branch='master',
+        )
+        async_client = api.AsyncClient.from_client(client)
+        response = asyncio.run(async_client.get('accounts/'))
+        asyncio.run(async_client.close())
+    assert response.status_code == 200
+    headers = response.json()['headers']
+    assert headers['Authorization'] == 'Bearer v2-token'
+    assert headers['X-4Scale-Env'] == 'qa'
+    assert headers['X-4Scale-Branch'] == 'master'
+
+
+def test_async_client_max_concurrency(local_server):
+    """Test that the async client caps the number of requests in flight."""
+    async def fetch_all():
+        async with api.AsyncClient(
+            url=local_server,
+            authenticate=False,
+            response_handler=api.json_handler,
+            max_concurrency=3,
+        ) as client:
+            return await asyncio.gather(*(
+                client.get(f'slow/{i}/') for i in range(12)
+            ))
+
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        responses = asyncio.run(fetch_all())
+    assert [r['path'] for r in responses] == [
+        f'/slow/{i}/' for i in range(12)]
+    assert 1 < KeepAliveHandler.max_in_flight <= 3
+
+
+def test_async_client_raises(local_server):
+    """Test that the async client hands responses to the response handler."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.AsyncClient(url=local_server, authenticate=False)
+        with pytest.raises(requests.exceptions.HTTPError) as exc_info:
+            asyncio.run(client.get('missing/'))
+    assert 'response code : 404' in str(exc_info.value)
+
+
+def test_async_client_sessions_follow_loops(local_server):
+    """Test sessions are closed with their loop, or when it changes."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.AsyncClient(url=local_server, authenticate=False)
+        asyncio.run(client.get('api/v1/'))
+        first = client._session
+        assert first.closed
+        asyncio.run(client.get('api/v1/'))
+        assert client._session is not first
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(client.get('api/v1/'))
+        loop.close()
+        abandoned = client._session
+        assert not abandoned.closed
+        asyncio.run(client.get('api/v1/'))
+        assert abandoned.closed
+        assert client._session is not abandoned
+
+
+def test_async_client_traces_errors():
+    """Test requests which raise are traced and timed too."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:{}/'.format(sock.getsockname()[1])
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.AsyncClient(
+            url=url, authenticate=False, retry=RetryPolicy(total=0))
+        with pytest.raises(aiohttp.ClientConnectionError):
+            asyncio.run(client.get('api/v1/refused/'))
+    record = tracing.buffer().records()[-1]
+    assert record.endpoint == '/api/v1/refused/'
+    assert record.status is None
+    assert record.bytes is None
+    assert record.error == 'ClientConnectorError'
+    assert any(
+        series.name == 'api.request'
+        and series.labels['endpoint'] == '/api/v1/refused/'
+        for series in metrics.registry().series.values()
+    )
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_iter_objects(local_server, prefetch):
+    """Test that the paginator yields the objects of every page in order."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.ClientV2(url=local_server, auth=(), branch='master')
+        objects = list(client.iter_objects('pages/', prefetch=prefetch))
+    assert [obj['id'] for obj in objects] == list(range(30))
+    assert KeepAliveHandler.paths == [
+        '/pages/', '/pages/?page=2', '/pages/?page=3']
+
+
+def test_iter_objects_shared(local_server):
+    """Test that pollers can ask for read-only pages."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.ClientV2(url=local_server, auth=(), branch='master')
+        objects = list(client.iter_objects('pages/', shared=True))
+        assert [obj['id'] for obj in objects] == list(range(30))
+        with pytest.raises(TypeError):
+            objects[0]['id'] = 1
+        objects = list(client.iter_objects('pages/'))
+        objects[0]['id'] = 1
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_iter_objects_stops_early(local_server, prefetch):
+    """Test that no more pages are fetched once the caller stops."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.ClientV2(url=local_server, auth=(), branch='master')
+        found = next(
+            obj for obj in client.iter_objects('pages/', prefetch=prefetch)
+            if obj['id'] == 3
+        )
+    assert found == {'id': 3}
+    time.sleep(0.1)
+    if prefetch:
+        assert KeepAliveHandler.paths == ['/pages/', '/pages/?page=2']
+    else:
+        assert KeepAliveHandler.paths == ['/pages/']
+
+
+def test_iter_pages_params(local_server):
+    """Test that extra arguments are only used for the first page."""
+    with patch.object(config, '_CONFIG', VALID_CONFIG):
+        client = api.ClientV2(url=local_server, auth=(), branch='master')
+        pages = list(client.iter_pages('pages/', params={'page': 2}))
+    assert len(pages) == 2
+    assert KeepAliveHandler.paths == ['/pages/?page=2', '/pages/?page=3']
@@ -0,0 +1,180 @@
+"""Unit tests for ``scripts/aws_reaper.py``."""
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from integrade import config
+from integrade.local_aws import stop_local_backend
+from integrade.tests import aws_utils
+
+pytest.importorskip('moto')
+
+SCRIPT = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'scripts', 'aws_reaper.py')
+
+PROFILES = [
+    {'name': 'CUSTOMER1', 'cloudtrail_name': 'integrade-review-1'},
+    {'name': 'CUSTOMER2', 'cloudtrail_name': 'integrade-review-2'},
+]
+
+CONFIG = {
+    'aws_backend': 'local',
+    'local_aws_delays': {},
+    'aws_max_concurrency': 8,
+    'aws_profiles': PROFILES,
+}
+
+
+def load_reaper():
+    """Import the reaper script, which is not in a package."""
+    spec = importlib.util.spec_from_file_location('aws_reaper', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+aws_reaper = load_reaper()
+
+
+@pytest.fixture
+def account():
+    """Fill a local AWS account with resources to reap.
+
+    Both profiles use the same local account, with a trail each.
+    """
+    with patch.object(config, '_CONFIG', dict(CONFIG)):
+        aws_utils.clear_aws_cache()
+        ec2 = aws_utils.aws_client('CUSTOMER1', 'ec2')
+        instance_ids = [
+            instance['InstanceId'] for instance in ec2.run_instances(
+                ImageId='ami-12345678', MinCount=3, MaxCount=3)['Instances']
+        ]
+        volume_ids = [
+            ec2.create_volume(AvailabilityZone='us-east-1a', Size=1)[
+                'VolumeId']
+            for _ in range(2)
+        ]
+        image_id = ec2.create_image(
+            InstanceId=instance_ids[0],
+            Name='ami-1 cloudigrade reference copy',
+        )['ImageId']
+        aws_utils.aws_client('CUSTOMER1', 's3').create_bucket(
+            Bucket='trails')
+        trails = aws_utils.aws_client('CUSTOMER1', 'cloudtrail')
+        for name in ('integrade-review-1', 'integrade-review-2',
+                     'integrade-other', 'production'):
+            trails.create_trail(Name=name, S3BucketName='trails')
+        yield {
+            'instances': instance_ids,
+            'volumes': volume_ids,
+            'amis': [image_id],
+        }
+        stop_local_backend()
+        aws_utils.clear_aws_cache()
+
+
+def trail_names():
+    """List the trails left in the account."""
+    return sorted(
+        trail['Name'] for trail in aws_utils.aws_client(
+            'CUSTOMER1', 'cloudtrail').describe_trails()['trailList'])
+
+
+def test_plan_profile(account):
+    """Test the plan lists every resource the reaper will delete."""
+    plan = aws_reaper.plan_profile(PROFILES[0], False, False)
+    assert plan['cloudtrails'] == ['integrade-review-1']
+    assert sorted(plan['instances']) == sorted(account['instances'])
+    assert sorted(plan['volumes']) == sorted(account['volumes'])
+    assert [image['ImageId'] for image in plan['amis']] == account['amis']
+
+    plan = aws_reaper.plan_profile(PROFILES[0], False, True)
+    assert sorted(plan['cloudtrails']) == [
+        'integrade-other', 'integrade-review-1', 'integrade-review-2']
+
+    plan = aws_reaper.plan_profile(PROFILES[0], True, True)
+    assert plan == {
+        'cloudtrails': ['integrade-review-1'],
+        'instances': [],
+        'volumes': [],
+        'amis': [],
+    }
+
+
+def test_build_plan(account):
+    """Test every profile is planned."""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        plan = aws_reaper.build_plan(PROFILES, True, False, executor)
+    assert plan == {
+        profile['name']: {
+            'cloudtrails': [profile['cloudtrail_name']],
+            'instances': [],
+            'volumes': [],
+            'amis': [],
+        }
+        for profile in PROFILES
+    }
+
+
+def test_dry_run(account, capsys):
+    """Test a dry run prints the plan and deletes nothing."""
+    with patch.object(aws_reaper, 'reap_profile') as reap_profile:
+        assert aws_reaper.customer_aws_reaper(dry_run=True) is True
+    reap_profile.assert_not_called()
+    assert trail_names() == [
+        'integrade-other', 'integrade-review-1', 'integrade-review-2',
+        'production']
+    assert sorted(aws_utils.iter_instance_ids(
+        'CUSTOMER1', states=['running'])) == sorted(account['instances'])
+    assert len(list(aws_utils.iter_available_volumes('CUSTOMER1'))) == 2
+    assert len(list(aws_utils.iter_cloudigrade_ami_copies('CUSTOMER1'))) == 1
+    output = capsys.readouterr().out
+    assert 'CUSTOMER1:\n  cloudtrails: 1\n    integrade-review-1\n' in output
+    assert '  instances: 3\n' in output
+
+
+def test_reap_profile(account):
+    """Test each phase deletes its resources and is timed."""
+    plan = aws_reaper.plan_profile(PROFILES[0], False, False)
+    timings = aws_reaper.reap_profile('CUSTOMER1', plan, 2)
+    assert [(t.profile, t.phase, t.count) for t in timings] == [
+        ('CUSTOMER1', 'cloudtrails', 1),
+        ('CUSTOMER1', 'instances', 3),
+        ('CUSTOMER1', 'volumes', 2),
+        ('CUSTOMER1', 'amis', 1),
+    ]
+    assert all(timing.seconds >= 0 for timing in timings)
+    assert trail_names() == [
+        'integrade-other', 'integrade-review-2', 'production']
+    assert set(aws_utils.describe_instance_states(
+        'CUSTOMER1', account['instances']).values()) == {'terminated'}
+    assert list(aws_utils.iter_available_volumes('CUSTOMER1')) == []
+    assert list(aws_utils.iter_cloudigrade_ami_copies('CUSTOMER1')) == []
+
+
+def test_max_per_profile(account):
+    """Test at most ``max_per_profile`` resources are deleted at once."""
+    lock = threading.Lock()
+    running = []
+    most = []
+
+    def delete_ami_copy(profile_name, image):
+        with lock:
+            running.append(image)
+            most.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(image)
+
+    plan = {phase: [] for phase in aws_reaper.PHASES}
+    plan['amis'] = [{'ImageId': f'ami-{n}'} for n in range(12)]
+    with patch.object(aws_utils, 'delete_ami_copy', delete_ami_copy):
+        timings = aws_reaper.reap_profile('CUSTOMER1', plan, 3)
+    assert len(most) == 12
+    assert max(most) <= 3
+    assert timings[-1].count == 12
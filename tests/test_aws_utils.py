@@ -0,0 +1,224 @@
+"""Unit tests for :mod:`integrade.tests.aws_utils`."""
+import threading
+from unittest.mock import patch
+
+import botocore
+from botocore.stub import Stubber
+
+import pytest
+
+from integrade import config
+from integrade.exceptions import InstanceStateError, LifecycleError
+from integrade.tests import aws_utils
+
+CONFIG = {
+    'aws_backend': 'aws',
+    'aws_max_concurrency': 8,
+    'aws_profiles': [],
+}
+
+
+@pytest.fixture
+def aws_config(monkeypatch):
+    """Configure real AWS with fake credentials and an empty boto3 cache."""
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID_CUSTOMER1', 'AKIDCUSTOMER1')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY_CUSTOMER1', 'secret-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID_CUSTOMER2', 'AKIDCUSTOMER2')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY_CUSTOMER2', 'secret-2')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with patch.object(config, '_CONFIG', dict(CONFIG)):
+        aws_utils.clear_aws_cache()
+        yield
+        aws_utils.clear_aws_cache()
+
+
+def test_clients_are_cached(aws_config):
+    """Test clients are reused per profile and service."""
+    client = aws_utils.aws_client('customer1', 'ec2')
+    assert aws_utils.aws_client('CUSTOMER1', 'ec2') is client
+    assert aws_utils.aws_client('CUSTOMER1', 's3') is not client
+    assert aws_utils.aws_client('CUSTOMER2', 'ec2') is not client
+    assert aws_utils.aws_session('CUSTOMER1') is aws_utils.aws_session(
+        'customer1')
+    assert aws_utils.aws_cache_stats() == {
+        'sessions': {'created': 2, 'reused': 3},
+        'clients': {'created': 3, 'reused': 1},
+        'resources': {'created': 0, 'reused': 0},
+    }
+
+    with Stubber(client) as stubber:
+        stubber.add_response('describe_instances', {'Reservations': []})
+        assert aws_utils.aws_client('CUSTOMER1', 'ec2').describe_instances(
+        )['Reservations'] == []
+        stubber.assert_no_pending_responses()
+
+
+def test_new_credentials_miss_the_cache(aws_config, monkeypatch):
+    """Test changed credentials get a new session and client."""
+    session = aws_utils.aws_session('CUSTOMER1')
+    client = aws_utils.aws_client('CUSTOMER1', 'ec2')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY_CUSTOMER1', 'rotated')
+    assert aws_utils.aws_session('CUSTOMER1') is not session
+    assert aws_utils.aws_client('CUSTOMER1', 'ec2') is not client
+    assert aws_utils.aws_session('CUSTOMER1').get_credentials(
+    ).secret_key == 'rotated'
+
+
+def test_cache_keys_hide_secrets(aws_config):
+    """Test the secret access keys are not kept in the cache keys."""
+    aws_utils.aws_client('CUSTOMER1', 'ec2')
+    aws_utils.aws_resource('CUSTOMER2', 's3')
+    keys = [*aws_utils._AWS_CACHE, *aws_utils._AWS_RESOURCES.cache]
+    assert len(keys) == 4
+    for key in keys:
+        assert 'secret-1' not in key
+        assert 'secret-2' not in key
+
+
+def test_lifecycle_jobs_all_run(aws_config):
+    """Test failing jobs do not stop the others, and are raised at the end."""
+    started = []
+    first_failed = threading.Event()
+
+    def job(item):
+        started.append(item)
+        if item % 2:
+            first_failed.set()
+            raise ValueError(item)
+        # Even items only finish once an odd one failed.
+        assert first_failed.wait(5)
+        return item * 10
+
+    with pytest.raises(LifecycleError) as excinfo:
+        aws_utils.run_lifecycle_jobs(job, range(6))
+    assert sorted(started) == list(range(6))
+    error = excinfo.value
+    assert [result.item for result in error.results] == list(range(6))
+    assert [result.result for result in error.results] == [
+        0, None, 20, None, 40, None]
+    assert [failure.item for failure in error.failures] == [1, 3, 5]
+    assert all(
+        isinstance(failure.error, ValueError) for failure in error.failures)
+    assert str(error).startswith('3 of 6 jobs failed: 1: ValueError(1)')
+
+
+def test_lifecycle_jobs_without_raising(aws_config):
+    """Test errors are only reported in the results when asked to."""
+    def job(item):
+        if item == 'b':
+            raise KeyError(item)
+        return item.upper()
+
+    results = aws_utils.run_lifecycle_jobs(job, 'abc', raise_errors=False)
+    assert [(result.item, result.result) for result in results] == [
+        ('a', 'A'), ('b', None), ('c', 'C')]
+    assert isinstance(results[1].error, KeyError)
+    assert aws_utils.run_lifecycle_jobs(job, []) == []
+
+
+def reservations(states):
+    """Build a describe_instances response for instances in some states."""
+    return {'Reservations': [{'Instances': [
+        {'InstanceId': instance_id, 'State': {'Name': state}}
+        for instance_id, state in states.items()
+    ]}]}
+
+
+def test_instances_are_terminated_in_batches(aws_config):
+    """Test instance ids are sent by batches of at most 1000."""
+    instance_ids = [f'i-{n:05}' for n in range(1500)]
+    client = aws_utils.aws_client('CUSTOMER1', 'ec2')
+    with Stubber(client) as stubber:
+        for chunk in (instance_ids[:1000], instance_ids[1000:]):
+            stubber.add_response(
+                'terminate_instances', {}, {'InstanceIds': chunk})
+        aws_utils.terminate_instances(
+            [('CUSTOMER1', instance_id) for instance_id in instance_ids],
+            wait=False,
+        )
+        stubber.assert_no_pending_responses()
+
+
+def test_unknown_instances_are_skipped(aws_config):
+    """Test a batch with unknown instance ids is sent again without them."""
+    client = aws_utils.aws_client('CUSTOMER1', 'ec2')
+    with Stubber(client) as stubber:
+        stubber.add_client_error(
+            'stop_instances', 'InvalidInstanceID.NotFound',
+            expected_params={'InstanceIds': ['i-1', 'i-2', 'i-3']})
+        stubber.add_response('describe_instances', reservations({
+            'i-1': 'running', 'i-3': 'running'}))
+        stubber.add_client_error(
+            'stop_instances', 'InvalidInstanceID.NotFound',
+            expected_params={'InstanceIds': ['i-1', 'i-3']})
+        stubber.add_response(
+            'stop_instances', {}, {'InstanceIds': ['i-1']})
+        stubber.add_client_error(
+            'stop_instances', 'InvalidInstanceID.NotFound',
+            expected_params={'InstanceIds': ['i-3']})
+        # Only the instance which was stopped is waited for.
+        stubber.add_response('describe_instances', reservations({
+            'i-1': 'stopped'}), {'Filters': [
+                {'Name': 'instance-id', 'Values': ['i-1']}]})
+        aws_utils.stop_instances(
+            [('CUSTOMER1', 'i-1'), ('CUSTOMER1', 'i-2'), ('CUSTOMER1', 'i-3')])
+        stubber.assert_no_pending_responses()
+
+        stubber.add_client_error(
+            'terminate_instances', 'UnauthorizedOperation')
+        with pytest.raises(botocore.exceptions.ClientError):
+            aws_utils.terminate_instances([('CUSTOMER1', 'i-1')], wait=False)
+
+
+def test_instance_state_error(aws_config):
+    """Test instances which can not reach a state are reported at once."""
+    client = aws_utils.aws_client('CUSTOMER1', 'ec2')
+    with Stubber(client) as stubber:
+        stubber.add_response('describe_instances', reservations({
+            'i-1': 'running', 'i-2': 'shutting-down'}))
+        with pytest.raises(InstanceStateError) as excinfo:
+            aws_utils.wait_until_all_running(
+                [('CUSTOMER1', 'i-1'), ('CUSTOMER1', 'i-2')])
+        stubber.assert_no_pending_responses()
+    assert excinfo.value.state == 'running'
+    assert excinfo.value.states == {('CUSTOMER1', 'i-2'): 'shutting-down'}
+    assert str(excinfo.value) == (
+        '1 instances did not reach running: i-2 (CUSTOMER1) is shutting-down')
+
+
+def test_volumes_are_listed_before_deletion(aws_config):
+    """Test every page of volumes is listed before any is deleted."""
+    client = aws_utils.aws_client('CUSTOMER1', 'ec2')
+    with Stubber(client) as stubber:
+        stubber.add_response('describe_volumes', {
+            'Volumes': [{'VolumeId': 'vol-1'}, {'VolumeId': 'vol-2'}],
+            'NextToken': 'page-2',
+        })
+        stubber.add_response('describe_volumes', {
+            'Volumes': [{'VolumeId': 'vol-3'}]})
+        for volume_id in ('vol-1', 'vol-2', 'vol-3'):
+            stubber.add_response(
+                'delete_volume', {}, {'VolumeId': volume_id})
+        aws_utils.delete_available_volumes('CUSTOMER1')
+        stubber.assert_no_pending_responses()
+
+
+def test_ami_copies_are_listed_before_deletion(aws_config):
+    """Test every page of AMI copies is listed before any is deleted."""
+    images = [
+        {'ImageId': f'ami-{n}', 'BlockDeviceMappings': [
+            {'Ebs': {'SnapshotId': f'snap-{n}'}}, {'VirtualName': 'eph0'}]}
+        for n in range(3)
+    ]
+    client = aws_utils.aws_client('CUSTOMER1', 'ec2')
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            'describe_images', {'Images': images[:2], 'NextToken': 'page-2'})
+        stubber.add_response('describe_images', {'Images': images[2:]})
+        for n in range(3):
+            stubber.add_response(
+                'deregister_image', {}, {'ImageId': f'ami-{n}'})
+            stubber.add_response(
+                'delete_snapshot', {}, {'SnapshotId': f'snap-{n}'})
+        aws_utils.clean_up_cloudigrade_ami_copies('CUSTOMER1')
+        stubber.assert_no_pending_responses()
@@ -0,0 +1,251 @@
+"""Unit tests for :mod:`integrade.cache`."""
+import asyncio
+import copy
+from unittest.mock import Mock
+
+import pytest
+
+import requests
+
+from integrade import api, tracing
+from integrade.cache import ResponseCache, Rule, ValidatorCache, identity
+from integrade.standin import serve
+from integrade.tests import urls
+
+URL = 'http://cloudigrade.example.com/api/v1/image/'
+
+
+def request(url=URL, **headers):
+    """Build a prepared GET request."""
+    return requests.Request('GET', url, headers=headers).prepare()
+
+
+def response(content=b'{"count": 0}', status=200, **headers):
+    """Build a response with a body, as the adapter does."""
+    result = api.APIResponse()
+    result.status_code = status
+    result.headers.update(headers)
+    result._content = content
+    return result
+
+
+def test_conditional_get():
+    """Test unchanged responses are revalidated instead of sent again."""
+    with serve() as server:
+        client = api.Client(
+            url=server.v1_url,
+            token=server.state.superuser_token,
+            session=api.new_session(),
+            response_handler=api.echo_handler,
+        )
+        first = client.get(urls.IMAGE)
+        second = client.get(urls.IMAGE)
+        stats = api.cache_stats(client.session)
+    assert not first.from_cache
+    assert second.from_cache
+    assert second.status_code == 200
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.request.headers['If-None-Match'] == first.headers['ETag']
+    assert second.shared_json() is first.shared_json()
+    assert second.json() == first.json()
+    assert second.json() is not first.json()
+    record = tracing.buffer().records()[-1]
+    assert (record.status, record.bytes) == (304, 0)
+    assert stats == {'hits': 1, 'unchanged': 0, 'misses': 1, 'entries': 1}
+
+
+def test_unchanged_bodies_are_decoded_once():
+    """Test responses with the same body share their decoded value."""
+    cache = ValidatorCache()
+    first = response()
+    cache.update(request(), first, cache.prepare(request()))
+    second = response()
+    cache.update(request(), second, cache.prepare(request()))
+    assert second.shared_json() is first.shared_json()
+    assert cache.stats()['unchanged'] == 1
+    with pytest.raises(TypeError):
+        second.shared_json()['count'] = 1
+    assert copy.deepcopy(second.shared_json()) == {'count': 0}
+    assert second.json(parse_int=str) == {'count': '0'}
+
+    changed = response(b'{"count": 1}')
+    cache.update(request(), changed, cache.prepare(request()))
+    assert changed.json() == {'count': 1}
+    assert cache.stats()['misses'] == 2
+
+
+def test_json_is_mutable():
+    """Test json() hands out values of its own even when cached."""
+    cache = ValidatorCache()
+    first = response()
+    cache.update(request(), first, cache.prepare(request()))
+    second = response()
+    cache.update(request(), second, cache.prepare(request()))
+    second.json()['count'] = 1
+    assert second.json() == {'count': 0}
+    assert first.json() == {'count': 0}
+    assert first.shared_json() == {'count': 0}
+    uncached = response()
+    with pytest.raises(TypeError):
+        uncached.shared_json()['count'] = 1
+    uncached.json()['count'] = 1
+    assert uncached.shared_json() == {'count': 0}
+    assert cache.stats()['unchanged'] == 1
+
+
+def test_keys():
+    """Test responses are cached per URL, query and credentials."""
+    cache = ValidatorCache()
+    cache.update(request(), response(ETag='"a"'))
+    assert cache.prepare(request(Authorization='Token other')) is None
+    assert cache.prepare(request(URL + '?page=2')) is None
+    own = request()
+    assert cache.prepare(own) is not None
+    assert own.headers['If-None-Match'] == '"a"'
+
+
+def test_what_is_not_cached():
+    """Test which requests and responses are left alone."""
+    cache = ValidatorCache()
+    cache.update(request(), response(**{'Cache-Control': 'no-store'}))
+    cache.update(request(URL + '1/'), response(status=404))
+    assert len(cache) == 0
+
+    cache.update(request(), response(ETag='"a"'))
+    conditional = request(**{'If-None-Match': '"b"'})
+    assert cache.prepare(conditional) is None
+    assert conditional.headers['If-None-Match'] == '"b"'
+    not_modified = response(b'', status=304)
+    cache.update(conditional, not_modified)
+    assert not_modified.status_code == 304
+    assert not not_modified.from_cache
+
+
+def test_least_recently_used_are_dropped():
+    """Test the cache keeps at most ``size`` responses."""
+    cache = ValidatorCache(size=2)
+    for page in range(3):
+        cache.update(request(f'{URL}?page={page}'), response())
+        cache.get(request(f'{URL}?page=0'))
+    assert len(cache) == 2
+    assert cache.get(request(f'{URL}?page=0')) is not None
+    assert cache.get(request(f'{URL}?page=1')) is None
+
+
+def test_disabled():
+    """Test sessions have no cache when it is disabled."""
+    session = api.new_session({'http_cache': False})
+    assert session.get_adapter('http://').cache is None
+    assert api.cache_stats(session)['entries'] == 0
+
+
+def test_response_cache():
+    """Test GET responses are answered from memory until they expire."""
+    clock = Mock(return_value=0)
+    cache = ResponseCache({urls.SYSCONFIG: 10}, clock=clock)
+    send = Mock(side_effect=lambda: response())
+    url = 'http://example.com' + urls.SYSCONFIG
+    first = cache.send('GET', url, send)
+    assert cache.send('get', url, send) is first
+    assert send.call_count == 1
+    assert cache.send('GET', url, send, params={'page': 2}) is not first
+    assert cache.send('GET', url, send, auth_identity='other') is not first
+    clock.return_value = 10
+    assert cache.send('GET', url, send) is not first
+    assert send.call_count == 4
+    assert cache.stats() == {
+        'hits': 1, 'misses': 4, 'invalidated': 0, 'entries': 3}
+
+    cache.send('GET', 'http://example.com' + urls.IMAGE, send)
+    assert cache.stats()['entries'] == 3
+    failed = Mock(return_value=response(status=500))
+    cache.send('GET', url + '?fail', failed)
+    assert cache.stats()['entries'] == 3
+
+
+def test_rules():
+    """Test rules match the end of paths, and keep their own responses."""
+    cache = ResponseCache({
+        'images/<id>/': Rule(ttl=60, size=2),
+        urls.AUTH_ME: 60,
+    })
+    send = Mock(side_effect=lambda: response())
+    for image_id in range(3):
+        cache.send('GET', f'http://example.com/v2/images/{image_id}/', send)
+    cache.send('GET', 'http://example.com' + urls.AUTH_ME, send)
+    assert cache.stats('images/<id>/')['entries'] == 2
+    assert cache.stats(urls.AUTH_ME)['entries'] == 1
+
+
+def test_invalidation():
+    """Test changes drop the cached responses of the related paths."""
+    cache = ResponseCache({'/api/v1/image/': 60, '/api/v1/image/<id>/': 60})
+    send = Mock(side_effect=lambda: response())
+    for path in ('', '12/', '13/'):
+        cache.send('GET', f'http://example.com/api/v1/image/{path}', send)
+    cache.send('HEAD', 'http://example.com/api/v1/image/12/', send)
+    assert cache.stats()['entries'] == 3
+    cache.send('PATCH', 'http://example.com/api/v1/image/12/', send)
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['invalidated'] == 2
+    failed = Mock(side_effect=requests.exceptions.ConnectionError())
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cache.send('POST', 'http://example.com/api/v1/image/', failed)
+    assert cache.stats()['entries'] == 0
+
+
+def test_identity():
+    """Test the identity of a request depends on its credentials only."""
+    assert identity() == identity({}, None)
+    assert identity(auth=('user', 'a')) != identity(auth=('user', 'b'))
+    assert identity(auth=api.TokenAuth('a')) == identity(
+        auth=api.TokenAuth('a'))
+    assert identity({'Authorization': 'Token a'}) != identity()
+
+
+def test_clients_use_the_cache():
+    """Test the clients answer GET requests from their cache."""
+    with serve() as server:
+        cache = ResponseCache({urls.SYSCONFIG: 60, 'images/': 60})
+        client = api.Client(
+            url=server.v1_url,
+            token=server.state.superuser_token,
+            session=api.new_session({'http_cache': False}),
+            cache=cache,
+        )
+        assert client.get(urls.SYSCONFIG) is client.get(urls.SYSCONFIG)
+        reader = api.Client(
+            url=server.v1_url,
+            token=server.state.superuser_token,
+            response_handler=api.json_handler,
+            session=client.session,
+            cache=cache,
+        )
+        sysconfig = reader.get(urls.SYSCONFIG)
+        sysconfig.clear()
+        assert reader.get(urls.SYSCONFIG) != sysconfig
+        other = api.Client(
+            url=server.v1_url,
+            authenticate=False,
+            response_handler=api.echo_handler,
+            session=client.session,
+            cache=cache,
+        )
+        assert other.get(urls.SYSCONFIG).status_code == 401
+        v2 = api.ClientV2(url=server.v2_url, branch='master',
+                          auth=('user@example.com', 'secret'),
+                          session=client.session, cache=cache)
+        assert v2.request('get', 'images/') is v2.request('get', 'images/')
+
+        async def fetch_twice():
+            async with api.AsyncClient.from_client(
+                    client, response_handler=api.echo_handler) as async_client:
+                return [
+                    await async_client.get(urls.SYSCONFIG) for _ in range(2)]
+
+        first, second = asyncio.run(fetch_twice())
+    # The async client has the token of the first one, so shares its
+    # responses.
+    assert first is second
+    assert cache.stats() == {
+        'hits': 6, 'misses': 3, 'invalidated': 0, 'entries': 2}
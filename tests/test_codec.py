@@ -0,0 +1,90 @@
+"""Unit tests for :mod:`integrade.codec`."""
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+import requests
+
+from integrade import api, codec
+from integrade.exceptions import MissingConfigurationError
+from integrade.retry import RetryPolicy
+
+DOCUMENT = {
+    'count': 2,
+    'results': [
+        {'id': 1, 'name': 'rhel', 'inspection_json': '{"rhel": true}'},
+        {'id': 2, 'name': 'café', 'rhel': None, 'score': 0.5},
+    ],
+}
+
+
+@pytest.mark.parametrize('name', sorted(codec.CODECS))
+def test_codecs(name):
+    """Test every codec decodes what the others encode."""
+    if name == 'orjson':
+        pytest.importorskip('orjson')
+    json_codec = codec.get_codec(name)
+    assert json_codec.name == name
+    encoded = json_codec.dumps(DOCUMENT)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == DOCUMENT
+    assert json_codec.loads(json.dumps(DOCUMENT).encode('utf-8')) == DOCUMENT
+    with pytest.raises(json.JSONDecodeError):
+        json_codec.loads(b'{"count":')
+
+
+def test_get_codec():
+    """Test codecs are picked by name, orjson only if installed."""
+    with patch.dict('sys.modules', {'orjson': None}):
+        assert codec.get_codec().name == 'json'
+        with pytest.raises(MissingConfigurationError):
+            codec.get_codec('orjson')
+    with pytest.raises(MissingConfigurationError):
+        codec.get_codec('yaml')
+
+
+def test_decode():
+    """Test bodies in other encodings than UTF-8 are decoded."""
+    body = json.dumps(DOCUMENT, ensure_ascii=False)
+    assert codec.decode(body.encode('utf-8')) == DOCUMENT
+    assert codec.decode(body.encode('latin-1'), 'ISO-8859-1') == DOCUMENT
+
+
+def test_responses_decode_values_of_their_own():
+    """Test json decodes a new value on each call, shared_json only once."""
+    response = api.APIResponse()
+    response._content = json.dumps(DOCUMENT).encode('utf-8')
+    response.encoding = 'utf-8'
+    first = response.json()
+    first['results'].clear()
+    assert response.json() == DOCUMENT
+    with patch.object(codec, 'decode', wraps=codec.decode) as decode:
+        assert response.shared_json() is response.shared_json()
+        decode.assert_called_once()
+    assert response.json(parse_float=str)['results'][1]['score'] == '0.5'
+
+    response._content = b'Bad Gateway'
+    with pytest.raises(requests.exceptions.JSONDecodeError):
+        response.json()
+
+
+def test_payloads_are_encoded():
+    """Test the clients send payloads encoded by the codec."""
+    session = Mock()
+    session.request.return_value.status_code = 200
+    client = api.Client(url='http://example.com/', authenticate=False,
+                        session=session, retry=RetryPolicy(total=0))
+    client.post('image/', DOCUMENT)
+    kwargs = session.request.call_args[1]
+    assert 'json' not in kwargs
+    assert kwargs['data'] == codec.encode(DOCUMENT)
+    assert kwargs['headers']['Content-Type'] == 'application/json'
+
+    client = api.ClientV2(url='http://example.com/', branch='master',
+                          auth=(), session=session,
+                          retry=RetryPolicy(total=0))
+    client.request('patch', 'images/1/', json={'rhel': True})
+    kwargs = session.request.call_args[1]
+    assert json.loads(kwargs['data']) == {'rhel': True}
+    assert 'Content-Type' not in client.headers
@@ -1,7 +1,9 @@
 """Unit tests for :mod:`integrade.config`."""
 import os
+import pickle
 import random
 import time
+from copy import deepcopy
 from unittest import mock
 
 import pytest
@@ -61,6 +63,8 @@ def test_get_config(ssl, protocol):
                 f'{cloudtrail_prefix}{account_number}'
             )
             assert cfg['cloudigrade_s3_bucket'] == bucket_name
+            assert cfg['superuser_token'] == token
+            assert cfg['api_v2_url'] is None
 
 
 def test_get_aws_image_config():
@@ -73,3 +77,61 @@ def test_get_aws_image_config():
                     read_data=MOCK_AWS_CONFIG)):
                 config._AWS_CONFIG = None  # reset cache to force reload
                 assert config.get_aws_image_config() == aws_image_config
+
+
+def test_get_config_is_read_only():
+    """The config is a shared view that can not be changed by mistake."""
+    cached = {
+        'base_url': 'example.com',
+        'aws_profiles': [{'name': 'CUSTOMER1', 'images': {'rhel': []}}],
+        'credentials': ('user', 'password'),
+    }
+    with mock.patch.object(config, '_CONFIG', cached):
+        cfg = config.get_config()
+        assert cfg == cached
+        assert cfg is config.get_config()
+        profile = cfg['aws_profiles'][0]
+        with pytest.raises(TypeError):
+            cfg['base_url'] = 'other.example.com'
+        with pytest.raises(TypeError):
+            cfg.update(base_url='other.example.com')
+        with pytest.raises(TypeError):
+            profile['account_number'] = 123
+        with pytest.raises(TypeError):
+            cfg['aws_profiles'].append({})
+        with pytest.raises(TypeError):
+            profile['images']['rhel'].append({})
+        assert cfg == cached
+
+
+def test_get_config_mutable():
+    """A mutable copy can be asked for and changed freely."""
+    cached = {'base_url': 'example.com', 'aws_profiles': [{'name': 'C1'}]}
+    with mock.patch.object(config, '_CONFIG', cached):
+        cfg = config.get_config(mutable=True)
+        assert cfg == cached
+        cfg['aws_profiles'][0]['name'] = 'C2'
+        assert cached['aws_profiles'][0]['name'] == 'C1'
+        assert config.get_config()['aws_profiles'][0]['name'] == 'C1'
+
+        profile = deepcopy(config.get_config()['aws_profiles'][0])
+        profile['account_number'] = 123
+        assert type(profile) is dict
+
+
+def test_get_config_follows_cache():
+    """The read-only view is rebuilt when the cache is replaced."""
+    with mock.patch.object(config, '_CONFIG', {'base_url': 'a.example.com'}):
+        assert config.get_config()['base_url'] == 'a.example.com'
+    with mock.patch.object(config, '_CONFIG', {'base_url': 'b.example.com'}):
+        assert config.get_config()['base_url'] == 'b.example.com'
+
+
+def test_frozen_pickle():
+    """Frozen config objects survive being sent to other processes."""
+    frozen = config.freeze({'profiles': [{'name': 'C1'}], 'n': (1, 2)})
+    unpickled = pickle.loads(pickle.dumps(frozen))
+    assert unpickled == frozen
+    assert isinstance(unpickled, config.FrozenDict)
+    assert isinstance(unpickled['profiles'], config.FrozenList)
+    assert config.thaw(frozen) == {'profiles': [{'name': 'C1'}], 'n': (1, 2)}
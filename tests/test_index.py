@@ -0,0 +1,70 @@
+"""Unit tests for :mod:`integrade.index`."""
+from integrade.index import ObjectIndex, object_field
+
+
+V1_IMAGES = [
+    {'id': 1, 'ec2_ami_id': 'ami-1', 'status': 'pending'},
+    {'id': 2, 'ec2_ami_id': 'ami-2', 'status': 'inspected'},
+]
+
+V2_INSTANCES = [
+    {'instance_id': 1, 'content_object': {'ec2_instance_id': 'i-1'}},
+    {'instance_id': 2, 'content_object': {'ec2_instance_id': 'i-2'}},
+    {'instance_id': 3, 'content_object': {'ec2_instance_id': 'i-2'}},
+]
+
+
+def counting(objects, consumed):
+    """Yield ``objects`` while recording how many were consumed."""
+    for obj in objects:
+        consumed.append(obj)
+        yield obj
+
+
+def test_object_field():
+    """Test fields are found at the top level or in the content object."""
+    assert object_field(V1_IMAGES[0], 'ec2_ami_id') == 'ami-1'
+    assert object_field(V2_INSTANCES[0], 'ec2_instance_id') == 'i-1'
+    assert object_field(V2_INSTANCES[0], 'account_arn') is None
+    assert object_field({'content_object': None}, 'account_arn', 0) == 0
+
+
+def test_get():
+    """Test looking objects up by indexed fields."""
+    images = ObjectIndex(V1_IMAGES)
+    assert images.get('ec2_ami_id', 'ami-2') is V1_IMAGES[1]
+    assert images.get('ec2_ami_id', 'ami-3') is None
+    assert images.get('ec2_ami_id', 'ami-3', 'nope') == 'nope'
+    assert ('ec2_ami_id', 'ami-1') in images
+    assert ('ec2_ami_id', 'ami-3') not in images
+
+    instances = ObjectIndex(V2_INSTANCES)
+    assert instances.get('ec2_instance_id', 'i-2') is V2_INSTANCES[1]
+    assert instances.get_all('ec2_instance_id', 'i-2') == V2_INSTANCES[1:]
+
+
+def test_lazy_consumption():
+    """Test lookups only consume objects until they find a match."""
+    consumed = []
+    instances = ObjectIndex(counting(V2_INSTANCES, consumed))
+    assert bool(instances)
+    assert len(consumed) == 1
+    assert instances.get('ec2_instance_id', 'i-1') is V2_INSTANCES[0]
+    assert len(consumed) == 1
+    assert instances.get('ec2_instance_id', 'i-2') is V2_INSTANCES[1]
+    assert len(consumed) == 2
+    assert list(instances) == V2_INSTANCES
+    assert len(consumed) == 3
+    assert len(instances) == 3
+    assert len(consumed) == 3
+
+
+def test_incremental_updates():
+    """Test objects added later are indexed too."""
+    images = ObjectIndex()
+    assert not images
+    images.extend(V1_IMAGES[:1])
+    assert images.get('ec2_ami_id', 'ami-2') is None
+    images.add(V1_IMAGES[1])
+    assert images.get('ec2_ami_id', 'ami-2') is V1_IMAGES[1]
+    assert list(images) == V1_IMAGES
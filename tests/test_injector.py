@@ -0,0 +1,84 @@
+"""Unit tests for :mod:`integrade.injector`."""
+import gzip
+import json
+
+import boto3
+
+from botocore.stub import ANY, Stubber
+
+import pytest
+
+from integrade.injector import (
+    EventInjector,
+    MOCK_EVENTS_PREFIX,
+    cloudtrail_record,
+)
+
+PROFILE = {'name': 'CUSTOMER1', 'account_number': '123456789012'}
+
+
+@pytest.fixture
+def s3():
+    """Build an s3 client recording the objects it is asked to put."""
+    client = boto3.client(
+        's3',
+        region_name='us-east-1',
+        aws_access_key_id='testing',
+        aws_secret_access_key='testing',
+    )
+    client.put = []
+    client.meta.events.register(
+        'provide-client-params.s3.PutObject',
+        lambda params, **kwargs: client.put.append(dict(params)))
+    return client
+
+
+def test_records_are_packed(s3):
+    """Test records are uploaded as gzipped logs of up to N records."""
+    with Stubber(s3) as stubber:
+        for _ in range(3):
+            stubber.add_response('put_object', {}, {
+                'Bucket': 'cloudigrade-bucket', 'Key': ANY, 'Body': ANY})
+        with EventInjector('cloudigrade-bucket', s3, records_per_object=2,
+                           max_workers=1) as injector:
+            for n in range(5):
+                injector.add_event(f'i-{n}', PROFILE, 'RunInstances')
+        stubber.assert_no_pending_responses()
+
+    assert [params['Key'] for params in s3.put] == injector.keys
+    for key in injector.keys:
+        assert key.startswith(MOCK_EVENTS_PREFIX + '/')
+        assert key.endswith('.json.gz')
+    assert len(set(injector.keys)) == 3
+    logs = [json.loads(gzip.decompress(params['Body'])) for params in s3.put]
+    instance_ids = [
+        [record['responseElements']['instancesSet']['items'][0]['instanceId']
+         for record in log['Records']]
+        for log in logs
+    ]
+    assert instance_ids == [['i-0', 'i-1'], ['i-2', 'i-3'], ['i-4']]
+    expected = cloudtrail_record('i-0', PROFILE, 'RunInstances')
+    del expected['eventTime']
+    assert {
+        name: value for name, value in logs[0]['Records'][0].items()
+        if name != 'eventTime'
+    } == expected
+    assert injector.records == 5
+    assert injector.bytes == sum(len(params['Body']) for params in s3.put)
+
+
+def test_raw_data(s3):
+    """Test raw data is uploaded under its name, gzipped only if asked."""
+    with Stubber(s3) as stubber:
+        for key in ('bad.json.gz', 'text.json.gz'):
+            stubber.add_response('put_object', {}, {
+                'Bucket': 'bucket',
+                'Key': f'{MOCK_EVENTS_PREFIX}/{key}',
+                'Body': ANY,
+            })
+        with EventInjector('bucket', s3, max_workers=1) as injector:
+            injector.put(b'"{}', name='bad')
+            injector.put(b'bad!', gzipped=False, name='text')
+    assert gzip.decompress(s3.put[0]['Body']) == b'"{}'
+    assert s3.put[1]['Body'] == b'bad!'
+    assert injector.records == 0
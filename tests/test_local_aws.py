@@ -0,0 +1,147 @@
+"""Unit tests for :mod:`integrade.local_aws`."""
+from unittest.mock import patch
+
+import pytest
+
+from integrade import config, injector
+from integrade.local_aws import (
+    LocalAWS,
+    default_client,
+    local_backend,
+    stop_local_backend,
+)
+from integrade.tests import aws_utils
+
+pytest.importorskip('moto')
+
+CONFIG = {
+    'aws_backend': 'local',
+    'local_aws_delays': {},
+    'aws_max_concurrency': 8,
+    'aws_profiles': [],
+    'cloudigrade_s3_bucket': 'cloudigrade-bucket',
+}
+
+
+class FakeClock(object):
+    """A clock moved forward by hand."""
+
+    def __init__(self):
+        """Start at 0."""
+        self.now = 0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+
+@pytest.fixture
+def local_config():
+    """Configure the local backend, and stop it after the test."""
+    with patch.object(config, '_CONFIG', dict(CONFIG)):
+        aws_utils.clear_aws_cache()
+        yield
+        stop_local_backend()
+        aws_utils.clear_aws_cache()
+        injector._S3_CLIENT = None
+
+
+@pytest.fixture
+def backend():
+    """Run a local AWS with delays, on a fake clock."""
+    clock = FakeClock()
+    backend = LocalAWS(
+        {'pending': 10, 'stopping': 5, 'shutting-down': 5}, clock=clock)
+    backend.start()
+    yield backend
+    backend.stop()
+
+
+def states(client, instance_ids):
+    """Describe the states of instances."""
+    return [
+        instance['State']['Name']
+        for reservation in client.describe_instances(
+            InstanceIds=instance_ids)['Reservations']
+        for instance in reservation['Instances']
+    ]
+
+
+def test_delayed_transitions(backend):
+    """Test instances stay in transition states for the configured time."""
+    client = backend.session().client('ec2')
+    instance_ids = [
+        instance['InstanceId'] for instance in client.run_instances(
+            ImageId='ami-12345678', MinCount=3, MaxCount=3)['Instances']
+    ]
+    assert states(client, instance_ids) == ['pending'] * 3
+    backend.clock.now = 9.9
+    assert states(client, instance_ids) == ['pending'] * 3
+    backend.clock.now = 10
+    assert states(client, instance_ids) == ['running'] * 3
+
+    client.stop_instances(InstanceIds=instance_ids[:1])
+    client.terminate_instances(InstanceIds=instance_ids[1:])
+    assert states(client, instance_ids) == [
+        'stopping', 'shutting-down', 'shutting-down']
+    backend.clock.now = 15
+    assert states(client, instance_ids) == [
+        'stopped', 'terminated', 'terminated']
+
+
+def test_no_delays():
+    """Test states change at once without delays."""
+    backend = LocalAWS()
+    backend.start()
+    try:
+        client = backend.session().client('ec2')
+        instance_id = client.run_instances(
+            ImageId='ami-12345678', MinCount=1, MaxCount=1,
+        )['Instances'][0]['InstanceId']
+        assert states(client, [instance_id]) == ['running']
+    finally:
+        backend.stop()
+
+
+def test_local_backend_is_configured(local_config):
+    """Test the backend is only started when configured."""
+    backend = local_backend()
+    assert isinstance(backend, LocalAWS)
+    assert local_backend() is backend
+    with patch.object(config, '_CONFIG', dict(CONFIG, aws_backend='aws')):
+        assert local_backend() is None
+
+
+def test_aws_utils_lifecycle(local_config):
+    """Test aws_utils runs, waits on and reaps many instances locally."""
+    client = aws_utils.aws_client('CUSTOMER1', 'ec2')
+    instance_ids = [
+        instance['InstanceId']
+        for _ in range(2)
+        for instance in client.run_instances(
+            ImageId='ami-12345678', MinCount=100, MaxCount=100)['Instances']
+    ]
+    aws_utils.wait_until_all_running(
+        [('CUSTOMER1', instance_id) for instance_id in instance_ids])
+    assert len(list(aws_utils.iter_instance_ids(
+        'CUSTOMER1', states=['running']))) == 200
+
+    aws_utils.terminate_all_instances('CUSTOMER1')
+    assert set(aws_utils.describe_instance_states(
+        'CUSTOMER1', instance_ids).values()) == {'terminated'}
+
+
+def test_injector(local_config):
+    """Test the injector uploads to the local s3."""
+    s3 = default_client('s3')
+    s3.create_bucket(Bucket='cloudigrade-bucket')
+    with injector.EventInjector(records_per_object=10) as event_injector:
+        for i in range(25):
+            event_injector.add_event(
+                f'i-{i}', {'account_number': '123456789012'}, 'RunInstances')
+    keys = [
+        obj['Key'] for obj in s3.list_objects_v2(
+            Bucket='cloudigrade-bucket')['Contents']
+    ]
+    assert sorted(keys) == sorted(event_injector.keys)
+    assert len(keys) == 3
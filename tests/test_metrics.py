@@ -0,0 +1,144 @@
+"""Unit tests for :mod:`integrade.metrics`."""
+import json
+import threading
+
+import pytest
+
+from integrade import api, metrics
+from integrade.standin import serve
+from integrade.waiters import MultiWaiter
+
+
+@pytest.fixture
+def registry():
+    """Provide a registry without the samples of other tests."""
+    registry = metrics.registry()
+    registry.clear()
+    yield registry
+    registry.clear()
+
+
+def series(registry):
+    """Map the (name, labels) of each series to its stats."""
+    return {
+        (item['name'], tuple(sorted(item['labels'].items()))): item
+        for item in registry.to_json()['series']
+    }
+
+
+def test_stats():
+    """Test percentiles, max and sum of a series."""
+    registry = metrics.Registry()
+    for i in range(1, 101):
+        registry.observe('step', i / 100)
+    stats, = registry.to_json()['series']
+    assert stats['count'] == 100
+    assert stats['sum'] == pytest.approx(50.5)
+    assert stats['max'] == 1
+    assert stats['p50'] == pytest.approx(0.505)
+    assert stats['p95'] == pytest.approx(0.9505)
+    assert stats['p99'] == pytest.approx(0.9901)
+
+
+def test_nested_spans_and_attribution(registry):
+    """Test spans know their parent and the test they ran in."""
+    with metrics.attribute('test_a'):
+        with metrics.span('outer'):
+            with metrics.span('inner', kind='x'):
+                pass
+            with metrics.span('inner', kind='x'):
+                pass
+    with metrics.span('outer'):
+        pass
+    assert {
+        key: item['count'] for key, item in series(registry).items()
+    } == {
+        ('outer', (('test', 'test_a'),)): 1,
+        ('inner', (('kind', 'x'), ('parent', 'outer'),
+                   ('test', 'test_a'))): 2,
+        ('outer', ()): 1,
+    }
+    rows = [line.split()[:3] for line in registry.report().splitlines()]
+    assert ['outer', '2'] in [row[:2] for row in rows]
+    assert ['inner', 'kind=x', '2'] in rows
+
+
+def test_threads(registry):
+    """Test samples of many threads are all recorded."""
+    @metrics.span('work')
+    def work():
+        pass
+
+    def worker():
+        for _ in range(1000):
+            work()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert series(registry)[('work', ())]['count'] == 4000
+
+
+def test_prometheus():
+    """Test the series are exported as Prometheus summaries."""
+    registry = metrics.Registry()
+    registry.observe('api.request', 0.5, {'endpoint': '/api/v1/"x"/'})
+    lines = registry.to_prometheus().splitlines()
+    assert '# TYPE integrade_span_seconds summary' in lines
+    assert (
+        'integrade_span_seconds{endpoint="/api/v1/\\"x\\"/",'
+        'name="api.request",quantile="0.99"} 0.5'
+    ) in lines
+    assert (
+        'integrade_span_seconds_count{endpoint="/api/v1/\\"x\\"/",'
+        'name="api.request"} 1'
+    ) in lines
+
+
+def test_dump_and_load(registry, tmpdir):
+    """Test the samples of several processes are merged."""
+    registry.observe('step', 1)
+    metrics.dump(str(tmpdir))
+    other = metrics.Registry()
+    other.observe('step', 3)
+    tmpdir.join('metrics-0.json').write(
+        json.dumps(other.to_json(samples=True)))
+    stats, = metrics.load(str(tmpdir)).to_json()['series']
+    assert stats['count'] == 2
+    assert stats['sum'] == 4
+
+
+def test_endpoint():
+    """Test ids are removed from endpoints."""
+    assert metrics.endpoint('/api/v1/image/12/') == '/api/v1/image/<id>/'
+    assert metrics.endpoint(
+        '/v2/accounts/1b4e28ba-2fa1-11d2-883f-0016d3cca427'
+    ) == '/v2/accounts/<id>'
+    assert metrics.endpoint('/api/v1/report/images/') == (
+        '/api/v1/report/images/')
+
+
+def test_waiter_spans(registry):
+    """Test waits and the listings of their sources are recorded."""
+    waiter = MultiWaiter(timeout=1, sleep=lambda seconds: None)
+    waiter.add_source('images', lambda: ['ami-1'])
+    waiter.add('images', lambda images: 'ami-1' in images)
+    waiter.wait()
+    assert set(series(registry)) == {
+        ('waiter.wait', ()),
+        ('waiter.fetch', (('parent', 'waiter.wait'), ('source', 'images'))),
+    }
+
+
+def test_api_request_spans(registry):
+    """Test requests are recorded by method and endpoint."""
+    with serve() as server:
+        client = api.Client(url=server.v1_url, authenticate=False,
+                            response_handler=api.echo_handler)
+        client.get('images/12/')
+        client.get('images/13/')
+    stats = series(registry)[('api.request', (
+        ('endpoint', '/api/v1/images/<id>/'), ('method', 'GET')))]
+    assert stats['count'] == 2
@@ -0,0 +1,206 @@
+"""Unit tests for :mod:`integrade.retry`."""
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest.mock import Mock
+
+import pytest
+
+import requests
+
+from integrade import api, metrics
+from integrade.exceptions import CircuitOpenError
+from integrade.retry import CircuitBreaker, RetryPolicy, retry_after
+
+URL = 'http://cloudigrade.example.com/api/v1/image/12/'
+
+
+def response(status, **headers):
+    """Build a response with a status and headers."""
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers)
+    return result
+
+
+class Server(object):
+    """Answer requests with the given responses, or raise given errors."""
+
+    def __init__(self, *answers):
+        """Keep the answers, in order."""
+        self.answers = list(answers)
+        self.calls = 0
+
+    def __call__(self):
+        """Give the next answer."""
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def policy(**kwargs):
+    """Build a policy which does not sleep nor share breakers."""
+    sleeps = []
+    kwargs.setdefault('circuit_threshold', 0)
+    kwargs.setdefault('rng', random.Random(0))
+    retry = RetryPolicy(sleep=sleeps.append, **kwargs)
+    retry.sleeps = sleeps
+    return retry
+
+
+@pytest.fixture
+def registry():
+    """Provide the metrics registry without the samples of other tests."""
+    registry = metrics.registry()
+    registry.clear()
+    yield registry
+    registry.clear()
+
+
+def test_backoff_with_jitter(registry):
+    """Test transient statuses are retried with an exponential backoff."""
+    retry = policy(total=3, backoff=1)
+    server = Server(response(503), response(502), response(504),
+                    response(200))
+    assert retry.send('GET', URL, server).status_code == 200
+    assert server.calls == 4
+    assert len(set(retry.sleeps)) == 3
+    assert all(0 <= wait <= 2 ** i for i, wait in enumerate(retry.sleeps))
+    stats = {
+        item['labels']['reason']: item
+        for item in registry.to_json()['series']
+    }
+    assert stats['503']['count'] == 1
+    assert stats['503']['labels']['endpoint'] == '/api/v1/image/<id>/'
+    assert sum(item['sum'] for item in stats.values()) == pytest.approx(
+        sum(retry.sleeps))
+
+
+def test_gives_up():
+    """Test the last response is returned once the retries are exhausted."""
+    retry = policy(total=2)
+    server = Server(response(503), response(503), response(503))
+    assert retry.send('GET', URL, server).status_code == 503
+    assert server.calls == 3
+
+
+def test_other_statuses_are_not_retried():
+    """Test errors which are not transient are returned at once."""
+    retry = policy()
+    server = Server(response(500))
+    assert retry.send('GET', URL, server).status_code == 500
+    assert retry.sleeps == []
+
+
+def test_post_needs_opt_in():
+    """Test only idempotent methods are retried by default."""
+    server = Server(response(503), response(201))
+    assert policy().send('POST', URL, server).status_code == 503
+    retry = policy(methods=RetryPolicy.methods | {'POST'})
+    server = Server(response(503), response(201))
+    assert retry.send('post', URL, server).status_code == 201
+
+
+def test_retry_after():
+    """Test Retry-After is followed, in seconds or as a date."""
+    retry = policy(max_backoff=10)
+    server = Server(response(429, **{'Retry-After': '7'}), response(200))
+    assert retry.send('GET', URL, server).status_code == 200
+    assert retry.sleeps == [7]
+
+    now = datetime(2019, 1, 1, tzinfo=timezone.utc)
+    date = format_datetime(now + timedelta(seconds=90), usegmt=True)
+    assert retry_after(response(503, **{'Retry-After': date}), now) == 90
+    assert retry_after(response(503, **{'Retry-After': 'soon'})) is None
+
+    server = Server(response(503, **{'Retry-After': '3600'}))
+    assert retry.send('GET', URL, server).status_code == 503
+
+
+def test_connection_errors():
+    """Test connection errors are retried, then raised."""
+    retry = policy(total=1)
+    server = Server(requests.exceptions.ConnectionError(), response(200))
+    assert retry.send('DELETE', URL, server).status_code == 200
+    server = Server(requests.exceptions.ConnectTimeout(),
+                    requests.exceptions.ConnectionError('down'))
+    with pytest.raises(requests.exceptions.ConnectionError, match='down'):
+        retry.send('GET', URL, server)
+
+
+def test_circuit_breaker():
+    """Test a host failing repeatedly is not sent requests for a while."""
+    clock = Mock(return_value=0)
+    breaker = CircuitBreaker('example.com', threshold=3, reset_timeout=10,
+                             clock=clock)
+    for _ in range(2):
+        breaker.failure()
+    breaker.check()
+    breaker.failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.retry_in == 10
+
+    clock.return_value = 10
+    breaker.check()  # the trial request
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    clock.return_value = 20
+    breaker.check()
+    breaker.success()
+    assert breaker.state == 'closed'
+
+
+def test_breaker_fails_fast():
+    """Test requests are not sent while the circuit of their host is open."""
+    retry = policy(total=1, circuit_threshold=2)
+    breaker = retry.breaker('http://down.example.com/')
+    breaker.success()
+    server = Server(*[response(503)] * 4)
+    assert retry.send(
+        'GET', 'http://down.example.com/', server).status_code == 503
+    # The retry of a request does not count as a failure of its own.
+    assert (breaker.failures, breaker.state) == (1, 'closed')
+    assert retry.send(
+        'GET', 'http://down.example.com/', server).status_code == 503
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        retry.send('GET', 'http://down.example.com/', server)
+    assert server.calls == 4
+
+
+def test_send_async():
+    """Test coroutines are retried, knowing their attempt."""
+    attempts = []
+
+    async def send_once(attempt):
+        attempts.append(attempt)
+        return response(503 if attempt < 2 else 200)
+
+    retry = RetryPolicy(backoff=0.001, circuit_threshold=0)
+    result = asyncio.run(retry.send_async('GET', URL, send_once))
+    assert result.status_code == 200
+    assert attempts == [0, 1, 2]
+
+
+def test_clients_retry():
+    """Test the clients send requests through their retry policy."""
+    session = Mock()
+    session.request.side_effect = [response(503), response(200)]
+    client = api.Client(url='http://example.com/', authenticate=False,
+                        session=session, retry=policy())
+    assert client.get('image/').status_code == 200
+    assert session.request.call_count == 2
+
+    session.request.side_effect = [response(503), response(200)]
+    client = api.ClientV2(url='http://example.com/', branch='master',
+                          auth=(), session=session, retry=policy())
+    assert client.request('get', 'images/').status_code == 200
+    assert session.request.call_count == 4
@@ -0,0 +1,212 @@
+"""Unit tests for :mod:`integrade.standin`."""
+from unittest.mock import patch
+from urllib.parse import urljoin
+
+import pytest
+
+import requests
+
+from integrade import api, config
+from integrade.standin import CloudigradeState, serve
+from integrade.tests import urls
+from integrade.utils import uuid4
+
+ARN = 'arn:aws:iam::439727791560:role/customer'
+
+CONFIG = {
+    'base_url': '',
+    'scheme': 'http',
+    'ssl-verify': False,
+    'api_version': 'v1',
+    'credentials': ('user@example.com', 'password'),
+}
+
+
+class FakeClock(object):
+    """A clock moved forward by hand."""
+
+    def __init__(self):
+        """Start at 0."""
+        self.now = 0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Provide the clock the stand-in images progress with."""
+    return FakeClock()
+
+
+@pytest.fixture
+def server(clock):
+    """Run a stand-in server with a few instances in an AWS account."""
+    state = CloudigradeState(
+        inspection_delays={'pending': 1, 'preparing': 2, 'inspecting': 3},
+        page_size=4,
+        clock=clock,
+    )
+    for i in range(9):
+        state.add_aws_instance(
+            ARN, ec2_ami_id=f'ami-{i % 3}', rhel=i % 3 == 0)
+    with serve(state) as server:
+        with patch.object(config, '_CONFIG', dict(
+                CONFIG, base_url=server.base_url, api_v2_url=server.v2_url)):
+            yield server
+
+
+def test_v2_accounts_and_pagination(server):
+    """Test accounts discover their instances and lists are paginated."""
+    client = api.ClientV2(branch='master')
+    assert client.url == server.v2_url
+    response = client.request(
+        'post', 'accounts/', data={'account_arn': ARN, 'name': 'customer'})
+    assert response.status_code == 201
+    account = response.json()
+    assert account['content_object']['aws_account_id'] == '439727791560'
+
+    pages = list(client.iter_pages('instances/'))
+    assert [len(page['data']) for page in pages] == [4, 4, 1]
+    assert pages[0]['meta']['count'] == 9
+    images = list(client.iter_objects('images/'))
+    assert sorted(
+        image['content_object']['ec2_ami_id'] for image in images
+    ) == ['ami-0', 'ami-1', 'ami-2']
+
+    duplicate = api.ClientV2(
+        branch='master', response_handler=api.echo_handler).request(
+            'post', 'accounts/', data={'account_arn': ARN})
+    assert duplicate.status_code == 400
+
+    response = client.request('delete', f'accounts/{account["account_id"]}/')
+    assert response.status_code == 204
+    assert list(client.iter_objects('instances/')) == []
+    assert list(client.iter_objects('accounts/')) == []
+
+
+def test_v2_inspection(server, clock):
+    """Test images go through the inspection statuses with the clock."""
+    client = api.ClientV2(branch='master')
+    client.request('post', 'accounts/', data={'account_arn': ARN})
+    statuses = []
+    for now in (0, 1, 3, 5.9, 6):
+        clock.now = now
+        images = {
+            image['content_object']['ec2_ami_id']: image
+            for image in client.iter_objects('images/')
+        }
+        statuses.append(images['ami-0']['status'])
+    assert statuses == [
+        'pending', 'preparing', 'inspecting', 'inspecting', 'inspected']
+    assert images['ami-0']['rhel'] is True
+    assert images['ami-1']['rhel'] is False
+
+
+def test_v2_authentication(server):
+    """Test v2 requests need credentials."""
+    client = api.ClientV2(
+        branch='master', auth=(), response_handler=api.echo_handler)
+    assert client.request('get', 'sysconfig/').status_code == 401
+    assert api.ClientV2(branch='master').request(
+        'get', 'sysconfig/').json()['aws_account_id'] == '123456789012'
+
+
+def test_v1_users_and_accounts(server):
+    """Test the v1 flow of creating a user, a token and an account."""
+    client = api.Client(authenticate=False)
+    user = {'username': uuid4(), 'password': uuid4()}
+    assert client.post(urls.AUTH_USERS_CREATE, user).status_code == 201
+    token = client.post(urls.AUTH_TOKEN_CREATE, user).json()['auth_token']
+    auth = api.TokenAuth(token)
+    assert client.get(urls.AUTH_ME, auth=auth).json()[
+        'username'] == user['username']
+
+    client.post(urls.CLOUD_ACCOUNT, {'account_arn': ARN}, auth=auth)
+    instances = client.get(urls.INSTANCE, auth=auth).json()
+    assert instances['count'] == 9
+    assert len(instances['results']) == 4
+    second = requests.get(instances['next'], auth=auth).json()
+    assert second['previous'] and len(second['results']) == 4
+
+    superuser = api.Client(token=server.state.superuser_token)
+    assert len(superuser.get(urls.USER_LIST).json()['results']) == 2
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get(urls.USER_LIST, auth=auth)
+
+    unauthenticated = api.Client(
+        authenticate=False, response_handler=api.echo_handler)
+    response = unauthenticated.get(urls.SYSCONFIG)
+    assert response.status_code == 401
+    assert response.json() == {
+        'detail': 'Authentication credentials were not provided.'}
+
+
+def test_v1_events_and_account_deletion(server):
+    """Test events follow the instances, and accounts can be deleted."""
+    client = api.Client(token=server.state.superuser_token)
+    account = client.post(urls.CLOUD_ACCOUNT, {'account_arn': ARN}).json()
+    instance = client.get(urls.INSTANCE).json()['results'][0]
+    events = client.get(urls.EVENT, params={'page_size': 20}).json()
+    assert events['count'] == 9
+    assert {event['event_type'] for event in events['results']} == {
+        'power_on'}
+    event = events['results'][0]
+    assert event['instance'] == instance['url']
+    assert client.get(
+        f'{urls.EVENT}{event["id"]}/').json()['event_type'] == 'power_on'
+
+    server.state.record_event(instance['ec2_instance_id'], 'power_off')
+    events = client.get(urls.EVENT, params={'page_size': 20}).json()
+    assert events['count'] == 10
+    assert events['results'][-1]['event_type'] == 'power_off'
+    assert events['results'][-1]['instance_id'] == instance['id']
+
+    # The conftest of the v1 tests deletes accounts without a trailing slash.
+    response = client.delete(urljoin(urls.CLOUD_ACCOUNT, str(account['id'])))
+    assert response.status_code == 204
+    assert client.get(urls.CLOUD_ACCOUNT).json()['count'] == 0
+    assert client.get(urls.EVENT).json()['count'] == 0
+    other = client.post(urls.CLOUD_ACCOUNT, {'account_arn': ARN}).json()
+    response = client.delete(f'{urls.CLOUD_ACCOUNT}{other["id"]}/')
+    assert response.status_code == 204
+
+
+def test_errors_leave_connections_usable(server):
+    """Test the body of a request answered with an error is consumed."""
+    session = requests.Session()
+    sysconfig = urljoin(server.v1_url, urls.SYSCONFIG)
+    headers = {'Authorization': f'Token {server.state.superuser_token}'}
+    assert session.get(sysconfig, headers=headers).status_code == 200
+    for method, path, status in (('post', '/api/v1/nothere/', 404),
+                                 ('patch', urls.SYSCONFIG, 405)):
+        response = session.request(
+            method, urljoin(server.v1_url, path), json={'name': 'x' * 100},
+            headers=headers)
+        assert response.status_code == status
+        assert session.get(sysconfig, headers=headers).status_code == 200
+
+
+def test_v1_reports(server, clock):
+    """Test reports count the runtime of inspected RHEL instances."""
+    client = api.Client(token=server.state.superuser_token)
+    account = client.post(urls.CLOUD_ACCOUNT, {'account_arn': ARN}).json()
+    clock.now = 10
+    params = {
+        'start': '2000-01-01T00:00Z',
+        'end': '2100-01-01T00:00Z',
+        'account_id': account['id'],
+    }
+    overview, = client.get(urls.REPORT_ACCOUNTS, params=params).json()[
+        'cloud_account_overviews']
+    assert overview['instances'] == 9
+    assert overview['images'] == 3
+    assert overview['rhel_instances'] == 3
+    images = client.get(urls.REPORT_IMAGES, params=params).json()['images']
+    assert sorted(image['instances_seen'] for image in images) == [3, 3, 3]
+    response = api.Client(
+        token=server.state.superuser_token,
+        response_handler=api.echo_handler,
+    ).get(urls.REPORT_IMAGES, params={'start': params['start']})
+    assert response.status_code == 400
@@ -0,0 +1,90 @@
+"""Unit tests for :mod:`integrade.tracing`."""
+import pytest
+
+import requests
+
+from integrade import api, metrics, tracing
+from integrade.retry import RetryPolicy
+from integrade.standin import serve
+
+
+@pytest.fixture
+def buffer():
+    """Provide the trace buffer without the records of other tests."""
+    buffer = tracing.buffer()
+    buffer.clear()
+    yield buffer
+    buffer.clear()
+
+
+def test_requests_are_traced(buffer):
+    """Test each request is recorded with its timings."""
+    with serve() as server:
+        client = api.Client(
+            url=server.v1_url,
+            authenticate=False,
+            response_handler=api.echo_handler,
+            session=api.new_session(),
+        )
+        with metrics.attribute('test_a'):
+            response = client.get('images/12/')
+            client.get('sysconfig/')
+    first, second = buffer.records()
+    assert first.method == 'GET'
+    assert first.endpoint == '/api/v1/images/<id>/'
+    assert first.status == response.status_code
+    assert first.bytes == len(response.content) > 0
+    assert first.connect is not None
+    assert first.tls is None
+    assert first.server <= first.elapsed
+    assert first.retries == 0
+    assert first.test == 'test_a'
+    assert first.error is None
+    assert second.endpoint == '/api/v1/sysconfig/'
+    assert second.connect is None
+
+
+def test_errors_are_traced(buffer):
+    """Test requests failing without a response are recorded."""
+    with serve() as server:
+        url = server.v1_url
+    client = api.Client(url=url, authenticate=False,
+                        retry=RetryPolicy(total=0, circuit_threshold=0))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get('sysconfig/')
+    record, = buffer.records()
+    assert record.status is None
+    assert record.error == 'ConnectionError'
+
+
+def test_ring_buffer(tmpdir):
+    """Test the buffer keeps the latest records and can be saved."""
+    buffer = tracing.TraceBuffer(size=3)
+    for i in range(5):
+        with tracing.trace('GET', f'/{i}/') as trace:
+            trace.status = 200
+        buffer.add(tracing.buffer().records()[-1])
+    assert [record.endpoint for record in buffer.records()] == [
+        '/2/', '/3/', '/4/']
+    assert buffer.dropped == 2
+    path = str(tmpdir.join('requests.jsonl'))
+    buffer.dump(path)
+    assert tracing.load(path) == buffer.records()
+
+
+def test_report():
+    """Test endpoints are reported slowest first."""
+    def record(endpoint, elapsed, status=200):
+        return tracing.RequestRecord(
+            0, 'GET', endpoint, status, 0, elapsed, None, None, elapsed, 0,
+            None, None)
+
+    lines = tracing.report([
+        record('/fast/', 0.1),
+        record('/slow/', 2),
+        record('/slow/', 1, status=500),
+    ]).splitlines()
+    assert lines[1].split() == [
+        'GET', '/slow/', '2', '1.500s', '2.000s', '1']
+    assert lines[2].split() == [
+        'GET', '/fast/', '1', '0.100s', '0.100s', '0']
@@ -0,0 +1,92 @@
+"""Unit tests for :mod:`integrade.usage`."""
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from integrade.injector import cloudtrail_record
+from integrade.usage import RangeSums, UsageModel, window
+
+NOW = datetime(2018, 11, 15, 13, 27, 42, tzinfo=timezone.utc)
+
+
+def overlap(run_start, run_end, start, end):
+    """Return the seconds of a run inside the days [start, end)."""
+    start = datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
+    end = datetime.combine(end, datetime.min.time(), tzinfo=timezone.utc)
+    seconds = (min(run_end, end) - max(run_start, start)).total_seconds()
+    return max(0, seconds)
+
+
+def test_range_sums():
+    """Test range additions and sums match a plain list."""
+    rng = random.Random(0)
+    sums = RangeSums()
+    days = [0] * 50
+    for _ in range(200):
+        first, last = sorted(rng.sample(range(51), 2))
+        value = rng.randint(-10, 10)
+        sums.add(first, last, value)
+        for day in range(first, last):
+            days[day] += value
+        first, last = sorted(rng.sample(range(51), 2))
+        assert sums.total(first, last) == sum(days[first:last])
+
+
+def test_usage_model():
+    """Test windows of any key match the runs summed up from scratch."""
+    rng = random.Random(1)
+    usage = UsageModel()
+    runs = []
+    for _ in range(300):
+        account = rng.choice(('111', '222'))
+        image = rng.choice(('ami-1', 'ami-2'))
+        instance = f'i-{rng.randint(0, 20)}'
+        start = NOW - timedelta(hours=rng.uniform(0, 24 * 60))
+        end = start + timedelta(hours=rng.uniform(0, 24 * 10))
+        if end > NOW or instance in {run[2] for run in runs}:
+            continue
+        usage.power_on(account, image, instance, start)
+        usage.power_off(account, instance, end)
+        runs.append((account, image, instance, start, end))
+    usage.power_on('111', 'ami-1', 'i-running', NOW - timedelta(days=3))
+    runs.append(('111', 'ami-1', 'i-running', NOW - timedelta(days=3), NOW))
+
+    for days in (1, 7, 30, 45, 90):
+        start, end = window(days, NOW)
+        for key in ((), ('111',), ('222', 'ami-2'), ('111', 'ami-1')):
+            expected = sum(
+                overlap(run[3], run[4], start, end)
+                for run in runs if run[:len(key)] == key
+            )
+            assert usage.seconds(start, end, *key, now=NOW) == \
+                pytest.approx(expected)
+        instance = runs[0][:3]
+        assert usage.hours(start, end, *instance, now=NOW) == pytest.approx(
+            overlap(runs[0][3], runs[0][4], start, end) / 3600)
+
+
+def test_usage_model_records():
+    """Test CloudTrail records power instances on and off."""
+    usage = UsageModel()
+    profile = {'account_number': '111'}
+    start = NOW - timedelta(days=2)
+    assert usage.add_record(cloudtrail_record(
+        'i-1', profile, 'RunInstances', start.isoformat(), 'ami-1'))
+    assert not usage.add_record(cloudtrail_record(
+        'i-1', profile, 'BadEvent', start.isoformat()))
+    assert usage.running('111') == {('111', 'ami-1', 'i-1'): start}
+    end = start + timedelta(hours=5)
+    assert usage.add_record(cloudtrail_record(
+        'i-1', profile, 'StopInstances', end.isoformat()))
+    assert usage.running() == {}
+    assert usage.events == 2
+    assert usage.hours(
+        date(2018, 11, 13), date(2018, 11, 14), '111', 'ami-1', 'i-1') == 5
+
+
+def test_usage_model_key():
+    """Test an image can't be asked for without its account."""
+    with pytest.raises(ValueError):
+        UsageModel().seconds(date(2018, 11, 1), date(2018, 11, 2),
+                             image='ami-1')
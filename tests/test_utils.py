@@ -1,15 +1,22 @@
 """Unit tests for :mod:`integrade.utils`."""
 import os
+import random
 import string
 import time
 from datetime import date
 from unittest.mock import patch
 
+import numpy
+
+import pytest
+
 from integrade.utils import (
     base_url,
+    events_to_arrays,
     flaky,
     gen_password,
     get_expected_hours_in_past_30_days,
+    get_expected_hours_in_past_30_days_batch,
     round_hours,
     uuid4
 )
@@ -95,6 +102,47 @@ def test_get_expected_hours_in_past_30_days():
         assert events == [2, 1]
 
 
+def test_events_to_arrays():
+    """Test histories are split in padded power on and off arrays."""
+    on, off = events_to_arrays([[12, 10, 2, None], [45, 30], [5], []])
+    numpy.testing.assert_array_equal(
+        on, [[12, 2], [45, numpy.nan], [numpy.nan] * 2, [numpy.nan] * 2])
+    numpy.testing.assert_array_equal(
+        off, [[10, numpy.nan], [30, numpy.nan], [numpy.nan] * 2,
+              [numpy.nan] * 2])
+
+
+@pytest.mark.parametrize('gmtoff', (-5 * 3600, 0, 5 * 3600 + 1800))
+@pytest.mark.parametrize('utc_tomorrow', (False, True))
+def test_get_expected_hours_in_past_30_days_batch(gmtoff, utc_tomorrow):
+    """Test the batch calculation matches the scalar one for each history."""
+    local = time.struct_time(
+        (2018, 11, 15, 13, 27, 42, 3, 319, 0, 'TZ', gmtoff))
+    rng = random.Random(gmtoff)
+    histories = []
+    for _ in range(200):
+        days = sorted(
+            (rng.choice((rng.randint(0, 45), rng.uniform(0, 45)))
+             for _ in range(rng.randint(0, 6))),
+            reverse=True)
+        if days and rng.random() < 0.5:
+            days.append(None)
+        histories.append(days)
+    histories += [[45, None], [30, None], [30, 29], [0, None], [5]]
+    on, off = events_to_arrays(histories)
+
+    hours, spare_min = get_expected_hours_in_past_30_days_batch(
+        on, off, (local, utc_tomorrow))
+
+    with patch('integrade.utils._local_now') as local_now:
+        local_now.return_value = (local, utc_tomorrow)
+        expected = [
+            get_expected_hours_in_past_30_days(list(events))[:2]
+            for events in histories
+        ]
+    assert list(zip(hours.tolist(), spare_min.tolist())) == expected
+
+
 def test_round_hours():
     """Test we round hours and minutes properly."""
     assert 1 == round_hours(1, 0)
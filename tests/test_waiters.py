@@ -0,0 +1,155 @@
+"""Unit tests for :mod:`integrade.waiters`."""
+import pytest
+
+from integrade.index import ObjectIndex
+from integrade.waiters import MultiWaiter
+
+
+class FakeClock(object):
+    """A clock that only moves forward when something sleeps."""
+
+    def __init__(self):
+        """Start at time zero with no recorded sleeps."""
+        self.now = 0
+        self.sleeps = []
+
+    def __call__(self):
+        """Return the current fake time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Record the sleep and advance the clock."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_waiter(clock, **kwargs):
+    """Build a waiter using the fake clock."""
+    kwargs.setdefault('timeout', 100)
+    return MultiWaiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_lists_each_source_once_per_tick():
+    """Test that many conditions on one source share a single listing."""
+    clock = FakeClock()
+    listings = iter([[], ['a'], ['a', 'b', 'c']])
+    calls = []
+
+    def fetch():
+        calls.append(clock())
+        return next(listings)
+
+    waiter = make_waiter(clock)
+    waiter.add_source('things', fetch)
+    conditions = [
+        waiter.add('things', lambda listing, n=n: n in listing, name=n)
+        for n in 'abc'
+    ]
+    assert waiter.wait() is True
+    assert len(calls) == 3
+    assert waiter.fetches == 3
+    assert [c.done for c in conditions] == [True, True, True]
+
+
+def test_only_sources_with_pending_conditions_are_listed():
+    """Test that a source is no longer listed once its conditions are met."""
+    clock = FakeClock()
+    calls = {'fast': 0, 'slow': 0}
+
+    def fetch(name):
+        calls[name] += 1
+        return calls[name]
+
+    waiter = make_waiter(clock)
+    waiter.add_source('fast', lambda: fetch('fast'))
+    waiter.add_source('slow', lambda: fetch('slow'))
+    waiter.add('fast', lambda count: count >= 1)
+    waiter.add('slow', lambda count: count >= 3)
+    assert waiter.wait() is True
+    assert calls == {'fast': 1, 'slow': 3}
+
+
+def test_result_is_kept():
+    """Test that the value returned by the check is kept as result."""
+    clock = FakeClock()
+    waiter = make_waiter(clock)
+    waiter.add_source('images', lambda: [{'id': 1, 'status': 'inspected'}])
+    condition = waiter.add('images', lambda images: images[0])
+    assert waiter.wait() is True
+    assert condition.result == {'id': 1, 'status': 'inspected'}
+
+
+def test_backoff():
+    """Test that idle ticks back off and progress polls quickly again."""
+    clock = FakeClock()
+    listings = iter([1, 1, 1, 1, 2, 2, 2, 3])
+    waiter = make_waiter(clock, min_interval=1, max_interval=5, backoff=2)
+    waiter.add_source('source', lambda: next(listings))
+    waiter.add('source', lambda value: value == 3)
+    assert waiter.wait() is True
+    assert clock.sleeps == [2, 4, 5, 5, 1, 2, 4]
+
+
+def test_state_changes_are_progress():
+    """Test a changed state resets the interval like a changed listing."""
+    clock = FakeClock()
+    statuses = iter(['pending', 'pending', 'pending', 'preparing',
+                     'preparing', 'inspected'])
+    waiter = make_waiter(clock, min_interval=1, max_interval=5, backoff=2)
+    waiter.add_source('images', lambda: ObjectIndex(
+        [{'ec2_ami_id': 'ami-1', 'status': next(statuses)}]))
+    waiter.add(
+        'images',
+        lambda images: images.get(
+            'ec2_ami_id', 'ami-1')['status'] == 'inspected',
+        state=lambda images: images.get('ec2_ami_id', 'ami-1')['status'],
+    )
+    assert waiter.wait() is True
+    assert clock.sleeps == [2, 4, 5, 1, 2]
+
+
+def test_indexes_are_not_consumed():
+    """Test lazy index listings are not fetched whole to detect progress."""
+    clock = FakeClock()
+    consumed = []
+
+    def pages():
+        for number in range(1, 4):
+            consumed.append(number)
+            yield {'ec2_ami_id': f'ami-{number}', 'status': 'inspected'}
+
+    waiter = make_waiter(clock)
+    waiter.add_source('images', lambda: ObjectIndex(pages()))
+    waiter.add(
+        'images',
+        lambda images: images.get('ec2_ami_id', 'ami-1'),
+        state=lambda images: images.get('ec2_ami_id', 'ami-1')['status'],
+    )
+    assert waiter.wait() is True
+    assert consumed == [1]
+
+
+def test_timeout():
+    """Test that the waiter gives up after the timeout."""
+    clock = FakeClock()
+    ticks = []
+    waiter = make_waiter(
+        clock,
+        timeout=10,
+        min_interval=3,
+        max_interval=3,
+        on_tick=lambda w: ticks.append(w.elapsed),
+    )
+    waiter.add_source('source', lambda: None)
+    waiter.add('source', lambda value: value, name='never')
+    waiter.add('source', lambda value: True, name='always')
+    assert waiter.wait() is False
+    assert ticks == [0, 3, 6, 9, 10]
+    assert [c.name for c in waiter.pending] == ['never']
+
+
+def test_unknown_source():
+    """Test that conditions can only be added to known sources."""
+    waiter = MultiWaiter(timeout=1)
+    with pytest.raises(KeyError):
+        waiter.add('nothing', bool)
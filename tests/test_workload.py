@@ -0,0 +1,250 @@
+"""Unit tests for :mod:`integrade.workload`."""
+import itertools
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from dateutil.parser import isoparse
+
+from integrade import api, config
+from integrade.injector import power_off_events, power_on_events
+from integrade.standin import CloudigradeState, serve
+from integrade.tests import urls
+from integrade.workload import (
+    TERMINATE_EVENTS,
+    generate_workload,
+    last_event_listed,
+    run_workload,
+)
+
+PROFILES = [
+    {'name': 'CUSTOMER1', 'account_number': '111111111111'},
+    {'name': 'CUSTOMER2', 'account_number': '222222222222'},
+]
+
+AWS_IMAGE_CONFIG = {
+    'profiles': {
+        'CUSTOMER1': {'images': {
+            'owned': [{'name': 'rhel', 'image_id': 'ami-1'}],
+            'community': [{'name': 'ubuntu', 'image_id': 'ami-2'}],
+        }},
+    },
+}
+
+START = datetime(2019, 1, 1, tzinfo=timezone.utc)
+
+
+def workload(seed=1, **kwargs):
+    """Generate a small workload without reading the configuration."""
+    kwargs.setdefault('instances', 50)
+    return list(generate_workload(
+        seed,
+        start=START,
+        profiles=PROFILES,
+        aws_image_config=AWS_IMAGE_CONFIG,
+        **kwargs,
+    ))
+
+
+def instance_id(event):
+    """Get the instance id of a good event."""
+    items = event.record['responseElements']['instancesSet']['items']
+    return items[0]['instanceId']
+
+
+def test_seed():
+    """Test the same seed gives the same workload and others do not."""
+    assert workload(seed=1) == workload(seed=1)
+    assert workload(seed=1) != workload(seed=2)
+
+
+def test_power_cycles():
+    """Test instances power on and off in turns until terminated."""
+    events = workload(cycles=4, bad_ratio=0)
+    assert [event.time for event in events] == sorted(
+        event.time for event in events)
+    assert len({instance_id(event) for event in events}) == 50
+    by_instance = {}
+    for event in events:
+        by_instance.setdefault(instance_id(event), []).append(
+            event.record['eventName'])
+    for names in by_instance.values():
+        assert len(names) <= 8
+        for i, name in enumerate(names):
+            if i % 2:
+                assert name in power_off_events
+            else:
+                assert name in power_on_events
+        for name in names[:-1]:
+            assert name not in TERMINATE_EVENTS
+
+
+def test_default_start_and_end():
+    """Test workloads end by now unless they are given a start."""
+    before = datetime.now(timezone.utc)
+    events = list(generate_workload(
+        1, instances=50, profiles=PROFILES, aws_image_config=AWS_IMAGE_CONFIG))
+    after = datetime.now(timezone.utc)
+    times = [isoparse(event.time) for event in events]
+    assert max(times) <= after
+    assert min(times) >= before - timedelta(hours=3 * 24)
+
+    end = START + timedelta(hours=24)
+    events = workload(bad_ratio=0, end=end)
+    assert max(isoparse(event.time) for event in events) <= end
+    assert len(events) < len(workload(bad_ratio=0))
+
+
+def test_images_and_accounts():
+    """Test instances run images of their profile."""
+    events = workload(bad_ratio=0)
+    for event in events:
+        account = event.record['userIdentity']['accountId']
+        items = event.record['responseElements']['instancesSet']['items']
+        image_id = items[0].get('imageId')
+        if account == '111111111111' and \
+                event.record['eventName'] in power_on_events:
+            assert image_id in ('ami-1', 'ami-2')
+        else:
+            assert image_id is None
+
+
+def test_bad_events():
+    """Test bad events are mixed in as logs of their own."""
+    events = workload(instances=200, bad_ratio=0.5)
+    bad = [event for event in events if event.bad]
+    assert 0.3 < len(bad) / (len(events) - len(bad)) < 0.7
+    assert all(event.record is None and event.data for event in bad)
+    assert set(Counter(event.bad for event in bad)) == {
+        'textfile', 'badjson', 'badinstanceid', 'badawsaccount'}
+
+
+class FakeInjector(object):
+    """Record what would be uploaded."""
+
+    def __init__(self):
+        """Start with nothing uploaded."""
+        self.keys = []
+        self.pending = []
+        self.uploads = []
+
+    def add(self, record):
+        """Keep the record until the next upload."""
+        self.pending.append(record)
+
+    def put(self, data, gzipped=True):
+        """Upload raw data right away."""
+        self.uploads.append(data)
+        self.keys.append(len(self.keys))
+
+    def upload_pending(self):
+        """Upload the pending records as one object."""
+        if self.pending:
+            self.uploads.append(self.pending)
+            self.keys.append(len(self.keys))
+            self.pending = []
+
+    def flush(self):
+        """Upload what is left."""
+        self.upload_pending()
+
+
+class FakeClock(object):
+    """A clock that only moves forward when something sleeps."""
+
+    def __init__(self):
+        """Start at time zero."""
+        self.now = 0
+
+    def __call__(self):
+        """Return the current fake time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advance the clock."""
+        self.now += seconds
+
+
+def test_run_workload_rate():
+    """Test events are sent at the target rate and flushed regularly."""
+    clock = FakeClock()
+    injector = FakeInjector()
+    events = itertools.islice(
+        generate_workload(
+            3,
+            instances=1000,
+            bad_ratio=0,
+            start=START,
+            profiles=PROFILES,
+            aws_image_config=AWS_IMAGE_CONFIG,
+        ),
+        500,
+    )
+    stats = run_workload(
+        events, injector, rate=100, clock=clock, sleep=clock.sleep)
+    assert stats.events == stats.records == 500
+    assert stats.bad == 0
+    assert 4.9 < stats.seconds <= 5
+    assert 100 <= stats.rate < 102
+    assert stats.objects == len(injector.uploads) == 5
+    assert sum(len(upload) for upload in injector.uploads) == 500
+
+
+def test_run_workload_limit():
+    """Test the workload stops after the limit."""
+    clock = FakeClock()
+    injector = FakeInjector()
+    stats = run_workload(
+        workload(bad_ratio=0.2), injector, rate=10, limit=25, clock=clock,
+        sleep=clock.sleep)
+    assert stats.events == 25
+    assert stats.records + stats.bad == 25
+
+
+def test_run_workload_lag():
+    """Test the time cloudigrade takes to list the last event is measured."""
+    clock = FakeClock()
+    events = workload(bad_ratio=0)[:10]
+    checked = []
+
+    def ingested(record):
+        checked.append(record)
+        return len(checked) == 4
+
+    stats = run_workload(
+        events, FakeInjector(), rate=10, ingested=ingested, poll_interval=5,
+        clock=clock, sleep=clock.sleep)
+    assert checked == [events[-1].record] * 4
+    assert stats.lag == 15
+    stats = run_workload(
+        events, FakeInjector(), rate=10, ingested=lambda record: False,
+        ingest_timeout=20, clock=clock, sleep=clock.sleep)
+    assert stats.lag is None
+    assert run_workload(events, FakeInjector(), rate=10).lag is None
+
+
+def test_last_event_listed():
+    """Test the check is true once the instance has an event that late."""
+    state = CloudigradeState(page_size=2)
+    arn = 'arn:aws:iam::111111111111:role/customer'
+    instance_ids = [state.add_aws_instance(arn) for _ in range(3)]
+    with serve(state) as server:
+        with patch.object(config, '_CONFIG', {
+                'base_url': server.base_url, 'scheme': 'http',
+                'ssl-verify': False, 'api_version': 'v1'}):
+            client = api.Client(
+                token=state.superuser_token,
+                response_handler=api.shared_json_handler,
+            )
+            client.post(urls.CLOUD_ACCOUNT, {'account_arn': arn})
+            ingested = last_event_listed(client)
+            when = datetime.now(timezone.utc) + timedelta(hours=1)
+            record = workload(bad_ratio=0)[0].record
+            items = record['responseElements']['instancesSet']['items']
+            items[0]['instanceId'] = instance_ids[0]
+            record['eventTime'] = when.isoformat()
+            assert not ingested(record)
+            state.record_event(instance_ids[1], 'power_off', when)
+            assert not ingested(record)
+            state.record_event(instance_ids[0], 'power_off', when)
+            assert ingested(record)